@@ -0,0 +1,100 @@
+"""
+Benchmark: File size, write and read time of a 'gps' like leaf in all leaf formats
+and codecs of serializers.py. The leaf is synthetic unless a CSV or parquet file of
+a real leaf is given.
+
+With --sta-core, the 'gps' leaf of a track is read through sta-core and compared with
+the formats: The first row is the sta-core default (read time, and the size if sta-core
+reports it).
+
+Usage:
+    python benchmarks/bench_leaf_formats.py [leaf file] [n_rows]
+    python benchmarks/bench_leaf_formats.py --sta-core <db_type> <db_path> <db_name> <track_hash>
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Run from the repository root without installing the package:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sta_etl.plugin_handler import serializers
+
+
+def _make_leaf(n_rows):
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({"timestamp": np.cumsum(rng.uniform(0.5, 2., n_rows)),
+                         "latitude": 48. + np.cumsum(rng.normal(0., 1e-5, n_rows)),
+                         "longitude": 11. + np.cumsum(rng.normal(0., 1e-5, n_rows)),
+                         "altitude": 500. + np.cumsum(rng.normal(0., .5, n_rows))})
+
+
+def _load_leaf(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def _read_sta_core(db_type, db_path, db_name, track_hash):
+    """Read the 'gps' leaf of a track with sta-core: (leaf, read times, size or None)."""
+    from sta_core import DataBaseHandler
+
+    dbh = DataBaseHandler(db_type=db_type)
+    dbh.set_db_path(db_path=db_path)
+    dbh.set_db_name(db_name=db_name)
+    leaf_info = [i for i in dbh.get_all_leaves_for_track(track_hash=track_hash).values()
+                 if i.get("name") == "gps"][0]
+
+    t_read = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        df = dbh.read_leaf(directory="gps", leaf_hash=leaf_info.get("leaf_hash"), leaf_type="DataFrame")
+        t_read.append(time.perf_counter() - t0)
+    return df, t_read, leaf_info.get("size")
+
+
+def main(df, sta_core=None):
+    size_mb = df.memory_usage().sum() / 1024 ** 2
+    print(f"{len(df)} rows, {size_mb:.1f} MB in memory")
+    print(f"{'format':>8} {'codec':>7} {'file [MB]':>10} {'write [ms]':>11} {'read [ms]':>10}")
+    if sta_core is not None:
+        t_read, size = sta_core
+        file_mb = "-" if size is None else f"{size / 1024 ** 2:.2f}"
+        print(f"{'sta-core':>8} {'default':>7} {file_mb:>10} {'-':>11} {1e3 * np.median(t_read):>10.1f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for i_format, (_, _, _, i_codecs) in serializers.LEAF_FORMATS.items():
+            for i_codec in i_codecs:
+                path = os.path.join(directory, f"leaf_{i_format}_{i_codec}")
+                try:
+                    t0 = time.perf_counter()
+                    serializers.write_leaf(df, path, i_format, i_codec)
+                    t_write = time.perf_counter() - t0
+                except ImportError as e:
+                    print(f"{i_format:>8} {i_codec:>7} skipped: {e}")
+                    continue
+
+                t_read = []
+                for _ in range(5):
+                    t0 = time.perf_counter()
+                    serializers.read_leaf(path, i_format, codec=i_codec)
+                    t_read.append(time.perf_counter() - t0)
+
+                file_mb = os.path.getsize(path) / 1024 ** 2
+                print(f"{i_format:>8} {i_codec:>7} {file_mb:>10.2f} {1e3 * t_write:>11.1f} "
+                      f"{1e3 * np.median(t_read):>10.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--sta-core":
+        leaf, leaf_t_read, leaf_size = _read_sta_core(*sys.argv[2:])
+        main(leaf, sta_core=(leaf_t_read, leaf_size))
+    elif len(sys.argv) > 1 and os.path.isfile(sys.argv[1]):
+        main(_load_leaf(sys.argv[1]))
+    else:
+        main(_make_leaf(int(sys.argv[-1]) if len(sys.argv) > 1 else 10 ** 6))
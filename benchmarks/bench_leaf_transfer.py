@@ -0,0 +1,75 @@
+"""
+Benchmark: Hand over a 'gps' like leaf to a worker process by pickling it through
+a pipe (baseline) or by memory-mapped columns (SharedLeaves).
+
+Usage:
+    python benchmarks/bench_leaf_transfer.py [n_rows ...]
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+# Run from the repository root without installing the package:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sta_etl.plugin_handler.shared_leaves import SharedLeaves, attach_leaves
+
+
+def _make_leaf(n_rows):
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({"timestamp": np.cumsum(rng.uniform(0.5, 2., n_rows)),
+                         "latitude": 48. + np.cumsum(rng.normal(0., 1e-5, n_rows)),
+                         "longitude": 11. + np.cumsum(rng.normal(0., 1e-5, n_rows)),
+                         "altitude": 500. + np.cumsum(rng.normal(0., .5, n_rows))})
+
+
+def _worker(conn):
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        kind, data = msg
+        data_dict = attach_leaves(data) if kind == "shared" else data
+        conn.send(float(data_dict["gps"]["latitude"].sum()))
+        data_dict = None
+
+
+def main(sizes):
+    ctx = multiprocessing.get_context("spawn")
+    conn, child_conn = ctx.Pipe()
+    process = ctx.Process(target=_worker, args=(child_conn,), daemon=True)
+    process.start()
+
+    print(f"{'rows':>10} {'MB':>8} {'pickle [ms]':>12} {'shared [ms]':>12} {'speed-up':>9}")
+    for n_rows in sizes:
+        data_dict = {"gps": _make_leaf(n_rows)}
+        size_mb = data_dict["gps"].memory_usage().sum() / 1024 ** 2
+
+        timings = {"pickle": [], "shared": []}
+        for _ in range(5):
+            t0 = time.perf_counter()
+            conn.send(("dict", data_dict))
+            conn.recv()
+            timings["pickle"].append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            with SharedLeaves(data_dict, min_bytes=0) as shared:
+                conn.send(("shared", shared.descriptors))
+                conn.recv()
+            timings["shared"].append(time.perf_counter() - t0)
+
+        t_pickle = 1e3 * np.median(timings["pickle"])
+        t_shared = 1e3 * np.median(timings["shared"])
+        print(f"{n_rows:>10} {size_mb:>8.1f} {t_pickle:>12.1f} {t_shared:>12.1f} {t_pickle / t_shared:>8.1f}x")
+
+    conn.send(None)
+    process.join()
+
+
+if __name__ == "__main__":
+    main([int(i) for i in sys.argv[1:]] or [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7])
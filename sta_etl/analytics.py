@@ -0,0 +1,106 @@
+"""Analysis functions across tracks which read only small, processed leaves."""
+
+import numpy as np
+import pandas as pd
+
+from sta_etl.sketches import merge_sketch_frames
+
+
+def personal_records(plugin_loader, track_hashes, max_workers=8):
+    """
+    Find the personal records (best efforts across tracks) from the 'best_efforts'
+    leaves of Plugin_BestEfforts. No 'gps' or 'simple_distances' leaf is read.
+
+    :param plugin_loader: PluginLoader
+        A PluginLoader with a database handler.
+    :param track_hashes: list
+        The track hashes (str) to search.
+    :param max_workers: int
+        Number of I/O threads (see PluginLoader.read_leaves(...))
+    :return: pd.DataFrame
+        One row per kind and target with the best effort and its track_hash.
+    """
+    efforts = plugin_loader.read_leaves(track_hashes=track_hashes,
+                                        leaf_name="best_efforts",
+                                        max_workers=max_workers)
+
+    if efforts is None or len(efforts) == 0:
+        return pd.DataFrame(columns=["kind", "target", "best_duration", "best_distance",
+                                     "speed", "start_duration", "end_duration", "track_hash"])
+
+    # The best effort is the highest speed for both kinds of targets:
+    best = efforts.sort_values("speed", ascending=False).drop_duplicates(["kind", "target"])
+    return best.sort_values(["kind", "target"]).reset_index(drop=True)
+
+
+def merge_sketches(plugin_loader, track_hashes, max_workers=8):
+    """
+    Merge the 'sketches' leaves of Plugin_Sketches of many tracks.
+
+    :param plugin_loader: PluginLoader
+        A PluginLoader with a database handler.
+    :param track_hashes: list
+        The track hashes (str) to merge.
+    :param max_workers: int
+        Number of I/O threads (see PluginLoader.iter_leaves(...))
+    :return: tuple
+        (quantity name -> DDSketch, quantity name -> FixedHistogram)
+    """
+    batches = plugin_loader.iter_leaves(track_hashes=track_hashes,
+                                        leaf_name="sketches",
+                                        max_workers=max_workers)
+    return merge_sketch_frames(i_df for i_batch in batches
+                               for _, i_df in i_batch.groupby("track_hash", sort=False))
+
+
+def sketch_quantiles(plugin_loader, track_hashes, quantiles=(0.1, 0.5, 0.9), max_workers=8):
+    """
+    Percentiles of velocity, gradient and altitude across tracks from their sketches
+    alone (see Plugin_Sketches). The relative error of every value is at most the
+    'alpha' of the sketches.
+
+    :param plugin_loader: PluginLoader
+    :param track_hashes: list
+        The track hashes (str), e.g. all tracks of a year.
+    :param quantiles: list
+        Quantiles between 0 and 1.
+    :param max_workers: int
+        Number of I/O threads.
+    :return: pd.DataFrame
+        One row per quantity with the number of values and one column per quantile.
+    """
+    sketches, _ = merge_sketches(plugin_loader, track_hashes, max_workers=max_workers)
+    rows = []
+    for i_name, i_sketch in sketches.items():
+        rows.append([i_name, i_sketch.count] + list(np.atleast_1d(i_sketch.quantile(list(quantiles)))))
+    return pd.DataFrame(rows, columns=["quantity", "count"] + [f"q{i_q:g}" for i_q in quantiles])
+
+
+def segment_leaderboard(plugin_loader, track_hashes, segment_id=None, max_workers=8):
+    """
+    Rank the efforts on the user defined segments from the 'segment_efforts' leaves of
+    Plugin_SegmentEfforts.
+
+    :param plugin_loader: PluginLoader
+    :param track_hashes: list
+        The track hashes (str) to search.
+    :param segment_id: str or None
+        Only the efforts on this segment (all segments by default).
+    :param max_workers: int
+        Number of I/O threads.
+    :return: pd.DataFrame
+        One row per effort, sorted by segment and elapsed time, with a rank per segment.
+    """
+    efforts = plugin_loader.read_leaves(track_hashes=track_hashes,
+                                        leaf_name="segment_efforts",
+                                        max_workers=max_workers)
+
+    if efforts is None or len(efforts) == 0:
+        return pd.DataFrame(columns=["segment_id", "name", "rank", "elapsed_time", "speed",
+                                     "start_duration", "track_hash"])
+
+    if segment_id is not None:
+        efforts = efforts[efforts["segment_id"] == segment_id]
+    efforts = efforts.sort_values(["segment_id", "elapsed_time"]).reset_index(drop=True)
+    efforts["rank"] = efforts.groupby("segment_id").cumcount() + 1
+    return efforts
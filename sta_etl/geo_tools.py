@@ -0,0 +1,87 @@
+"""Vectorized geo helper functions which are shared by several plugins."""
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS = 6371008.8
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between two sets of points on a sphere with the mean
+    earth radius. All inputs are in degree and can be numpy arrays.
+
+    :param lat1: float or np.array
+    :param lon1: float or np.array
+    :param lat2: float or np.array
+    :param lon2: float or np.array
+    :return: float or np.array
+        Distance in meter
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dphi / 2.) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2.) ** 2
+    return 2. * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0., 1.)))
+
+
+def step_distances(lat, lon):
+    """
+    Distances between consecutive points of a track. The first entry is 0 such as
+    in Plugin_SimpleDistance.
+
+    :param lat: np.array
+    :param lon: np.array
+    :return: np.array
+        Distance in meter, same length as the input
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    dist = np.zeros(len(lat))
+    if len(lat) > 1:
+        dist[1:] = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    return dist
+
+
+def to_local_xy(lat, lon, lat0=None, lon0=None):
+    """
+    Project coordinates onto a local plane (equirectangular projection) around
+    (lat0, lon0). This is precise enough for distances of a few ten kilometres.
+
+    :param lat: np.array
+    :param lon: np.array
+    :param lat0: float or None
+        Reference latitude. Defaults to the mean latitude.
+    :param lon0: float or None
+        Reference longitude. Defaults to the mean longitude.
+    :return: tuple
+        (x, y) in meter as np.array
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if lat0 is None:
+        lat0 = float(np.mean(lat))
+    if lon0 is None:
+        lon0 = float(np.mean(lon))
+    x = np.radians(lon - lon0) * EARTH_RADIUS * np.cos(np.radians(lat0))
+    y = np.radians(lat - lat0) * EARTH_RADIUS
+    return x, y
+
+
+def timestamps_to_seconds(timestamps):
+    """
+    Convert a timestamp column to float seconds. Datetime columns are converted to
+    seconds since epoch, numeric columns are taken as seconds (such as
+    Plugin_SimpleDistance uses them to calculate velocities).
+
+    :param timestamps: pd.Series or np.array
+    :return: np.array
+    """
+    values = np.asarray(timestamps)
+    if values.dtype == object:
+        # e.g. timezone aware timestamps
+        values = pd.to_datetime(values, utc=True).tz_convert(None).to_numpy()
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64) / 1e9
+    return values.astype(float)
@@ -0,0 +1,240 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class AdmissionController():
+    """
+    This is AdmissionController(...) - A memory budget for running several plugin
+    jobs at the same time. Every job (one plugin on one track) gets a peak memory
+    estimate before its leaves are read from disk by the PluginLoader. The job is
+    only admitted while the sum of all estimates of running jobs fits into the
+    configured budget and while the resident memory (RSS) of this process stays
+    below the pressure limit.
+
+    .. note::
+        The estimate of a job is:
+            (sum of the expected in-memory size of all required leaves) * memory factor
+        The expected size of a leaf is taken from the leaf information in the database
+        ('size' in bytes) if sta-core provides it. That is the size on disk, so it is
+        scaled by the ratio of the in-memory size to the size on disk which the controller
+        learns per leaf name (see observe_leaf(...)). Without 'size', the controller
+        learns the in-memory size per leaf name from the leaves which were read before.
+        The memory factor is taken from the plugin configuration ('memory_factor') and
+        can be overwritten with set_plugin_memory_factor(...).
+
+        A job which is larger than the full budget is admitted as soon as nothing else
+        is running. Otherwise, it would wait forever.
+
+    :Example:
+        ac = AdmissionController(memory_budget=4 * 1024 ** 3)
+        pl = PluginLoader()
+        pl.set_admission_controller(ac)
+        pl.process_branches(track_hashes, max_workers=8)
+    """
+
+    def __init__(self, memory_budget, rss_limit=None, default_leaf_size=64 * 1024 ** 2,
+                 default_memory_factor=3.0, poll_interval=0.5, default_size_ratio=2.0):
+        """
+        AdmissionController constructor.
+
+        :param memory_budget: int
+            The total amount of memory (bytes) which admitted jobs may use together.
+        :param rss_limit: int or None
+            Admission is paused while the RSS of this process is above this value (bytes).
+            Defaults to the memory budget.
+        :param default_leaf_size: int
+            Size estimate (bytes) for a leaf name which was never seen before.
+        :param default_memory_factor: float
+            Memory factor for plugins without 'memory_factor' in their configuration.
+        :param poll_interval: float
+            Seconds between two RSS checks while admission is paused.
+        :param default_size_ratio: float
+            In-memory bytes per byte on disk for a leaf name which was never seen before.
+        """
+        self.memory_budget = memory_budget
+        self.rss_limit = rss_limit if rss_limit is not None else memory_budget
+        self.default_leaf_size = default_leaf_size
+        self.default_memory_factor = default_memory_factor
+        self.poll_interval = poll_interval
+        self.default_size_ratio = default_size_ratio
+
+        self._leaf_sizes = {}
+        self._size_ratios = {}
+        self._plugin_memory_factors = {}
+        self._in_flight = 0
+        self._in_flight_jobs = 0
+        self._condition = threading.Condition()
+
+    def set_plugin_memory_factor(self, plugin_name, factor):
+        """
+        Overwrite the memory factor of a plugin. The memory factor describes how much
+        memory a plugin needs at its peak in units of its input data size.
+
+        :param plugin_name: str
+            The plugin name such as it is registered in the ClassCollector.
+        :param factor: float
+        :return: None
+        """
+        self._plugin_memory_factors[plugin_name] = factor
+
+    def get_memory_factor(self, plugin_name, plugin_config):
+        """
+        Return the memory factor of a plugin.
+
+        :param plugin_name: str
+        :param plugin_config: dictionary
+            The plugin configuration from get_plugin_config()
+        :return: float
+        """
+        if plugin_name in self._plugin_memory_factors:
+            return self._plugin_memory_factors[plugin_name]
+        return plugin_config.get("memory_factor", self.default_memory_factor)
+
+    def observe_leaf(self, leaf_name, leaf_data, disk_size=None):
+        """
+        Learn the in-memory size of a leaf after it was read, and the ratio to its size
+        on disk if it is known. A moving average is kept per leaf name to estimate
+        future leaves of the same kind.
+
+        :param leaf_name: str
+        :param leaf_data: object
+            The leaf object (usually a pandas DataFrame)
+        :param disk_size: int or None
+            The size on disk ('size' of the leaf information in the database).
+        :return: None
+        """
+        if hasattr(leaf_data, "memory_usage"):
+            size = int(leaf_data.memory_usage(deep=True).sum())
+        elif hasattr(leaf_data, "nbytes"):
+            size = int(leaf_data.nbytes)
+        else:
+            return
+
+        with self._condition:
+            size_before = self._leaf_sizes.get(leaf_name)
+            if size_before is None:
+                self._leaf_sizes[leaf_name] = size
+            else:
+                self._leaf_sizes[leaf_name] = int(0.8 * size_before + 0.2 * size)
+
+            if disk_size:
+                ratio = size / disk_size
+                ratio_before = self._size_ratios.get(leaf_name)
+                if ratio_before is None:
+                    self._size_ratios[leaf_name] = ratio
+                else:
+                    self._size_ratios[leaf_name] = 0.8 * ratio_before + 0.2 * ratio
+
+    def estimate_leaf_size(self, leaf_info):
+        """
+        Estimate the in-memory size of a single leaf.
+
+        :param leaf_info: dictionary
+            The leaf description from the database (contains 'name' and 'leaf_hash')
+        :return: int
+            Size in bytes
+        """
+        size = leaf_info.get("size")
+        if size is not None:
+            # The size on disk, scaled to the size in memory:
+            return int(size * self._size_ratios.get(leaf_info.get("name"), self.default_size_ratio))
+        return self._leaf_sizes.get(leaf_info.get("name"), self.default_leaf_size)
+
+    def estimate_job(self, plugin_name, plugin_config, required_leaves):
+        """
+        Estimate the peak memory of a job.
+
+        :param plugin_name: str
+        :param plugin_config: dictionary
+        :param required_leaves: list
+            A list of leaf descriptions from the database which are read for this job.
+        :return: int
+            Size in bytes
+        """
+        leaf_sum = sum(self.estimate_leaf_size(i_leaf) for i_leaf in required_leaves)
+        return int(leaf_sum * self.get_memory_factor(plugin_name, plugin_config))
+
+    def get_rss(self):
+        """
+        Return the resident memory of this process in bytes. We use psutil if installed
+        and /proc/self/statm otherwise. If none of them is available, None is returned
+        and RSS monitoring is disabled.
+
+        :return: int or None
+        """
+        if psutil is not None:
+            return psutil.Process(os.getpid()).memory_info().rss
+        try:
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _can_admit(self, estimate):
+        if self._in_flight_jobs == 0:
+            return True
+        if self._in_flight + estimate > self.memory_budget:
+            return False
+        rss = self.get_rss()
+        if rss is not None and rss > self.rss_limit:
+            return False
+        return True
+
+    def acquire(self, estimate):
+        """
+        Block until a job with the given estimate fits into the memory budget.
+
+        :param estimate: int
+            Size in bytes from estimate_job(...)
+        :return: None
+        """
+        with self._condition:
+            while not self._can_admit(estimate):
+                self._condition.wait(timeout=self.poll_interval)
+            self._in_flight += estimate
+            self._in_flight_jobs += 1
+
+    def release(self, estimate):
+        """
+        Give the memory of a finished job back to the budget.
+
+        :param estimate: int
+            The same estimate which was used for acquire(...)
+        :return: None
+        """
+        with self._condition:
+            self._in_flight -= estimate
+            self._in_flight_jobs -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, estimate):
+        """
+        Context manager version of acquire(...) and release(...)
+
+        :param estimate: int
+        """
+        self.acquire(estimate)
+        try:
+            yield
+        finally:
+            self.release(estimate)
+
+    def get_status(self):
+        """
+        Report the current state of the controller.
+
+        :return: dictionary
+        """
+        with self._condition:
+            return {"in_flight_bytes": self._in_flight,
+                    "in_flight_jobs": self._in_flight_jobs,
+                    "memory_budget": self.memory_budget,
+                    "rss": self.get_rss()}
@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+# Leaf status -> code in the status matrix. Leaves without an entry are 'missing'.
+STATUS_NAMES = ["missing", "processing", "processed", "retry", "failed", "stale"]
+STATUS_CODES = {i_name: i_code for i_code, i_name in enumerate(STATUS_NAMES)}
+
+
+class Backlog():
+    """
+    This is Backlog(...) - The status of every (track, leaf) pair in a compact matrix
+    (one int8 code per pair, see STATUS_NAMES). It is built from one scan of the
+    branch information (see scan_backlog(...)) and answers which work is left
+    without further database requests.
+
+    :Example:
+        bl = scan_backlog(pl, user_hashes=["u1", "u2"])
+        print(bl.get_summary())
+        track_hashes = bl.get_work_tracks(pl)
+    """
+
+    def __init__(self, track_hashes, leaf_names, codes):
+        """
+        Backlog constructor.
+
+        :param track_hashes: list
+            Track hashes (str), one per row of codes
+        :param leaf_names: list
+            Leaf names (str), one per column of codes
+        :param codes: np.array
+            Status codes (int8) of shape (tracks, leaves)
+        """
+        self.track_hashes = list(track_hashes)
+        self.leaf_names = list(leaf_names)
+        self.codes = codes
+        self._leaf_index = {i_leaf: i for i, i_leaf in enumerate(self.leaf_names)}
+
+    def get_status(self, track_hash, leaf_name):
+        """
+        :param track_hash: str
+        :param leaf_name: str
+        :return: str
+            One of STATUS_NAMES
+        """
+        i_track = self.track_hashes.index(track_hash)
+        return STATUS_NAMES[self.codes[i_track, self._leaf_index[leaf_name]]]
+
+    def get_summary(self):
+        """
+        :return: pd.DataFrame
+            Number of tracks per leaf (rows) and status (columns)
+        """
+        counts = np.stack([np.bincount(self.codes[:, i], minlength=len(STATUS_NAMES))
+                           for i in range(len(self.leaf_names))]) if len(self.leaf_names) > 0 \
+            else np.zeros((0, len(STATUS_NAMES)), dtype=np.int64)
+        return pd.DataFrame(counts, index=pd.Index(self.leaf_names, name="leaf"), columns=STATUS_NAMES)
+
+    def _get_stuck_mask(self, journal=None):
+        """
+        The 'processing' leaves which no run is working on (see get_stuck(...)).
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        stuck = self.codes == STATUS_CODES["processing"]
+        if journal is not None:
+            track_index = {i_track: i for i, i_track in enumerate(self.track_hashes)}
+            for i_unit in journal.get_unfinished():
+                i_track = track_index.get(i_unit["track_hash"])
+                i_leaf = self._leaf_index.get(i_unit["leaf_name"])
+                if i_track is not None and i_leaf is not None:
+                    stuck[i_track, i_leaf] = False
+        return stuck
+
+    def get_stuck(self, journal=None):
+        """
+        The leaves which are registered as 'processing' but are not active in the journal
+        of the run in progress, e.g. after a run without journal died. process_branch(...)
+        skips 'processing' leaves, so they have to be set back before they are processed
+        again (see PluginLoader.invalidate(...)).
+
+        :param journal: RunJournal or None
+            The journal of the run in progress. Without a journal, every 'processing'
+            leaf is stuck.
+        :return: list
+            A list of dictionaries with 'track_hash' and 'leaf_name'
+        """
+        i_tracks, i_leaves = np.nonzero(self._get_stuck_mask(journal=journal))
+        return [{"track_hash": self.track_hashes[i], "leaf_name": self.leaf_names[j]}
+                for i, j in zip(i_tracks, i_leaves)]
+
+    def get_work(self, plugin_loader, leaf_names=None, journal=None):
+        """
+        The minimal work list: For every track the leaves which process_branch(...) has to
+        process to get the requested leaves. A requested leaf is work unless it is
+        'processed' or 'processing' by the run of the journal (a 'processing' leaf without
+        an active run is stuck, see get_stuck(...)). Leaves it depends on are work only if
+        they are needed for such a leaf and are not done themselves. Tracks which miss a
+        leaf that no plugin produces (e.g. 'gps') are blocked.
+
+        :param plugin_loader: PluginLoader
+            Knows the plugin dependencies.
+        :param leaf_names: list or None
+            The requested leaves. Defaults to the leaves of the plugins to process of the
+            PluginLoader.
+        :param journal: RunJournal or None
+            The journal of the run in progress.
+        :return: pd.DataFrame
+            One row per track with work: track_hash, one bool column per leaf and blocked.
+        """
+        if leaf_names is None:
+            if plugin_loader.plugins_to_process is None:
+                plugin_loader.set_processor_plugins()
+            leaf_names = plugin_loader.get_leaf_names(plugin_loader.plugins_to_process)
+
+        done = (self.codes == STATUS_CODES["processed"]) | \
+            ((self.codes == STATUS_CODES["processing"]) & ~self._get_stuck_mask(journal=journal))
+        need = np.zeros_like(done)
+        blocked = np.zeros(len(self.track_hashes), dtype=bool)
+        for i_leaf in leaf_names:
+            i_need = ~self._get_column(done, i_leaf)
+            need[:, self._leaf_index[i_leaf]] |= i_need
+            for i_dep in plugin_loader.get_upstream_leaves(i_leaf):
+                i_dep_missing = ~self._get_column(done, i_dep)
+                if i_dep in plugin_loader.leaf_name_to_plugin_name:
+                    need[:, self._leaf_index[i_dep]] |= i_need & i_dep_missing
+                else:
+                    blocked |= i_need & i_dep_missing
+
+        has_work = need.any(axis=1)
+        work = pd.DataFrame(need[has_work], columns=self.leaf_names)
+        work = work.loc[:, work.any(axis=0)]
+        work.insert(0, "track_hash", np.asarray(self.track_hashes, dtype=object)[has_work])
+        work["blocked"] = blocked[has_work]
+        return work
+
+    def get_work_tracks(self, plugin_loader, leaf_names=None, journal=None):
+        """
+        The tracks which have work and are not blocked (see get_work(...)), e.g. as input
+        for process_stream(...).
+
+        :param plugin_loader: PluginLoader
+        :param leaf_names: list or None
+        :param journal: RunJournal or None
+        :return: list
+            Track hashes (str)
+        """
+        work = self.get_work(plugin_loader, leaf_names=leaf_names, journal=journal)
+        return work.loc[~work["blocked"], "track_hash"].tolist()
+
+    def _get_column(self, matrix, leaf_name):
+        """
+        The column of a leaf. Leaves which are not in the matrix are missing.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        if leaf_name not in self._leaf_index:
+            raise KeyError(f"Leaf {leaf_name} was not scanned, add it to the leaf names of scan_backlog(...)")
+        return matrix[:, self._leaf_index[leaf_name]]
+
+
+def scan_backlog(plugin_loader, user_hashes, leaf_names=None):
+    """
+    Build the Backlog(...) of all tracks of the given users from one read of the branch
+    information per user. No request per track is made.
+
+    :param plugin_loader: PluginLoader
+        A PluginLoader with database handler.
+    :param user_hashes: iterable
+        User hashes (str), e.g. a list or read_user_hashes(...)
+    :param leaf_names: list or None
+        The leaves to cover. Defaults to all leaves of the registered plugins and the
+        leaves they depend on (e.g. 'gps').
+    :return: Backlog
+    """
+    if leaf_names is None:
+        leaf_names = list(plugin_loader.all_leaves)
+        for i_leaf in plugin_loader.all_leaves:
+            leaf_names.extend(i for i in plugin_loader.get_upstream_leaves(i_leaf) if i not in leaf_names)
+    leaf_index = {i_leaf: i for i, i_leaf in enumerate(leaf_names)}
+    retry = STATUS_CODES["retry"]
+    processed = STATUS_CODES["processed"]
+
+    track_hashes = []
+    rows = []
+    for i_user in user_hashes:
+        for i_branch in plugin_loader.read_user_branches(user_hash=i_user):
+            row = np.zeros(len(leaf_names), dtype=np.int8)
+            for i_leaf in (i_branch.get("leaf") or {}).values():
+                i_col = leaf_index.get(i_leaf.get("name"))
+                if i_col is None:
+                    continue
+                if i_leaf.get("name") not in plugin_loader.leaf_name_to_plugin_name:
+                    # Leaves which no plugin produces (e.g. 'gps') are there or missing:
+                    row[i_col] = processed
+                else:
+                    # A leaf without a known status has to be processed again:
+                    row[i_col] = STATUS_CODES.get(i_leaf.get("status"), retry)
+            track_hashes.append(i_branch.get("track_hash"))
+            rows.append(row)
+
+    codes = np.stack(rows) if len(rows) > 0 else np.zeros((0, len(leaf_names)), dtype=np.int8)
+    return Backlog(track_hashes=track_hashes, leaf_names=leaf_names, codes=codes)
@@ -0,0 +1,195 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def read_user_hashes(path):
+    """
+    Read user hashes lazily from a text file with one user hash per line. Empty lines
+    and lines starting with '#' are skipped.
+
+    :param path: str
+    :return: generator
+        User hashes (str)
+    """
+    with open(path, "r") as f:
+        for i_line in f:
+            i_line = i_line.strip()
+            if len(i_line) == 0 or i_line.startswith("#"):
+                continue
+            yield i_line
+
+
+def iter_track_hashes(plugin_loader, user_hashes):
+    """
+    Stream the track hashes of all branches of the given users. The branch list of one
+    user is read when the previous user is done, so we never hold the branch
+    information of the whole database in memory.
+
+    :param plugin_loader: PluginLoader
+        A PluginLoader with database handler.
+    :param user_hashes: iterable
+        User hashes (str), e.g. a list or read_user_hashes(...)
+    :return: generator
+        Track hashes (str)
+    """
+    for i_user in user_hashes:
+        user_branches = plugin_loader.read_user_branches(user_hash=i_user)
+        track_hashes = [i_branch.get("track_hash") for i_branch in user_branches]
+        del user_branches
+        for i_track_hash in track_hashes:
+            yield i_track_hash
+
+
+class BatchProgress():
+    """
+    This is BatchProgress(...) - Counts processed tracks and points of a batch run and
+    reports the throughput (tracks/s, points/s) every report_interval seconds.
+
+    .. note::
+        Points are the rows of the points_leaf (default 'gps') which the plugins of a
+        track read (once per track, see PluginLoader.process_branch(...)). With
+        points_leaf=None, the rows of all input leaves count, so a track is counted once
+        per leaf which was read (e.g. 'gps' and 'simple_distances').
+    """
+
+    def __init__(self, points_leaf="gps", report_interval=10.):
+        """
+        BatchProgress constructor.
+
+        :param points_leaf: str or None
+            The leaf name whose rows count as points. None counts the rows of all input
+            leaves.
+        :param report_interval: float
+            Seconds between two progress reports.
+        """
+        self.points_leaf = points_leaf
+        self.report_interval = report_interval
+
+        self.n_tracks = 0
+        self.n_failed = 0
+        self.n_points = 0
+        self._t_start = time.monotonic()
+        self._t_report = self._t_start
+
+    def track_done(self, branch_rows=None, error=None):
+        """
+        Count a finished track.
+
+        :param branch_rows: dictionary or None
+            The return value of PluginLoader.process_branch(...)
+        :param error: Exception or None
+            The exception which stopped the track processing.
+        :return: None
+        """
+        self.n_tracks += 1
+        if error is not None:
+            self.n_failed += 1
+        if branch_rows is not None:
+            if self.points_leaf is None:
+                self.n_points += sum(branch_rows.values())
+            else:
+                self.n_points += branch_rows.get(self.points_leaf, 0)
+
+    def get_status(self):
+        """
+        :return: dictionary
+            n_tracks, n_failed, n_points, seconds, tracks_per_sec, points_per_sec
+        """
+        seconds = max(time.monotonic() - self._t_start, 1e-9)
+        n_points = self.n_points
+        return {"n_tracks": self.n_tracks,
+                "n_failed": self.n_failed,
+                "n_points": n_points,
+                "seconds": seconds,
+                "tracks_per_sec": self.n_tracks / seconds,
+                "points_per_sec": n_points / seconds}
+
+    def report(self, in_flight=0, force=False):
+        """
+        Print the progress if report_interval seconds passed since the last report.
+
+        :param in_flight: int
+            Number of tracks which are processed right now.
+        :param force: bool
+            Print anyway.
+        :return: None
+        """
+        now = time.monotonic()
+        if force is False and now - self._t_report < self.report_interval:
+            return
+        self._t_report = now
+        st = self.get_status()
+        points = "input rows" if self.points_leaf is None else f"{self.points_leaf} rows"
+        print(f"{st['n_tracks']} tracks ({st['tracks_per_sec']:.2f} tracks/s), "
+              f"{st['n_points']} {points} ({st['points_per_sec']:.0f} {points}/s), "
+              f"{st['n_failed']} failed, {in_flight} in flight, {st['seconds']:.0f} s")
+
+
+def _track_done(progress, track_hash, future):
+    """
+    Count a finished track and print its error.
+
+    .. note::
+        Only for private usage! Stick to the _
+    """
+    error = future.exception()
+    if error is not None:
+        print(f"Processing of branch {track_hash} failed: {error!r}")
+        progress.track_done(error=error)
+    else:
+        progress.track_done(branch_rows=future.result())
+
+
+def process_stream(plugin_loader, track_hashes, max_workers=1, window=None, journal=None,
+                   report_interval=10., points_leaf="gps"):
+    """
+    Process a (possibly endless) stream of track hashes with process_branch(...). At most
+    'window' tracks are taken from the stream and processed or waiting at the same time,
+    so the stream is consumed only as fast as the tracks are processed.
+
+    :param plugin_loader: PluginLoader
+        A PluginLoader with database handler and plugins to process.
+    :param track_hashes: iterable
+        Track hashes (str), e.g. iter_track_hashes(...)
+    :param max_workers: int
+        Number of tracks which are processed at the same time.
+    :param window: int or None
+        Maximum number of tracks in flight. Defaults to 2 * max_workers.
+    :param journal: RunJournal or None
+        Tracks are planned in the journal when they are taken from the stream.
+    :param report_interval: float
+        Seconds between two progress reports.
+    :param points_leaf: str or None
+        Count only the rows of this leaf as points (see BatchProgress).
+    :return: dictionary
+        The final status of BatchProgress.get_status()
+    """
+    if plugin_loader.plugins_to_process is None:
+        plugin_loader.set_processor_plugins()
+    if window is None:
+        window = 2 * max_workers
+    leaf_names = plugin_loader.get_leaf_names(plugin_loader.plugins_to_process)
+    progress = BatchProgress(points_leaf=points_leaf, report_interval=report_interval)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        for i_track_hash in track_hashes:
+            if journal is not None:
+                journal.plan(track_hash=i_track_hash, leaf_names=leaf_names)
+
+            while len(in_flight) >= window:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for i_future in done:
+                    _track_done(progress, in_flight.pop(i_future), i_future)
+                progress.report(in_flight=len(in_flight))
+
+            in_flight[executor.submit(plugin_loader.process_branch, i_track_hash)] = i_track_hash
+
+        while len(in_flight) > 0:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for i_future in done:
+                _track_done(progress, in_flight.pop(i_future), i_future)
+            progress.report(in_flight=len(in_flight))
+
+    progress.report(force=True)
+    return progress.get_status()
@@ -0,0 +1,212 @@
+import copy
+import queue
+import traceback
+import multiprocessing
+
+from sta_etl.plugin_handler.shared_leaves import SharedLeaves, attach_leaves
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _worker_main(conn, memory_limit):
+    """
+    Main loop of a worker subprocess. The worker receives
+    (plugin name, plugin state, data kind, data) and answers with
+    (status, processing success, result, error message) until it receives None.
+    The data kind is 'dict' for a data dictionary or 'shared' for the descriptors
+    of SharedLeaves(...).
+
+    .. note::
+        Only for private usage! Stick to the _
+
+    :param conn: multiprocessing Connection
+    :param memory_limit: int or None
+        Address space limit of this worker in bytes.
+    :return: None
+    """
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    # Import the loader to register all plugins in the class collector of this worker:
+    import sta_etl.plugin_handler.loader
+    from sta_etl.plugin_handler.etl_collector import ClassCollector
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+
+        plugin_name, plugin_state, data_kind, data = msg
+        try:
+            if data_kind == "shared":
+                data_dict = attach_leaves(data)
+            else:
+                data_dict = data
+            if plugin_name not in ClassCollector:
+                raise KeyError(f"Plugin {plugin_name} is not registered in the worker: Plugins which "
+                               f"are registered at runtime need the start method 'fork'")
+            plugin_obj = copy.copy(ClassCollector[plugin_name])
+            plugin_obj.__dict__.update(plugin_state)
+            plugin_obj.init()
+            plugin_obj.set_plugin_data(data_dict=data_dict)
+            plugin_obj.run()
+            answer = ("ok", plugin_obj.get_processing_success(), plugin_obj.get_result(), None)
+        except MemoryError:
+            answer = ("memory", False, None, traceback.format_exc())
+        except Exception:
+            answer = ("error", False, None, traceback.format_exc())
+        data_dict = None
+        plugin_obj = None
+        conn.send(answer)
+
+
+class _Worker():
+    """
+    A single worker subprocess with its pipe to the parent process.
+    """
+
+    def __init__(self, ctx, memory_limit):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main,
+                                   args=(child_conn, memory_limit),
+                                   daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self, kill=False):
+        if kill is False:
+            try:
+                self.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class PluginWorkerPool():
+    """
+    This is PluginWorkerPool(...) - A pool of reusable worker subprocesses which
+    run plugins isolated from the PluginLoader process. A plugin which exceeds the
+    wall-clock timeout is killed, same as a plugin which crashes its worker (e.g.
+    segmentation fault or memory limit). The worker is replaced and the pool
+    continues with the next job.
+
+    .. note::
+        With shared_leaves=True, the numeric columns of the leaves are handed over as
+        memory-mapped files instead of being pickled through the pipe (see
+        SharedLeaves in shared_leaves.py). The files are removed after every run.
+
+        Workers are started with the 'spawn' method by default and register the
+        plugins by importing the loader. Plugins which are registered at runtime
+        are only known to the workers with the 'fork' start method.
+
+    :Example:
+        pool = PluginWorkerPool(n_workers=4, timeout=600, memory_limit=4 * 1024 ** 3)
+        pl = PluginLoader()
+        pl.set_worker_pool(pool)
+        pl.process_branches(track_hashes, max_workers=4)
+        pool.close()
+    """
+
+    def __init__(self, n_workers=1, timeout=None, memory_limit=None, start_method="spawn",
+                 shared_leaves=False, shared_min_bytes=1024 ** 2):
+        """
+        PluginWorkerPool constructor.
+
+        :param n_workers: int
+            Number of worker subprocesses.
+        :param timeout: float or None
+            Wall-clock timeout for a single plugin run in seconds. None for no limit.
+        :param memory_limit: int or None
+            Address space limit of each worker in bytes. None for no limit.
+        :param start_method: str
+            A multiprocessing start method ('spawn', 'fork', 'forkserver')
+        :param shared_leaves: bool
+            Hand over numeric leaf columns as memory-mapped files.
+        :param shared_min_bytes: int
+            Leaves smaller than this are pickled anyway.
+        """
+        self.n_workers = n_workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.shared_leaves = shared_leaves
+        self.shared_min_bytes = shared_min_bytes
+        self._ctx = multiprocessing.get_context(start_method)
+        self._idle = queue.Queue()
+        for _ in range(n_workers):
+            self._idle.put(_Worker(self._ctx, self.memory_limit))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def run(self, plugin_obj, data_dict):
+        """
+        Run a plugin in one of the worker subprocesses. The call blocks until a worker
+        is idle.
+
+        :param plugin_obj: object
+            A plugin object from the class collector. Its members are handed over
+            to the worker.
+        :param data_dict: dictionary
+            The plugin data such as it is used by set_plugin_data(...)
+        :return: tuple
+            (status, processing success, result, error message)
+            status is one of 'ok', 'error', 'memory', 'timeout', 'crashed'
+        """
+        plugin_name = type(plugin_obj).__name__
+        plugin_state = plugin_obj.__dict__
+
+        # The shared files are created only when a worker is ready to read them, so
+        # waiting jobs do not hold copies of their leaves in /dev/shm:
+        worker = self._idle.get()
+        shared = None
+        try:
+            if self.shared_leaves:
+                shared = SharedLeaves(data_dict, min_bytes=self.shared_min_bytes)
+                message = (plugin_name, plugin_state, "shared", shared.descriptors)
+            else:
+                message = (plugin_name, plugin_state, "dict", data_dict)
+        except Exception:
+            self._idle.put(worker)
+            raise
+
+        try:
+            worker.conn.send(message)
+            if worker.conn.poll(self.timeout):
+                answer = worker.conn.recv()
+            else:
+                answer = ("timeout", False, None, f"Plugin {plugin_name} exceeded {self.timeout} s")
+                worker.stop(kill=True)
+                worker = _Worker(self._ctx, self.memory_limit)
+        except (EOFError, OSError, BrokenPipeError):
+            exitcode = worker.process.exitcode
+            answer = ("crashed", False, None, f"Worker of {plugin_name} died (exit code {exitcode})")
+            worker.stop(kill=True)
+            worker = _Worker(self._ctx, self.memory_limit)
+        finally:
+            self._idle.put(worker)
+            if shared is not None:
+                shared.release()
+
+        return answer
+
+    def close(self):
+        """
+        Stop all worker subprocesses.
+
+        :return: None
+        """
+        for _ in range(self.n_workers):
+            self._idle.get().stop()
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import threading
+
+# Final leaf statuses of a unit: Processing it again in the same run changes nothing.
+TERMINAL_STATUSES = ["processed", "failed"]
+
+
+class RunJournal():
+    """
+    This is RunJournal(...) - An append-only journal of a processing run. Every line
+    of the journal file is a JSON object which describes one event of a unit of work.
+    A unit is a (track hash, leaf name) pair:
+    - new_plan: A new run starts, all units before are forgotten (see new_plan(...)).
+    - planned: The unit is part of the batch run.
+    - started: The PluginLoader registered the leaf as 'processing' in the database.
+    - finished: The plugin run ended with a final leaf status ('processed', 'retry', 'failed').
+    - skipped: The PluginLoader did not run the plugin, e.g. the leaf was processed
+      already or a dependency is not available.
+    - reset: A unit was set back in the database ('retry' after a died run or 'stale' after
+      PluginLoader.invalidate(...)).
+
+    When a batch run dies, a new RunJournal(...) on the same file replays the events.
+    Completed units (skipped or finished with a status of TERMINAL_STATUSES) are skipped
+    without asking the database and units which started but never finished are reported
+    by get_unfinished() for cleanup (see PluginLoader.recover_journal()).
+
+    :Example:
+        journal = RunJournal("/data/runs/run_2021_03.jsonl")
+        pl = PluginLoader()
+        pl.set_journal(journal)
+        pl.recover_journal()
+        for track_hash in journal.get_pending_tracks():
+            pl.process_branch(track_hash)
+    """
+
+    def __init__(self, journal_path, fsync=False):
+        """
+        RunJournal constructor. An existing journal file is replayed.
+
+        :param journal_path: str
+            Path to the journal file. It is created if it does not exist.
+        :param fsync: bool
+            Force every event to disk with os.fsync(...). Safer against power loss,
+            but slower.
+        """
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._units = {}
+        self._plan = {}
+        self._request = None
+        self.replay()
+        self._f = open(self.journal_path, "a")
+
+    def close(self):
+        """
+        Close the journal file.
+
+        :return: None
+        """
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+    def replay(self):
+        """
+        Read the journal file and rebuild the state of all units. A broken last line
+        (e.g. the process died while writing) is ignored.
+
+        :return: None
+        """
+        self._units = {}
+        self._plan = {}
+        self._request = None
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(event)
+
+    def _apply(self, event):
+        """
+        Update the state of a unit with a single event.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        unit = (event.get("track_hash"), event.get("leaf_name"))
+        state = event.get("event")
+
+        if state == "new_plan":
+            self._units = {}
+            self._plan = {}
+            self._request = event.get("request")
+            return
+
+        if state == "planned":
+            self._plan.setdefault(unit[0], [])
+            if unit[1] not in self._plan[unit[0]]:
+                self._plan[unit[0]].append(unit[1])
+            self._units.setdefault(unit, {"state": "planned", "leaf_hash": None, "status": None})
+            return
+
+        unit_info = self._units.setdefault(unit, {"state": None, "leaf_hash": None, "status": None})
+        unit_info["state"] = state
+        if event.get("leaf_hash") is not None:
+            unit_info["leaf_hash"] = event.get("leaf_hash")
+        if event.get("status") is not None:
+            unit_info["status"] = event.get("status")
+
+    def _write(self, event):
+        """
+        Append a single event to the journal file.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        event["time"] = time.time()
+        with self._lock:
+            self._apply(event)
+            self._f.write(json.dumps(event) + "\n")
+            self._f.flush()
+            if self.fsync:
+                os.fsync(self._f.fileno())
+
+    def new_plan(self, request=None):
+        """
+        Start a new run: The units and the plan of the runs before are forgotten.
+
+        :param request: dictionary or None
+            A JSON-safe description of the run (e.g. track hash and leaf names) to decide
+            later if the plan belongs to the same request (see get_request()).
+        :return: None
+        """
+        self._write({"event": "new_plan", "request": request})
+
+    def get_request(self):
+        """
+        :return: dictionary or None
+            The request of the current plan (see new_plan(...))
+        """
+        return self._request
+
+    def plan(self, track_hash, leaf_names):
+        """
+        Record the units of a track which are part of this run. Units which are
+        planned already are not recorded again.
+
+        :param track_hash: str
+        :param leaf_names: list
+            A list of leaf names (str)
+        :return: None
+        """
+        for i_leaf_name in leaf_names:
+            if i_leaf_name in self._plan.get(track_hash, []):
+                continue
+            self._write({"event": "planned", "track_hash": track_hash, "leaf_name": i_leaf_name})
+
+    def start(self, track_hash, leaf_name, leaf_hash=None):
+        """
+        Record that a unit is registered as 'processing' in the database.
+
+        :param track_hash: str
+        :param leaf_name: str
+        :param leaf_hash: str or None
+        :return: None
+        """
+        self._write({"event": "started", "track_hash": track_hash,
+                     "leaf_name": leaf_name, "leaf_hash": leaf_hash})
+
+    def finish(self, track_hash, leaf_name, status, leaf_hash=None):
+        """
+        Record the final leaf status of a unit.
+
+        :param track_hash: str
+        :param leaf_name: str
+        :param status: str
+            The leaf status such as it is written to the database.
+        :param leaf_hash: str or None
+        :return: None
+        """
+        self._write({"event": "finished", "track_hash": track_hash,
+                     "leaf_name": leaf_name, "status": status, "leaf_hash": leaf_hash})
+
+    def skip(self, track_hash, leaf_name, reason):
+        """
+        Record that a unit was not run. A skipped unit is completed for this run.
+
+        :param track_hash: str
+        :param leaf_name: str
+        :param reason: str
+            Why the unit was skipped (e.g. 'processed', 'dependencies')
+        :return: None
+        """
+        self._write({"event": "skipped", "track_hash": track_hash,
+                     "leaf_name": leaf_name, "reason": reason})
+
+    def reset(self, track_hash, leaf_name, leaf_hash=None):
+        """
+        Record that a unit was set back in the database (unfinished after a died run or
+        invalidated, see PluginLoader.invalidate(...)).
+
+        :param track_hash: str
+        :param leaf_name: str
+        :param leaf_hash: str or None
+        :return: None
+        """
+        self._write({"event": "reset", "track_hash": track_hash,
+                     "leaf_name": leaf_name, "leaf_hash": leaf_hash})
+
+    def has_plan(self):
+        """
+        :return: bool
+            True if the journal holds planned units from a previous run.
+        """
+        return len(self._plan) > 0
+
+    def is_completed(self, track_hash, leaf_name):
+        """
+        :param track_hash: str
+        :param leaf_name: str
+        :return: bool
+            True if the unit was skipped or finished with a status of TERMINAL_STATUSES.
+        """
+        unit_info = self._units.get((track_hash, leaf_name))
+        if unit_info is None:
+            return False
+        if unit_info["state"] == "skipped":
+            return True
+        return unit_info["state"] == "finished" and unit_info["status"] in TERMINAL_STATUSES
+
+    def get_unfinished(self):
+        """
+        Return all units which started but never finished.
+
+        :return: list
+            A list of dictionaries with 'track_hash', 'leaf_name' and 'leaf_hash'
+        """
+        return [{"track_hash": unit[0], "leaf_name": unit[1], "leaf_hash": unit_info["leaf_hash"]}
+                for unit, unit_info in self._units.items() if unit_info["state"] == "started"]
+
+    def get_pending_tracks(self):
+        """
+        Return all tracks with at least one planned unit which is not completed.
+        The order is the order of planning.
+
+        :return: list
+            A list of track hashes (str)
+        """
+        return [track_hash for track_hash, leaf_names in self._plan.items()
+                if not all(self.is_completed(track_hash, i_leaf) for i_leaf in leaf_names)]
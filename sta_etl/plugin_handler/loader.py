@@ -4,10 +4,35 @@ from sta_etl.plugins.plugin_dev1 import Plugin_Dev1
 from sta_etl.plugins.plugin_dev2 import Plugin_Dev2
 from sta_etl.plugins.plugin_aggregates import Plugin_SimpleProjection
 from sta_etl.plugins.plugin_simple_distances import Plugin_SimpleDistance
+from sta_etl.plugins.plugin_splits import Plugin_Splits
+from sta_etl.plugins.plugin_spatial_index import Plugin_SpatialIndex
+from sta_etl.plugins.plugin_route_signature import Plugin_RouteSignature
+from sta_etl.plugins.plugin_simplified_track import Plugin_SimplifiedTrack
+from sta_etl.plugins.plugin_resampled_track import Plugin_ResampledTrack
+from sta_etl.plugins.plugin_best_efforts import Plugin_BestEfforts
+from sta_etl.plugins.plugin_sketches import Plugin_Sketches
+from sta_etl.plugins.plugin_gps_clean import Plugin_GpsClean
+from sta_etl.plugins.plugin_moving_time import Plugin_MovingTime
+from sta_etl.plugins.plugin_climbs import Plugin_Climbs
+from sta_etl.plugins.plugin_heatmap import Plugin_Heatmap
+from sta_etl.plugins.plugin_segment_efforts import Plugin_SegmentEfforts
+
+from sta_etl.plugin_handler.admission import AdmissionController
+from sta_etl.plugin_handler.isolation import PluginWorkerPool
+from sta_etl.plugin_handler.journal import RunJournal
+from sta_etl.plugin_handler import serializers
 
 import re
+import os
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
+# Number of rows at the end of the old rows of a dependency which are compared in
+# append mode (see PluginLoader._get_append_data(...)):
+APPEND_TAIL_ROWS = 64
+
 class PluginLoader():
     """
     This is PluginLoader(...) - This class handles all registered plugins to this tool
@@ -51,14 +76,40 @@ class PluginLoader():
                 the (unique) leaf name back to the chosen plugin name.
                 This can be become more complicated of course in the future. Implement this
                 in get_all_existing_leaf_names(...) later.
+            self.leaf_dependents: The reverse dependency index: A dictionary from a leaf name
+                to the leaf names of all plugins which depend on it directly.
             self.overwrite: A bool to control if you are up to re-create a plugin again.
+            self.admission: An AdmissionController(...) which bounds the memory of
+                concurrently processed plugins. None means no memory control.
+                See set_admission_controller(...)
+            self.worker_pool: A PluginWorkerPool(...) to run plugins in worker subprocesses
+                with timeout and memory limit. None means plugins run in this process.
+                See set_worker_pool(...)
+            self.journal: A RunJournal(...) which records the processing of every
+                (track, leaf) unit to resume a batch run. See set_journal(...)
+            self.store_path: A directory for stores across tracks (e.g. a spatial index)
+                which plugins maintain next to their leaves. See set_store_path(...)
+            self.ephemeral_leaves: Leaf names which are never written when they are only
+                processed as a dependency of a requested plugin. See set_ephemeral_leaves(...)
+            self.max_attempts: Number of runs of a plugin which failed on a track before
+                it is not run again. See set_max_attempts(...)
 
 
         """
         self.dbh = None
         self.all_leaves = []
         self.leaf_name_to_plugin_name = {}
+        self.leaf_dependents = {}
         self.overwrite = False
+        self.plugins_to_process = None
+        self.admission = None
+        self.worker_pool = None
+        self.journal = None
+        self.store_path = None
+        self.ephemeral_leaves = set()
+        self.max_attempts = 3
+        self._branch_stats = threading.local()
+        self._dbh_lock = threading.RLock()
         self.get_all_existing_leaf_names()
 
         # clean up
@@ -74,18 +125,68 @@ class PluginLoader():
         requested to be processed but it is not contained in this list
         something is wrong! The function is called as part of the init
         process of PluginLoader(...)
+        The reverse dependency index self.leaf_dependents is built along the way.
         :return: None
         """
         self.all_leaves = []
         self.leaf_name_to_plugin_name = {}
+        self.leaf_dependents = {}
         for i_plugin in NameCollector:
             # print(i_plugin)
             it = ClassCollector[i_plugin]
             k = it.get_plugin_config()
             self.all_leaves.append(it.get_plugin_config().get("leaf_name"))
             self.leaf_name_to_plugin_name[it.get_plugin_config().get("leaf_name")] = i_plugin
+            for i_dep in k.get("plugin_dependencies", []):
+                self.leaf_dependents.setdefault(i_dep, []).append(k.get("leaf_name"))
             del it
 
+    def get_downstream_leaves(self, leaf_name):
+        """
+        All leaves which depend directly or indirectly on a leaf (see self.leaf_dependents).
+
+        :param leaf_name: str
+        :return: list
+            Leaf names in processing order: Every leaf comes after the leaves it depends on.
+        """
+        downstream = set()
+        stack = [leaf_name]
+        while len(stack) > 0:
+            for i_dependent in self.leaf_dependents.get(stack.pop(), []):
+                if i_dependent not in downstream:
+                    downstream.add(i_dependent)
+                    stack.append(i_dependent)
+
+        # Order by the longest dependency path from leaf_name:
+        depth = {leaf_name: 0}
+        def _depth(i_leaf):
+            if i_leaf not in depth:
+                deps = ClassCollector[self.leaf_name_to_plugin_name[i_leaf]].get_plugin_config().get("plugin_dependencies")
+                depth[i_leaf] = 1 + max(_depth(i_dep) for i_dep in deps if i_dep in downstream or i_dep == leaf_name)
+            return depth[i_leaf]
+        return sorted(downstream, key=lambda i_leaf: (_depth(i_leaf), i_leaf))
+
+    def get_upstream_leaves(self, leaf_name):
+        """
+        All leaves which a leaf depends on directly or indirectly. Leaves which are not
+        produced by a plugin (e.g. 'gps') are included.
+
+        :param leaf_name: str
+        :return: list
+            Leaf names (sorted)
+        """
+        upstream = set()
+        stack = [leaf_name]
+        while len(stack) > 0:
+            i_plugin = self.leaf_name_to_plugin_name.get(stack.pop())
+            if i_plugin is None:
+                continue
+            for i_dep in ClassCollector[i_plugin].get_plugin_config().get("plugin_dependencies", []):
+                if i_dep not in upstream:
+                    upstream.add(i_dep)
+                    stack.append(i_dep)
+        return sorted(upstream)
+
     def set_processor_plugins(self, plugins=None):
         """
         Plugin names set externally to specify which plugins are going to be
@@ -148,6 +249,290 @@ class PluginLoader():
         """
         self.dbh = dbh
 
+    def set_store_path(self, store_path):
+        """
+        Set the directory for stores across tracks. Plugins which maintain such a store
+        get the path together with the track hash by set_plugin_context(...) before
+        they run.
+
+        :param store_path: str
+        :return: -
+        """
+        self.store_path = store_path
+
+    def set_ephemeral_leaves(self, leaf_names=None):
+        """
+        Mark leaves as ephemeral for this run. An ephemeral leaf which is only required
+        by another plugin is processed in memory, handed over directly to the depending
+        plugins of the same branch and never written to the database. Plugins can mark
+        their leaf as ephemeral with 'ephemeral': True in their plugin configuration.
+
+        .. note::
+            A leaf of a requested plugin (see set_processor_plugins(...)) is always written.
+            Ephemeral leaves which exist in the database already are read from there.
+
+        :param leaf_names: str or list or None
+            Leaf names, a string can be separated by ','. None resets the list.
+        :return: -
+        """
+        if leaf_names is None:
+            leaf_names = []
+        elif isinstance(leaf_names, str):
+            leaf_names = [i.strip() for i in leaf_names.split(",") if len(i.strip()) > 0]
+        self.ephemeral_leaves = set(leaf_names)
+
+    def is_ephemeral(self, leaf_name):
+        """
+        :param leaf_name: str
+        :return: bool
+            True if the leaf is ephemeral by set_ephemeral_leaves(...) or by its plugin.
+        """
+        if leaf_name in self.ephemeral_leaves:
+            return True
+        plugin_name = self.leaf_name_to_plugin_name.get(leaf_name)
+        if plugin_name is None:
+            return False
+        return ClassCollector[plugin_name].get_plugin_config().get("ephemeral", False) is True
+
+    def read_user_branches(self, user_hash):
+        """
+        Read the branch information of all tracks of a user from the database.
+
+        :param user_hash: str
+        :return: list
+            A list of branch dictionaries such as they come from sta-core
+        """
+        with self._dbh_lock:
+            return self.dbh.read_branch(key="user_hash", attribute=user_hash)
+
+    def set_admission_controller(self, admission):
+        """
+        Handover an AdmissionController(...) to bound the memory which is used by
+        plugins which are processed at the same time (see process_branches(...)).
+
+        :param admission: AdmissionController or None
+            None switches the memory control off.
+        :return: -
+        """
+        if admission is not None and not isinstance(admission, AdmissionController):
+            raise TypeError("admission must be an AdmissionController")
+        self.admission = admission
+
+    def set_worker_pool(self, worker_pool):
+        """
+        Handover a PluginWorkerPool(...) to run every plugin in a worker subprocess.
+        Plugins which run into the timeout or crash their worker are registered with
+        the leaf status 'failed' and the processing continues with the next plugin.
+
+        :param worker_pool: PluginWorkerPool or None
+            None runs the plugins in this process again.
+        :return: -
+        """
+        if worker_pool is not None and not isinstance(worker_pool, PluginWorkerPool):
+            raise TypeError("worker_pool must be a PluginWorkerPool")
+        self.worker_pool = worker_pool
+
+    def set_max_attempts(self, max_attempts=3):
+        """
+        Set the number of runs of a plugin which failed (exception, crash or timeout) on
+        a track before the plugin is not run again for that track. The failed runs are
+        counted in 'leaf_attempts' of the leaf configuration. invalidate(...) resets the
+        count.
+
+        :param max_attempts: int or None
+            None runs failed plugins again on every run.
+        :return: -
+        """
+        self.max_attempts = max_attempts
+
+    def set_journal(self, journal):
+        """
+        Handover a RunJournal(...) to record started and finished units. Units which
+        are completed according to the journal are skipped without a database request.
+
+        :param journal: RunJournal or None
+        :return: -
+        """
+        if journal is not None and not isinstance(journal, RunJournal):
+            raise TypeError("journal must be a RunJournal")
+        self.journal = journal
+
+    def get_leaf_names(self, plugins):
+        """
+        Translate plugin names into the leaf names they produce.
+
+        :param plugins: list
+            A list of plugin names such as they are registered in the ClassCollector
+        :return: list
+        """
+        return [ClassCollector[i_plugin].get_plugin_config().get("leaf_name") for i_plugin in plugins]
+
+    def recover_journal(self):
+        """
+        Clean up after a batch run which died: All units of the journal which started
+        but never finished are still registered as 'processing' in the database. We set
+        them back to 'retry' to allow processing them again.
+
+        :return: list
+            The list of units which were reset (see RunJournal.get_unfinished())
+        """
+        if self.journal is None:
+            return []
+
+        unfinished = self.journal.get_unfinished()
+        for i_unit in unfinished:
+            print(f"Reset unfinished leaf {i_unit['leaf_name']} of track {i_unit['track_hash']}")
+            with self._dbh_lock:
+                leaf_config = self.dbh.create_leaf_config(leaf_name=i_unit["leaf_name"],
+                                                          track_hash=i_unit["track_hash"],
+                                                          columns=["None"],
+                                                          status="retry")
+                self.dbh.write_leaf(track_hash=i_unit["track_hash"],
+                                    leaf_config=leaf_config,
+                                    leaf=None,
+                                    leaf_type="ConfigWrite")
+            self.journal.reset(track_hash=i_unit["track_hash"],
+                               leaf_name=i_unit["leaf_name"],
+                               leaf_hash=i_unit["leaf_hash"])
+        return unfinished
+
+    def invalidate(self, leaf_name, track_hashes):
+        """
+        Mark a leaf and everything downstream of it as 'stale' for the given tracks, e.g.
+        after the logic of a plugin changed or a 'gps' leaf was corrected. The next
+        process_branch(...) recomputes exactly the stale leaves of the requested plugins
+        (and the stale leaves they depend on). Nothing else is processed again.
+
+        .. note::
+            A leaf which is not produced by a plugin (e.g. 'gps') is not marked itself,
+            only its downstream leaves. Leaves which do not exist for a track are skipped.
+            Stale leaves are not served by read_leaf(...) anymore.
+
+        :param leaf_name: str
+        :param track_hashes: list
+            Track hashes (str)
+        :return: dictionary
+            track_hash -> list of the leaf names which were marked stale
+        """
+        affected = self.get_downstream_leaves(leaf_name)
+        if leaf_name in self.all_leaves:
+            affected = [leaf_name] + affected
+
+        invalidated = {}
+        for i_track_hash in track_hashes:
+            with self._dbh_lock:
+                existing_leaves = self.dbh.get_all_leaves_for_track(track_hash=i_track_hash)
+            if existing_leaves is None:
+                continue
+
+            invalidated[i_track_hash] = []
+            for i_leaf in existing_leaves.values():
+                if i_leaf.get("name") not in affected or i_leaf.get("status") == "stale":
+                    continue
+                with self._dbh_lock:
+                    leaf_config = self.dbh.create_leaf_config(leaf_name=i_leaf.get("name"),
+                                                              track_hash=i_track_hash,
+                                                              columns=i_leaf.get("columns", ["None"]),
+                                                              status="stale")
+                    # Keep the data location and the append information of the old leaf (see i_process(...)):
+                    for i_key in ["leaf_hash", "leaf_attrs", "leaf_format", "leaf_codec", "leaf_path",
+                                  "leaf_incremental"]:
+                        if i_key in i_leaf:
+                            leaf_config[i_key] = i_leaf[i_key]
+                    self.dbh.write_leaf(track_hash=i_track_hash,
+                                        leaf_config=leaf_config,
+                                        leaf=None,
+                                        leaf_type="ConfigWrite")
+                if self.journal is not None:
+                    self.journal.reset(track_hash=i_track_hash,
+                                       leaf_name=i_leaf.get("name"),
+                                       leaf_hash=leaf_config.get("leaf_hash"))
+                invalidated[i_track_hash].append(i_leaf.get("name"))
+        return invalidated
+
+    def _invalidate_changed_inputs(self, track_hash, existing_leaves):
+        """
+        Mark the processed leaves of incremental plugins stale (and their downstream
+        leaves, see invalidate(...)) if one of their dependencies has another leaf hash
+        than at the last run, e.g. a new 'gps' leaf of a live track. The next run updates
+        them in append mode.
+
+        .. note::
+            Only for private usage! Stick to the _
+
+        :param track_hash: str
+        :param existing_leaves: dictionary or None
+            Leaf hash -> leaf description of the branch
+        :return: list
+            The leaf names which were marked stale
+        """
+        if existing_leaves is None:
+            return []
+        leaf_hashes = {i.get("name"): i.get("leaf_hash") for i in existing_leaves.values()}
+
+        changed = []
+        for i_leaf in existing_leaves.values():
+            incremental = i_leaf.get("leaf_incremental")
+            if i_leaf.get("status") != "processed" or not incremental:
+                continue
+            for i_input_name, i_input in incremental.get("inputs", {}).items():
+                # Leaves written before the leaf hash was kept are not compared:
+                if i_input.get("leaf_hash") is None or i_input_name not in leaf_hashes:
+                    continue
+                if i_input.get("leaf_hash") != leaf_hashes[i_input_name]:
+                    print(f"Leaf {i_input_name} of {track_hash} changed: Update leaf {i_leaf.get('name')}")
+                    changed.append(i_leaf.get("name"))
+                    break
+
+        invalidated = []
+        for i_leaf_name in changed:
+            invalidated.extend(self.invalidate(i_leaf_name, [track_hash]).get(track_hash, []))
+        return invalidated
+
+    def _run_plugin(self, plugin_obj, data_dict):
+        """
+        Run a plugin either in this process or in the worker pool.
+
+        .. note::
+            Only for private usage! Stick to the _
+
+        :param plugin_obj: object
+            Initiated plugin from the plugin collector
+        :param data_dict: dictionary
+            The data for set_plugin_data(...)
+        :return: tuple
+            (status, processing success, result, error message) with status
+            'ok', 'error', 'memory', 'timeout' or 'crashed'
+        """
+        if self.worker_pool is not None:
+            return self.worker_pool.run(plugin_obj=plugin_obj, data_dict=data_dict)
+
+        try:
+            plugin_obj.init()
+            plugin_obj.set_plugin_data(data_dict=data_dict)
+            plugin_obj.run()
+        except MemoryError as e:
+            return "memory", False, None, repr(e)
+        except Exception as e:
+            return "error", False, None, repr(e)
+        return "ok", plugin_obj.get_processing_success(), plugin_obj.get_result(), None
+
+    def _get_plugin(self, plugin_name):
+        """
+        Return a private copy of a registered plugin object from the class collector.
+        Plugins keep their processing state (data, result) in their members, so every
+        processing call gets its own copy to allow processing several tracks at the
+        same time. The plugin configuration is shared with the registered plugin.
+
+        .. note::
+            Only for private usage! Stick to the _
+
+        :param plugin_name: str
+            A plugin name such as it is registered in the ClassCollector
+        :return: object
+        """
+        return copy.copy(ClassCollector[plugin_name])
+
     # def set_track_by_hash(self, track_hash):
     #     """
     #     The PluginLoader can process many plugins. Therefore, this member
@@ -167,13 +552,16 @@ class PluginLoader():
     #     self.existing_leaves = existing_leaves
     #     self.existing_leaf_names = list(existing_leaves.keys())
 
-    def _read_leaf_data(self, required_leaves):
+    def _read_leaf_data(self, required_leaves, columns=None):
         """
         This helper function allows you to handle data requests from sta core.
         All it needs to get a list of leaves from the 'leaf' description in the
         underlying database.
 
         .. note::
+            Leaves with 'leaf_format' in their configuration are read from the store
+            directory with the serializer of that format (see serializers.py).
+
             Right now, Pandas dataframes are used as exchange objects. We can change
             this at any point, but then we need to communicate this to this function.
             as well. Otherwise, the sta-core handler tries to load data always as
@@ -184,6 +572,8 @@ class PluginLoader():
         :param required_leaves: list
             A list of dictionaries. Each dictionary must contain 'name' and 'leaf_hash'
             to communicate with sta-core.
+        :param columns: list or None
+            Read only these columns of every leaf.
         :return: dictionary
             A dictionary with objects which are representing the data from the storage
             facility.
@@ -194,13 +584,143 @@ class PluginLoader():
             i_leaf_name = i_leaf.get("name")
             i_leaf_hash = i_leaf.get("leaf_hash")
 
-            df_i = self.dbh.read_leaf(directory=i_leaf_name,
-                                      leaf_hash=i_leaf_hash,
-                                      leaf_type="DataFrame")
+            if i_leaf.get("leaf_format") is not None:
+                # The leaf was written by a serializer of this package (see i_process(...))
+                if self.store_path is None:
+                    raise ValueError(f"Leaf {i_leaf_name} is a {i_leaf.get('leaf_format')} file in the store "
+                                     f"directory: Set the store path first (set_store_path(...))")
+                df_i = serializers.read_leaf(path=os.path.join(self.store_path, i_leaf.get("leaf_path")),
+                                             leaf_format=i_leaf.get("leaf_format"),
+                                             columns=columns,
+                                             codec=i_leaf.get("leaf_codec", "none"))
+            else:
+                df_i = self.dbh.read_leaf(directory=i_leaf_name,
+                                          leaf_hash=i_leaf_hash,
+                                          leaf_type="DataFrame")
+                if columns is not None and isinstance(df_i, pd.DataFrame):
+                    df_i = df_i[columns]
+            # Restore the summary of the leaf (see i_process(...)):
+            if i_leaf.get("leaf_attrs") and isinstance(df_i, pd.DataFrame):
+                df_i.attrs.update(i_leaf.get("leaf_attrs"))
+            # Rows per leaf of the branch in process (see process_branch(...)):
+            branch_rows = getattr(self._branch_stats, "rows", None)
+            if branch_rows is not None and isinstance(df_i, pd.DataFrame):
+                branch_rows[i_leaf_name] = max(branch_rows.get(i_leaf_name, 0), len(df_i))
             leaves_db[i_leaf_name] = df_i
 
         return leaves_db
 
+    def _get_processed_leaf(self, existing_leaves, leaf_name):
+        """
+        Find the processed leaf with a name in the leaves of a track.
+
+        .. note::
+            Only for private usage! Stick to the _
+
+        :param existing_leaves: dictionary or None
+            The leaves of a track from get_all_leaves_for_track(...)
+        :param leaf_name: str
+        :return: dictionary or None
+            The leaf description or None if there is no processed leaf with this name.
+        """
+        if existing_leaves is None:
+            return None
+        for i_leaf in existing_leaves.values():
+            if i_leaf.get("name") == leaf_name and i_leaf.get("status") == "processed":
+                return i_leaf
+        return None
+
+    def read_leaf(self, track_hash, leaf_name, columns=None):
+        """
+        Read a single processed leaf of a track.
+
+        :param track_hash: str
+        :param leaf_name: str
+        :param columns: list or None
+            Read only these columns.
+        :return: pd.DataFrame or None
+            None if the track has no processed leaf with this name.
+        """
+        with self._dbh_lock:
+            existing_leaves = self.dbh.get_all_leaves_for_track(track_hash=track_hash)
+
+        leaf_info = self._get_processed_leaf(existing_leaves, leaf_name)
+        if leaf_info is None:
+            return None
+        return self._read_leaf_data(required_leaves=[leaf_info], columns=columns).get(leaf_name)
+
+    def iter_leaves(self, track_hashes, leaf_name, columns=None, max_workers=8, batch_size=100):
+        """
+        Read the processed leaf of many tracks with a pool of I/O threads and yield them
+        in batches. Every batch is one DataFrame with an additional column 'track_hash',
+        so streaming consumers hold only one batch in memory.
+
+        .. note::
+            The leaf descriptions of a batch are looked up in one pass while the
+            database handler is locked once. Only then the leaf files are read in
+            parallel, so the I/O threads never wait for each other at the database
+            handler. Tracks without a processed leaf are skipped.
+
+        :param track_hashes: iterable
+            Track hashes (str)
+        :param leaf_name: str
+        :param columns: list or None
+            Read only these columns.
+        :param max_workers: int
+            Number of I/O threads.
+        :param batch_size: int
+            Number of tracks per batch.
+        :return: generator
+            pd.DataFrame per batch (in the order of track_hashes)
+        """
+        def _read(track_leaf):
+            track_hash, leaf_info = track_leaf
+            df = self._read_leaf_data(required_leaves=[leaf_info], columns=columns).get(leaf_name)
+            if df is None:
+                return None
+            return df.assign(track_hash=track_hash)
+
+        track_hashes = iter(track_hashes)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                batch = [i for _, i in zip(range(batch_size), track_hashes)]
+                if len(batch) == 0:
+                    break
+                with self._dbh_lock:
+                    batch_existing = [self.dbh.get_all_leaves_for_track(track_hash=i) for i in batch]
+                batch_leaves = [(i, self._get_processed_leaf(j, leaf_name)) for i, j in zip(batch, batch_existing)]
+                batch_leaves = [i for i in batch_leaves if i[1] is not None]
+                frames = [i_df for i_df in executor.map(_read, batch_leaves) if i_df is not None]
+                if len(frames) > 0:
+                    yield pd.concat(frames, ignore_index=True)
+
+    def read_leaves(self, track_hashes, leaf_name, columns=None, max_workers=8):
+        """
+        Read the processed leaf of many tracks into one DataFrame with an additional
+        column 'track_hash' (see iter_leaves(...)).
+
+        :Example:
+            df = pl.read_leaves(track_hashes, "simple_projection", max_workers=16)
+
+        :param track_hashes: iterable
+            Track hashes (str)
+        :param leaf_name: str
+        :param columns: list or None
+            Read only these columns.
+        :param max_workers: int
+            Number of I/O threads.
+        :return: pd.DataFrame or None
+            None if no track has a processed leaf with this name.
+        """
+        frames = list(self.iter_leaves(track_hashes=track_hashes,
+                                       leaf_name=leaf_name,
+                                       columns=columns,
+                                       max_workers=max_workers,
+                                       batch_size=1000))
+        if len(frames) == 0:
+            return None
+        return pd.concat(frames, ignore_index=True)
+
     def _evaluate(self, existing_leaves, depending_leaves, leaf_name):
         """
         This function evaluates under certain logic what plugins/leaves are required
@@ -262,7 +782,9 @@ class PluginLoader():
         Holds the logic and process executive for processing a branch
         with given set (or all) plugins which apply here.
         :param track_hash:
-        :return:
+        :return: dictionary
+            Leaf name -> number of rows of the leaves which were read to process this
+            branch (e.g. the number of points with 'gps'). Empty if nothing was processed.
         """
 
         # If plugin pre-setting done is not correctly we archive it by
@@ -270,9 +792,29 @@ class PluginLoader():
         if self.plugins_to_process is None:
             self.set_processor_plugins()
 
+        # Nothing to do if the journal knows that all requested leaves are processed:
+        if self.journal is not None:
+            leaf_names = self.get_leaf_names(self.plugins_to_process)
+            if all(self.journal.is_completed(track_hash, i_leaf) for i_leaf in leaf_names):
+                print(f"Track {track_hash} is completed according to the journal")
+                return {}
+
         # Get information for existing branches for that the track hash:
-        branch_existing_leaves = self.dbh.get_all_leaves_for_track(track_hash=track_hash)
-        branch_existing_leaves_names = [i.get("name") for i in branch_existing_leaves.values()]
+        with self._dbh_lock:
+            branch_existing_leaves = self.dbh.get_all_leaves_for_track(track_hash=track_hash)
+        # Incremental leaves whose dependencies got a new leaf hash are updated (append mode):
+        if len(self._invalidate_changed_inputs(track_hash, branch_existing_leaves)) > 0:
+            with self._dbh_lock:
+                branch_existing_leaves = self.dbh.get_all_leaves_for_track(track_hash=track_hash)
+        # Leaves which have to be processed again (e.g. reset after a died run or invalidated)
+        # do not count as existing, so they are processed again when another plugin depends on them.
+        branch_existing_leaves_names = [i.get("name") for i in branch_existing_leaves.values()
+                                        if i.get("status") not in ["retry", "failed", "stale"]]
+
+        # Ephemeral leaves of this branch live in memory only (see set_ephemeral_leaves(...)):
+        requested_leaves = self.get_leaf_names(self.plugins_to_process)
+        ephemeral_data = {}
+        self._branch_stats.rows = {}
 
         # We run through the list of required plugins and decide if we process it or not and
         # if we need to process more plugins along the way.
@@ -281,7 +823,7 @@ class PluginLoader():
             print("--------------------")
 
             # Get the right plugin for processing from the class collector:
-            process_obj = ClassCollector[i_plugin]
+            process_obj = self._get_plugin(i_plugin)
 
             # fetch the specific plugin configuration:
             leaf_config = process_obj.get_plugin_config()
@@ -300,21 +842,69 @@ class PluginLoader():
                     print("We need to process first", sub_i_plugin)
                     print(self.leaf_name_to_plugin_name[sub_i_plugin])
                     #self.i_process(process_obj, track_hash)
-                    process_obj_helper = ClassCollector[self.leaf_name_to_plugin_name[sub_i_plugin]]
-                    self.i_process(plugin_obj=process_obj_helper,
-                                   track_hash=track_hash)
+                    process_obj_helper = self._get_plugin(self.leaf_name_to_plugin_name[sub_i_plugin])
+                    if sub_i_plugin not in requested_leaves and self.is_ephemeral(sub_i_plugin):
+                        self.i_process(plugin_obj=process_obj_helper,
+                                       track_hash=track_hash,
+                                       ephemeral_data=ephemeral_data,
+                                       ephemeral=True)
+                    else:
+                        self.i_process(plugin_obj=process_obj_helper,
+                                       track_hash=track_hash,
+                                       ephemeral_data=ephemeral_data)
                     del process_obj_helper
 
             print("Let's process", i_plugin)
             # todo:
             # self.overwrite needs to be handled!
-            process_status = self.i_process(process_obj, track_hash)
+            process_status = self.i_process(process_obj, track_hash, ephemeral_data=ephemeral_data)
 
             del process_obj
+        del ephemeral_data
 
+        branch_rows = self._branch_stats.rows
+        self._branch_stats.rows = None
+        return branch_rows
 
+    def process_branches(self, track_hashes, max_workers=1):
+        """
+        Process a list of branches with process_branch(...) in a thread pool. Use
+        set_admission_controller(...) before to raise max_workers safely: every plugin
+        job waits then until its estimated memory fits into the memory budget.
+
+        .. note::
+            Plugin objects are copied per processing call (see _get_plugin(...)) and
+            calls to the database handler which modify the branch information are
+            serialized.
 
-    def i_process(self, plugin_obj, track_hash):
+        :param track_hashes: list
+            A list of track hashes (str)
+        :param max_workers: int
+            Number of branches which are processed at the same time.
+        :return: dictionary
+            A dictionary track_hash -> None or the Exception which stopped the processing
+            of that branch.
+        """
+        if self.plugins_to_process is None:
+            self.set_processor_plugins()
+        track_hashes = list(track_hashes)
+
+        def _process(track_hash):
+            try:
+                self.process_branch(track_hash)
+                return None
+            except Exception as e:
+                print(f"Processing of branch {track_hash} failed: {e!r}")
+                return e
+
+        if max_workers <= 1:
+            return {i_track: _process(i_track) for i_track in track_hashes}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(_process, track_hashes)
+            return dict(zip(track_hashes, results))
+
+    def i_process(self, plugin_obj, track_hash, ephemeral_data=None, ephemeral=False):
         """
         The i_process(...) function handles the full processing cycle once it is decided
         if processing should be executed. The full processing cycle contains the following
@@ -322,88 +912,371 @@ class PluginLoader():
         1) Register it to the database to avoid collision with other processing applications
         2) Run the "true" init function plugin_obj.init()
         3) Init the process instruction inside the plugin plugin_obj.process(...)
+           Plugins with a set_plugin_context(...) member get the track hash and the
+           store path before.
         4) Fetch the result from the plugin and write it back to the database for update
 
         .. note::
             This is not a strictly private function. You could use it even from outside.
 
+            Steps 2) and 3) run in a worker subprocess if a PluginWorkerPool(...) is set.
+            A plugin which raises an exception, crashes or runs into the timeout gets the
+            leaf status 'failed', a plugin which reports no success gets 'retry'.
+
+            With ephemeral=True, steps 1) and 4) are skipped: The result is put into
+            ephemeral_data only. Dependencies found in ephemeral_data are taken from
+            there instead of the database.
+
+            Plugins with "incremental": True in their configuration are updated in
+            append mode: The leaf configuration keeps the leaf hash, the row count and a
+            checksum of the last rows of every dependency and the carry-over state of the
+            plugin ('leaf_incremental'). A dependency with a new leaf hash marks the leaf
+            stale (see process_branch(...)). If the dependencies were only appended to
+            since (e.g. the 'gps' leaf of a live track), the plugin gets only the new rows
+            and its state via set_plugin_state(...). Its result is appended to the old
+            leaf. The plugin returns its new state in the 'carry_state' of DataFrame.attrs.
+
         :param plugin_obj: object
             Initiated plugin from the plugin collector
         :param track_hash: str
             the track hash such it is used in the database by sta-core
+        :param ephemeral_data: dictionary or None
+            Leaf name -> leaf data of the ephemeral leaves of this branch.
+        :param ephemeral: bool
+            Keep the result in ephemeral_data instead of writing it.
         :return: bool
             Return the processing status of the underlying plugin
         """
+        if ephemeral_data is None:
+            ephemeral_data = {}
 
         # Get the leaf configuration once again before starting:
         leaf_config = plugin_obj.get_plugin_config()
         leaf_name = leaf_config.get("leaf_name")
         plugin_dependencies = leaf_config.get("plugin_dependencies")
 
+        if ephemeral is True and leaf_name in ephemeral_data:
+            print("nothing to process (in memory)")
+            return False
+
+        if ephemeral is False and self.journal is not None and self.journal.is_completed(track_hash, leaf_name):
+            print("nothing to process (journal)")
+            return False
+
         # Make a cross-check with the database if requested plugin is already processed
         # or if another process is handling it right now.
-        existing_branch = self.dbh.read_branch(key="track_hash", attribute=track_hash)[0]
+        with self._dbh_lock:
+            existing_branch = self.dbh.read_branch(key="track_hash", attribute=track_hash)[0]
         db_leaf_info = [i for i in existing_branch.get("leaf").values() if i.get("name") == leaf_name]
         if len(db_leaf_info) == 1:
-            db_leaf_status = db_leaf_info[0].get("status")
+            db_leaf = db_leaf_info[0]
+            db_leaf_status = db_leaf.get("status")
         else:
+            db_leaf = None
             db_leaf_status = None
 
         if db_leaf_status == "processed" or db_leaf_status == "processing":
             print("nothing to process")
+            if ephemeral is False and self.journal is not None:
+                self.journal.skip(track_hash=track_hash, leaf_name=leaf_name, reason=db_leaf_status)
+            return False
+
+        # A plugin which failed too often on this track is not run again:
+        if db_leaf_status == "failed" and self.max_attempts is not None \
+                and db_leaf.get("leaf_attempts", 1) >= self.max_attempts:
+            print(f"nothing to process (failed {db_leaf.get('leaf_attempts', 1)} times)")
+            if ephemeral is False and self.journal is not None:
+                self.journal.skip(track_hash=track_hash, leaf_name=leaf_name, reason="attempts")
+            return False
+
+        # Use the information from the database about the plugin storage location. Leaves
+        # which are in memory are not read from the database:
+        required_leaves = [i for i in existing_branch.get("leaf").values()
+                           if i.get("name") in plugin_dependencies and i.get("name") not in ephemeral_data]
+        memory_leaves = {i_leaf_name: ephemeral_data[i_leaf_name] for i_leaf_name in plugin_dependencies
+                         if i_leaf_name in ephemeral_data}
+
+        # A dependency which failed (or is not there) has no data to read:
+        available = [i.get("name") for i in required_leaves
+                     if i.get("status") not in ["processing", "retry", "failed", "stale"]]
+        missing = [i for i in plugin_dependencies if i not in available and i not in memory_leaves]
+        if len(missing) > 0:
+            print(f"nothing to process (dependencies {missing} are not available)")
+            if ephemeral is False and self.journal is not None:
+                self.journal.skip(track_hash=track_hash, leaf_name=leaf_name, reason="dependencies")
             return False
+        required_leaves = [i for i in required_leaves if i.get("name") in available]
 
-        # Use the information from the database about the plugin storage location:
-        required_leaves = [i for i in existing_branch.get("leaf").values() if i.get("name") in plugin_dependencies]
+        # Wait until the expected memory of this job fits into the memory budget:
+        if self.admission is not None:
+            plugin_name = type(plugin_obj).__name__
+            estimate = self.admission.estimate_job(plugin_name=plugin_name,
+                                                   plugin_config=leaf_config,
+                                                   required_leaves=required_leaves)
+            self.admission.acquire(estimate)
+            try:
+                return self._i_process_admitted(plugin_obj, track_hash, leaf_name, required_leaves,
+                                                memory_leaves, ephemeral_data if ephemeral else None, db_leaf)
+            finally:
+                self.admission.release(estimate)
+
+        return self._i_process_admitted(plugin_obj, track_hash, leaf_name, required_leaves,
+                                        memory_leaves, ephemeral_data if ephemeral else None, db_leaf)
+
+    def _run_ephemeral(self, plugin_obj, track_hash, leaf_name, data_dict, ephemeral_data):
+        """
+        Run a plugin for an ephemeral leaf: Nothing is registered or written, the result
+        is put into ephemeral_data if the plugin succeeds.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        if hasattr(plugin_obj, "set_plugin_context"):
+            plugin_obj.set_plugin_context(track_hash=track_hash, store_path=self.store_path)
+
+        run_status, process_status, process_result, run_error = self._run_plugin(plugin_obj, data_dict)
+        if run_status != "ok":
+            print(f"Plugin {type(plugin_obj).__name__} failed on {track_hash} ({run_status}):")
+            print(run_error)
+            return False
+        if process_status is True:
+            ephemeral_data[leaf_name] = process_result
+        return process_status
+
+    def _get_append_data(self, plugin_obj, db_leaf, data_dict):
+        """
+        Decide if an incremental plugin can append to its old leaf: All dependencies must
+        have at least as many rows as before and the last APPEND_TAIL_ROWS of their old
+        rows must be unchanged (tail checksum).
+
+        .. note::
+            Append mode runs for a leaf which is stale: A dependency got a new leaf hash
+            (see _invalidate_changed_inputs(...)) or it was invalidated, e.g. by
+            invalidate("gps", ...) if new rows are written to the same leaf. Only the
+            tail of the old rows is hashed, so a change before the tail goes unseen:
+            Use invalidate(...) and remove the old leaf to process from the first row.
+
+            Only for private usage! Stick to the _
+
+        :param plugin_obj: object
+            Initiated plugin from the plugin collector
+        :param db_leaf: dictionary or None
+            The old leaf description from the database
+        :param data_dict: dictionary
+            The full data of the dependencies
+        :return: tuple or None
+            (data dictionary with the new rows only, old leaf, carry-over state) or None
+            if the leaf has to be processed from the first row.
+        """
+        if plugin_obj.get_plugin_config().get("incremental") is not True or db_leaf is None:
+            return None
+        incremental = db_leaf.get("leaf_incremental")
+        if not incremental or incremental.get("state") is None:
+            return None
+
+        inputs = incremental.get("inputs", {})
+        if set(inputs) != set(data_dict):
+            return None
+        new_data_dict = {}
+        for i_leaf_name, i_leaf_data in data_dict.items():
+            i_rows = inputs[i_leaf_name].get("rows")
+            if not isinstance(i_leaf_data, pd.DataFrame) or len(i_leaf_data) < i_rows:
+                return None
+            i_checksum = serializers.get_checksum(i_leaf_data, rows=i_rows, tail=APPEND_TAIL_ROWS)
+            if i_checksum != inputs[i_leaf_name].get("checksum"):
+                return None
+            new_data_dict[i_leaf_name] = i_leaf_data.iloc[i_rows:]
+
+        try:
+            old_leaf = self._read_leaf_data(required_leaves=[db_leaf]).get(db_leaf.get("name"))
+        except Exception as e:
+            print(f"Old leaf {db_leaf.get('name')} can not be read, process from the first row: {e!r}")
+            return None
+        if not isinstance(old_leaf, pd.DataFrame):
+            return None
+        return new_data_dict, old_leaf, incremental.get("state")
+
+    def _i_process_admitted(self, plugin_obj, track_hash, leaf_name, required_leaves,
+                            memory_leaves=None, ephemeral_data=None, db_leaf=None):
+        """
+        The part of i_process(...) which reads the data, runs the plugin and writes the
+        result. It is called once the job is admitted.
+
+        .. note::
+            Only for private usage! Stick to the _
+
+        :param plugin_obj: object
+            Initiated plugin from the plugin collector
+        :param track_hash: str
+        :param leaf_name: str
+            The leaf name of the plugin
+        :param required_leaves: list
+            A list of leaf descriptions from the database which are read for this plugin
+        :param memory_leaves: dictionary or None
+            Leaf name -> leaf data of required leaves which are in memory already
+        :param ephemeral_data: dictionary or None
+            If set, the leaf is ephemeral and its result goes into this dictionary only.
+        :param db_leaf: dictionary or None
+            The old leaf description from the database (see _get_append_data(...))
+        :return: bool
+            Return the processing status of the underlying plugin
+        """
         data_dict = self._read_leaf_data(required_leaves=required_leaves)
+        if self.admission is not None:
+            disk_sizes = {i.get("name"): i.get("size") for i in required_leaves}
+            for i_leaf_name, i_leaf_data in data_dict.items():
+                self.admission.observe_leaf(i_leaf_name, i_leaf_data, disk_size=disk_sizes.get(i_leaf_name))
+        if memory_leaves is not None:
+            data_dict.update(memory_leaves)
+
+        if ephemeral_data is not None:
+            return self._run_ephemeral(plugin_obj, track_hash, leaf_name, data_dict, ephemeral_data)
+
+        # Incremental plugins remember the leaf hash, the row count and the tail checksum
+        # of their dependencies:
+        incremental = plugin_obj.get_plugin_config().get("incremental") is True
+        if incremental:
+            input_hashes = {i.get("name"): i.get("leaf_hash") for i in required_leaves}
+            inputs = {i_leaf_name: {"leaf_hash": input_hashes.get(i_leaf_name),
+                                    "rows": len(i_leaf_data),
+                                    "checksum": serializers.get_checksum(i_leaf_data, tail=APPEND_TAIL_ROWS)}
+                      for i_leaf_name, i_leaf_data in data_dict.items()
+                      if isinstance(i_leaf_data, pd.DataFrame)}
+            append_data = self._get_append_data(plugin_obj, db_leaf, data_dict)
+        else:
+            append_data = None
+
+        if append_data is not None:
+            data_dict, old_leaf, carry_state = append_data
+            print(f"Append {max([len(i) for i in data_dict.values()] + [0])} rows to leaf {leaf_name} of {track_hash}")
+        else:
+            old_leaf, carry_state = None, None
+        if hasattr(plugin_obj, "set_plugin_state"):
+            plugin_obj.set_plugin_state(state=carry_state)
 
         # Create the leaf configuration at first and register it to the database
         obj_definition = ["None"]
         leaf_config_status = "processing"
-        leaf_config_final = self.dbh.create_leaf_config(leaf_name=leaf_name,
-                                                    track_hash=track_hash,
-                                                    columns=obj_definition,
-                                                    status=leaf_config_status)
+        with self._dbh_lock:
+            leaf_config_final = self.dbh.create_leaf_config(leaf_name=leaf_name,
+                                                        track_hash=track_hash,
+                                                        columns=obj_definition,
+                                                        status=leaf_config_status)
 
-        r = self.dbh.write_leaf(track_hash=track_hash,
-                                leaf_config=leaf_config_final,
-                                leaf=None,
-                                leaf_type="ConfigWrite"
-                                )
+            r = self.dbh.write_leaf(track_hash=track_hash,
+                                    leaf_config=leaf_config_final,
+                                    leaf=None,
+                                    leaf_type="ConfigWrite"
+                                    )
+        # The final leaf configuration keeps this leaf hash (see the journal):
+        leaf_hash = leaf_config_final.get("leaf_hash")
+        if self.journal is not None:
+            self.journal.start(track_hash=track_hash,
+                               leaf_name=leaf_name,
+                               leaf_hash=leaf_hash)
+
+        # Plugins which need to know about their track get the context now:
+        if hasattr(plugin_obj, "set_plugin_context"):
+            plugin_obj.set_plugin_context(track_hash=track_hash, store_path=self.store_path)
 
         # Let's do the processing:
-        # todo: Try and catch would be nice...
-        plugin_obj.init()
-        plugin_obj.set_plugin_data(data_dict=data_dict)
-        plugin_obj.run()
+        run_status, process_status, process_result, run_error = self._run_plugin(plugin_obj, data_dict)
+        del data_dict
 
         # fetch processor status:
-        process_status = plugin_obj.get_processing_success()
-        process_result = plugin_obj.get_result()
-        if process_status is True:
+        # A plugin which reports no success is retried, a plugin which raised an
+        # exception, crashed or ran into the timeout is marked as failed.
+        if run_status != "ok":
+            print(f"Plugin {type(plugin_obj).__name__} failed on {track_hash} ({run_status}):")
+            print(run_error)
+            process_status = False
+            process_result = None
+            leaf_config_status = "failed"
+        elif process_status is True:
             leaf_config_status = "processed"
         else:
             leaf_config_status = "retry"
 
         # Get to the final leaf configuration:
+        # A plugin can summarize its result in DataFrame.attrs (e.g. a compression ratio).
+        # The summary is stored in the leaf configuration as 'leaf_attrs'.
+        leaf_attrs = {}
+        carry_state = None
         if process_result is not None and isinstance(process_result, pd.DataFrame):
+            # The carry-over state of incremental plugins is not part of the summary:
+            carry_state = process_result.attrs.pop("carry_state", None)
+            if old_leaf is not None and process_status is True:
+                result_attrs = dict(process_result.attrs)
+                process_result = pd.concat([old_leaf, process_result], ignore_index=True)
+                process_result.attrs = result_attrs
             obj_definition = list(process_result.columns)
             leaf_type = "DataFrame"
             obj_df = process_result
+            leaf_attrs = dict(process_result.attrs)
         else:
             obj_definition = []
             leaf_type = "ConfigWrite"
             obj_df = None
 
-        leaf_config_final = self.dbh.create_leaf_config(leaf_name=leaf_name,
-                                                        track_hash=track_hash,
-                                                        columns=obj_definition,
-                                                        status=leaf_config_status)
+        with self._dbh_lock:
+            leaf_config_final = self.dbh.create_leaf_config(leaf_name=leaf_name,
+                                                            track_hash=track_hash,
+                                                            columns=obj_definition,
+                                                            status=leaf_config_status)
+        leaf_config_final["leaf_hash"] = leaf_hash
+        if len(leaf_attrs) > 0:
+            leaf_config_final["leaf_attrs"] = leaf_attrs
+        if incremental and process_status is True and carry_state is not None:
+            leaf_config_final["leaf_incremental"] = {"inputs": inputs, "state": carry_state}
+        # Count the failed runs in a row (see set_max_attempts(...)):
+        if leaf_config_status == "failed":
+            attempts = 0
+            if db_leaf is not None and db_leaf.get("status") == "failed":
+                attempts = db_leaf.get("leaf_attempts", 1)
+            leaf_config_final["leaf_attempts"] = attempts + 1
+
+        # Plugins can choose their own leaf format and codec ('leaf_format', 'leaf_codec'
+        # in the plugin configuration). The leaf is written to the store directory and
+        # only the leaf configuration goes to sta-core.
+        leaf_format = plugin_obj.get_plugin_config().get("leaf_format")
+        if obj_df is not None and leaf_format is not None:
+            if self.store_path is None:
+                print(f"No store path set: Leaf {leaf_name} is written by sta-core instead of {leaf_format}")
+            else:
+                leaf_codec = plugin_obj.get_plugin_config().get("leaf_codec", "none")
+                leaf_path = serializers.get_leaf_path(leaf_name=leaf_name,
+                                                      track_hash=track_hash,
+                                                      leaf_hash=leaf_config_final.get("leaf_hash"),
+                                                      leaf_format=leaf_format)
+                serializers.write_leaf(df=obj_df,
+                                       path=os.path.join(self.store_path, leaf_path),
+                                       leaf_format=leaf_format,
+                                       codec=leaf_codec)
+                leaf_config_final["leaf_format"] = leaf_format
+                leaf_config_final["leaf_codec"] = leaf_codec
+                leaf_config_final["leaf_path"] = leaf_path
+                obj_df = None
+                leaf_type = "ConfigWrite"
+
+        with self._dbh_lock:
+            r = self.dbh.write_leaf(track_hash=track_hash,
+                                    leaf_config=leaf_config_final,
+                                    leaf=obj_df,
+                                    leaf_type=leaf_type
+                                    )
+
+        # The file of the old leaf is not needed anymore once the new configuration is written:
+        old_path = db_leaf.get("leaf_path") if db_leaf is not None else None
+        if old_path is not None and old_path != leaf_config_final.get("leaf_path") and self.store_path is not None:
+            try:
+                os.remove(os.path.join(self.store_path, old_path))
+            except FileNotFoundError:
+                pass
 
-        r = self.dbh.write_leaf(track_hash=track_hash,
-                                leaf_config=leaf_config_final,
-                                leaf=obj_df,
-                                leaf_type=leaf_type
-                                )
+        if self.journal is not None:
+            self.journal.finish(track_hash=track_hash,
+                                leaf_name=leaf_name,
+                                status=leaf_config_status,
+                                leaf_hash=leaf_config_final.get("leaf_hash"))
 
         return process_status
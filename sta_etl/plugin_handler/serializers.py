@@ -0,0 +1,233 @@
+import io
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+def _require_pyarrow(leaf_format):
+    """
+    .. note::
+        Only for private usage! Stick to the _
+    """
+    if pyarrow is None:
+        raise ImportError(f"The leaf format '{leaf_format}' requires pyarrow (pip install pyarrow)")
+
+
+def _write_parquet(df, path, codec):
+    _require_pyarrow("parquet")
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    pyarrow.parquet.write_table(table, path, compression=codec)
+
+
+def _read_parquet(path, columns):
+    _require_pyarrow("parquet")
+    return pyarrow.parquet.read_table(path, columns=columns).to_pandas()
+
+
+def _write_feather(df, path, codec):
+    _require_pyarrow("feather")
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    pyarrow.feather.write_feather(table, path, compression="uncompressed" if codec == "none" else codec)
+
+
+def _read_feather(path, columns):
+    _require_pyarrow("feather")
+    table = pyarrow.feather.read_table(path, columns=columns, memory_map=True)
+    # feather keeps the column order of the file, the other formats the requested order:
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+def _npz_codec(codec):
+    """
+    (compress, decompress) of a codec for npz files which numpy does not support itself.
+
+    .. note::
+        Only for private usage! Stick to the _
+    """
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("The npz codec 'zstd' requires zstandard (pip install zstandard)")
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompressobj().decompress
+    if lz4 is None:
+        raise ImportError("The npz codec 'lz4' requires lz4 (pip install lz4)")
+    return lz4.frame.compress, lz4.frame.decompress
+
+
+def _write_npz(df, path, codec):
+    """
+    Columns are stored as numpy arrays, so the file is read without pickle:
+    - numeric, bool and datetime columns as they are
+    - timezone aware datetime columns as UTC datetimes with the timezone name
+    - string columns as unicode with a mask of missing values
+
+    .. note::
+        Other columns (e.g. objects, categories or nullable integers and bools) can
+        not be read back the same: They raise a TypeError, use parquet or feather for
+        such leaves.
+
+        Only for private usage! Stick to the _
+    """
+    arrays = {"columns": np.array(list(df.columns), dtype=str)}
+    for i, i_column in enumerate(df.columns):
+        series = df[i_column]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            arrays[f"z{i}"] = np.array(str(series.dt.tz))
+            values = series.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy()
+        elif isinstance(series.dtype, np.dtype) and series.dtype != object:
+            values = series.to_numpy()
+        elif pd.api.types.is_string_dtype(series.dtype) and \
+                all(isinstance(i_value, str) for i_value in series.dropna()):
+            missing = series.isna().to_numpy()
+            values = np.where(missing, "", series.to_numpy(dtype=object)).astype(str)
+            arrays[f"m{i}"] = missing
+        else:
+            raise TypeError(f"Column {i_column} ({series.dtype}) can not be stored as npz without loss, "
+                            f"use the leaf format parquet or feather")
+        arrays[f"c{i}"] = values
+
+    if codec in ["zstd", "lz4"]:
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        with open(path, "wb") as f:
+            f.write(_npz_codec(codec)[0](buffer.getvalue()))
+        return
+    with open(path, "wb") as f:
+        if codec == "none":
+            np.savez(f, **arrays)
+        else:
+            np.savez_compressed(f, **arrays)
+
+
+def _read_npz(path, columns, codec="none"):
+    if codec in ["zstd", "lz4"]:
+        with open(path, "rb") as f:
+            source = io.BytesIO(_npz_codec(codec)[1](f.read()))
+    else:
+        source = path
+    with np.load(source) as f:
+        all_columns = list(f["columns"])
+        wanted = all_columns if columns is None else columns
+        data = {}
+        for i_column in wanted:
+            i = all_columns.index(i_column)
+            values = f[f"c{i}"]
+            if f"m{i}" in f:
+                values = values.astype(object)
+                values[f[f"m{i}"]] = None
+            elif f"z{i}" in f:
+                values = pd.Series(values).dt.tz_localize("UTC").dt.tz_convert(str(f[f"z{i}"]))
+            data[i_column] = values
+        return pd.DataFrame(data, columns=wanted)
+
+
+# leaf format -> (file extension, writer, reader, supported codecs)
+LEAF_FORMATS = {
+    "parquet": (".parquet", _write_parquet, _read_parquet, ["zstd", "lz4", "snappy", "none"]),
+    "feather": (".feather", _write_feather, _read_feather, ["zstd", "lz4", "none"]),
+    "npz": (".npz", _write_npz, _read_npz, ["zlib", "zstd", "lz4", "none"]),
+}
+
+
+def get_leaf_path(leaf_name, track_hash, leaf_hash, leaf_format):
+    """
+    The path of a leaf file relative to the store directory.
+
+    :param leaf_name: str
+    :param track_hash: str
+    :param leaf_hash: str
+    :param leaf_format: str
+        A key of LEAF_FORMATS
+    :return: str
+    """
+    extension = LEAF_FORMATS[leaf_format][0]
+    return os.path.join("leaves", leaf_name, f"{track_hash}_{leaf_hash}{extension}")
+
+
+def write_leaf(df, path, leaf_format, codec="none"):
+    """
+    Write a DataFrame leaf in the given format. The file is written to a temporary
+    name first and renamed at the end, so readers never see a half written leaf.
+
+    :param df: pd.DataFrame
+    :param path: str
+        Absolute path of the leaf file
+    :param leaf_format: str
+        'parquet', 'feather' or 'npz'
+    :param codec: str
+        Compression codec, see LEAF_FORMATS for the supported codecs per format.
+    :return: None
+    """
+    if leaf_format not in LEAF_FORMATS:
+        raise ValueError(f"Unknown leaf format {leaf_format}, use one of {list(LEAF_FORMATS)}")
+    if codec not in LEAF_FORMATS[leaf_format][3]:
+        raise ValueError(f"Leaf format {leaf_format} supports the codecs {LEAF_FORMATS[leaf_format][3]}")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    path_tmp = f"{path}.tmp{os.getpid()}"
+    LEAF_FORMATS[leaf_format][1](df, path_tmp, codec)
+    os.replace(path_tmp, path)
+
+
+def read_leaf(path, leaf_format, columns=None, codec="none"):
+    """
+    Read a DataFrame leaf which was written by write_leaf(...).
+
+    :param path: str
+        Absolute path of the leaf file
+    :param leaf_format: str
+    :param columns: list or None
+        Read only these columns.
+    :param codec: str
+        The codec of write_leaf(...). Only npz files with 'zstd' or 'lz4' need it, all
+        other files know their compression.
+    :return: pd.DataFrame
+    """
+    if leaf_format not in LEAF_FORMATS:
+        raise ValueError(f"Unknown leaf format {leaf_format}, use one of {list(LEAF_FORMATS)}")
+    if leaf_format == "npz":
+        return _read_npz(path, columns, codec=codec)
+    return LEAF_FORMATS[leaf_format][2](path, columns)
+
+
+def get_checksum(df, rows=None, tail=None):
+    """
+    A checksum of the values of the first rows of a DataFrame leaf. It depends on the
+    order of the rows but not on the index, so an appended leaf keeps the checksum of
+    its old rows (see PluginLoader.i_process(...)).
+
+    With tail, only the last rows of the first rows are hashed: The cost does not grow
+    with the leaf, but a change before the tail is not seen.
+
+    :param df: pd.DataFrame
+    :param rows: int or None
+        Number of rows from the top (all rows by default).
+    :param tail: int or None
+        Hash only the last tail rows of these rows (all rows by default).
+    :return: str
+    """
+    if rows is None:
+        rows = len(df)
+    start = 0 if tail is None else max(rows - tail, 0)
+    df = df.iloc[start:rows]
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
@@ -0,0 +1,147 @@
+import os
+import uuid
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+def _shared_directory():
+    """
+    The directory for the exported leaf columns. We use the memory file system
+    /dev/shm if it exists, so the files never touch a disk.
+
+    .. note::
+        Only for private usage! Stick to the _
+    """
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class SharedLeaves():
+    """
+    This is SharedLeaves(...) - Hand over leaf data to worker processes without
+    pickling the large numeric columns. Every numeric column of a DataFrame is
+    written once into a memory-mapped file (in /dev/shm if available). The worker
+    gets only lightweight descriptors and maps the files into NumPy arrays without
+    copying (see attach_leaves(...)). Object columns, small DataFrames and other
+    objects are handed over as they are.
+
+    The files are removed by release() (or at the end of the with block), so the
+    memory is given back deterministically after a plugin run.
+
+    :Example:
+        with SharedLeaves(data_dict) as shared:
+            conn.send(shared.descriptors)
+            ...  # worker: data_dict = attach_leaves(descriptors)
+    """
+
+    def __init__(self, data_dict, min_bytes=1024 ** 2, directory=None):
+        """
+        SharedLeaves constructor: Export all leaves of a data dictionary.
+
+        :param data_dict: dictionary
+            Leaf name -> leaf data (usually pd.DataFrame) such as it comes from
+            PluginLoader._read_leaf_data(...)
+        :param min_bytes: int
+            DataFrames smaller than this are handed over as they are.
+        :param directory: str or None
+            Directory for the memory-mapped files.
+        """
+        base = directory if directory is not None else _shared_directory()
+        self.directory = os.path.join(base, f"sta_etl_{uuid.uuid4().hex}")
+        os.makedirs(self.directory)
+        self.min_bytes = min_bytes
+        self.descriptors = {}
+        try:
+            for i_leaf_name, i_leaf in data_dict.items():
+                self.descriptors[i_leaf_name] = self._export(i_leaf_name, i_leaf)
+        except Exception:
+            self.release()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def _export(self, leaf_name, leaf):
+        """
+        Create the descriptor of a single leaf.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        if not isinstance(leaf, pd.DataFrame) or leaf.memory_usage(index=False).sum() < self.min_bytes:
+            return {"type": "object", "data": leaf}
+
+        columns = {}
+        for i_num, i_column in enumerate(leaf.columns):
+            values = leaf[i_column].to_numpy()
+            if values.dtype == object or not isinstance(leaf[i_column].dtype, np.dtype):
+                columns[i_column] = {"type": "object", "data": leaf[i_column].to_numpy(copy=True)}
+                continue
+
+            path = os.path.join(self.directory, f"{leaf_name}_{i_num}.npy")
+            mm = np.lib.format.open_memmap(path, mode="w+", dtype=values.dtype, shape=values.shape)
+            mm[:] = values
+            mm.flush()
+            del mm
+            columns[i_column] = {"type": "file", "path": path}
+
+        if isinstance(leaf.index, pd.RangeIndex):
+            index = {"type": "range", "start": leaf.index.start, "stop": leaf.index.stop,
+                     "step": leaf.index.step}
+        else:
+            index = {"type": "object", "data": leaf.index}
+
+        return {"type": "DataFrame", "columns": columns, "order": list(leaf.columns),
+                "index": index, "attrs": dict(leaf.attrs)}
+
+    def release(self):
+        """
+        Remove all memory-mapped files. Workers which still map a file keep their
+        mapping until they drop the arrays, new workers can not attach anymore.
+
+        :return: None
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def attach_leaves(descriptors):
+    """
+    Rebuild the data dictionary from the descriptors of SharedLeaves(...) in a worker.
+    Numeric columns are memory-mapped copy-on-write: Reading does not copy, a plugin
+    which changes the values in place gets private copies of the touched pages.
+
+    :param descriptors: dictionary
+        SharedLeaves.descriptors
+    :return: dictionary
+        Leaf name -> leaf data
+    """
+    data_dict = {}
+    for i_leaf_name, i_desc in descriptors.items():
+        if i_desc["type"] == "object":
+            data_dict[i_leaf_name] = i_desc["data"]
+            continue
+
+        columns = {}
+        for i_column in i_desc["order"]:
+            i_col_desc = i_desc["columns"][i_column]
+            if i_col_desc["type"] == "file":
+                columns[i_column] = np.load(i_col_desc["path"], mmap_mode="c")
+            else:
+                columns[i_column] = i_col_desc["data"]
+
+        if i_desc["index"]["type"] == "range":
+            index = pd.RangeIndex(i_desc["index"]["start"], i_desc["index"]["stop"], i_desc["index"]["step"])
+        else:
+            index = i_desc["index"]["data"]
+
+        df = pd.DataFrame(columns, index=index, columns=i_desc["order"], copy=False)
+        df.attrs.update(i_desc["attrs"])
+        data_dict[i_leaf_name] = df
+
+    return data_dict
@@ -0,0 +1,326 @@
+import queue
+import threading
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _WakeUpHandler(FileSystemEventHandler):
+    """
+    A watchdog event handler which wakes up the polling loop of the TrackWatcher
+    whenever something changes in the watched directory.
+    """
+
+    def __init__(self, wake_up):
+        super().__init__()
+        self.wake_up = wake_up
+
+    def on_any_event(self, event):
+        self.wake_up.set()
+
+
+class TrackWatcher():
+    """
+    This is TrackWatcher(...) - A long running processing service. It keeps a warm
+    PluginLoader (and with it the database handler) and looks for new or changed
+    branches of the given users. Every branch which needs processing is put into a
+    work queue and processed by worker threads.
+
+    .. note::
+        New or changed branches are found in two ways:
+        - watermark_key: Only branches with a value (e.g. insertion time) at or above the
+          watermark are new, unless they were processed already. The watermark is the
+          smallest value of all branches which are not processed successfully yet.
+        - Otherwise: A branch is new or changed if the leaves which are not produced by
+          registered plugins (e.g. 'gps') differ from the last successful processing.
+        A branch counts as seen only after process_branch(...) succeeded, so a branch
+        which failed is found again by the next poll. Input leaves of a branch which
+        changed since the last successful processing are invalidated before (see
+        PluginLoader.invalidate(...)), so their downstream leaves are recomputed.
+
+        Every poll reads the branch information of all watched users: The database
+        handler can only select branches by an equal key, so the watermark filters
+        the branches afterwards. A poll costs O(branches of the users), not O(new
+        branches). Keep poll_interval in line with the number of branches.
+        The work queue is bounded (queue_size). The polling loop waits when the
+        workers fall behind, so we do not pile up work in RAM.
+
+        With watch_path and the watchdog package installed, changes on the file system
+        (e.g. of a FileDataBase) trigger a poll immediately. Without them we poll every
+        poll_interval seconds.
+
+    :Example:
+        pl = PluginLoader()
+        pl.set_database_handler(dbh)
+        pl.set_processor_plugins("SimpleProjection")
+        tw = TrackWatcher(plugin_loader=pl, user_hashes=[user_hash], watch_path=db_path)
+        tw.run_forever()
+    """
+
+    def __init__(self, plugin_loader, user_hashes, poll_interval=30, watermark_key=None,
+                 queue_size=100, n_workers=1, watch_path=None, debounce=1.0):
+        """
+        TrackWatcher constructor.
+
+        :param plugin_loader: PluginLoader
+            A PluginLoader with database handler and plugins to process.
+        :param user_hashes: list
+            The user hashes (str) of the branches to watch.
+        :param poll_interval: float
+            Seconds between two polls of the branch information.
+        :param watermark_key: str or None
+            A branch key with increasing values for new branches (e.g. insertion time).
+        :param queue_size: int
+            Maximum number of branches in the work queue.
+        :param n_workers: int
+            Number of worker threads which process branches.
+        :param watch_path: str or None
+            A directory to watch for file system notifications.
+        :param debounce: float
+            Minimum seconds between two polls. File system notifications come in bursts
+            (our own leaf writes trigger them too).
+        """
+        self.pl = plugin_loader
+        self.user_hashes = list(user_hashes)
+        self.poll_interval = poll_interval
+        self.watermark_key = watermark_key
+        self.n_workers = n_workers
+        self.watch_path = watch_path
+        self.debounce = debounce
+
+        self.work_queue = queue.Queue(maxsize=queue_size)
+        self._watermark = None
+        self._done_marks = {}
+        self._fingerprints = {}
+        self._found = {}
+        self._active = set()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+
+        self.n_processed = 0
+        self.n_failed = 0
+
+    def _fingerprint(self, branch):
+        """
+        The fingerprint of a branch describes its input leaves: All leaves which are
+        not produced by a registered plugin.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        leaves = branch.get("leaf") or {}
+        return tuple(sorted((i.get("name"), i.get("leaf_hash")) for i in leaves.values()
+                            if i.get("name") not in self.pl.all_leaves))
+
+    def find_new_branches(self):
+        """
+        Read the branch information of all users once and return the track hashes of
+        all new or changed branches which are not queued or processed right now.
+
+        :return: list
+            A list of track hashes (str)
+        """
+        new_tracks = []
+        for i_user in self.user_hashes:
+            for i_branch in self.pl.read_user_branches(user_hash=i_user):
+                i_track_hash = i_branch.get("track_hash")
+
+                if self.watermark_key is not None:
+                    i_key = i_branch.get(self.watermark_key)
+                    if i_key is None:
+                        continue
+                else:
+                    i_key = self._fingerprint(i_branch)
+
+                with self._state_lock:
+                    if i_track_hash in self._active:
+                        continue
+                    if self.watermark_key is not None:
+                        # Branches at the watermark may be processed already:
+                        if self._watermark is not None and i_key < self._watermark:
+                            continue
+                        if self._done_marks.get(i_track_hash) == i_key:
+                            continue
+                    elif self._fingerprints.get(i_track_hash) == i_key:
+                        continue
+                    self._found[i_track_hash] = i_key
+                    self._active.add(i_track_hash)
+                new_tracks.append(i_track_hash)
+        return new_tracks
+
+    def _get_changed_leaves(self, track_hash):
+        """
+        The input leaves of a branch which changed since its last successful processing
+        (fingerprint mode only). A new branch has no changed leaves.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        with self._state_lock:
+            if self.watermark_key is not None or track_hash not in self._fingerprints:
+                return []
+            before = dict(self._fingerprints[track_hash])
+            now = dict(self._found.get(track_hash, ()))
+        return sorted(i_leaf for i_leaf, i_leaf_hash in now.items() if before.get(i_leaf) != i_leaf_hash)
+
+    def _track_done(self, track_hash, success):
+        """
+        Remember a branch as seen after its processing succeeded and move the watermark
+        up to the smallest value of all branches which are not processed yet.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        with self._state_lock:
+            self._active.discard(track_hash)
+            if success:
+                self.n_processed += 1
+            else:
+                self.n_failed += 1
+                return
+            key = self._found.pop(track_hash, None)
+            if self.watermark_key is None:
+                self._fingerprints[track_hash] = key
+                return
+
+            self._done_marks[track_hash] = key
+            open_marks = list(self._found.values())
+            if len(open_marks) > 0:
+                self._watermark = min(open_marks)
+            else:
+                self._watermark = max(self._done_marks.values())
+            self._done_marks = {k: v for k, v in self._done_marks.items() if v >= self._watermark}
+
+    def enqueue(self, track_hash):
+        """
+        Put a branch into the work queue unless it is waiting there already. Blocks while
+        the work queue is full.
+
+        :param track_hash: str
+        :return: bool
+            True if the branch was put into the queue
+        """
+        with self._queued_lock:
+            if track_hash in self._queued:
+                return False
+            self._queued.add(track_hash)
+
+        while not self._stop.is_set():
+            try:
+                self.work_queue.put(track_hash, timeout=1)
+                return True
+            except queue.Full:
+                continue
+
+        with self._queued_lock:
+            self._queued.discard(track_hash)
+        with self._state_lock:
+            self._active.discard(track_hash)
+        return False
+
+    def _worker(self):
+        """
+        Worker thread: Process branches from the work queue until we stop.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        while not self._stop.is_set():
+            try:
+                track_hash = self.work_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            with self._queued_lock:
+                self._queued.discard(track_hash)
+            try:
+                changed_leaves = self._get_changed_leaves(track_hash)
+                for i_leaf in changed_leaves:
+                    self.pl.invalidate(i_leaf, [track_hash])
+                self.pl.process_branch(track_hash)
+                self._track_done(track_hash, success=True)
+            except Exception as e:
+                print(f"Processing of branch {track_hash} failed: {e!r}")
+                self._track_done(track_hash, success=False)
+            finally:
+                self.work_queue.task_done()
+
+    def start(self):
+        """
+        Start the worker threads and the file system observer (if available).
+
+        :return: None
+        """
+        self._stop.clear()
+        for _ in range(self.n_workers):
+            i_thread = threading.Thread(target=self._worker, daemon=True)
+            i_thread.start()
+            self._threads.append(i_thread)
+
+        if self.watch_path is not None:
+            if Observer is None:
+                print("watchdog is not installed: We poll only.")
+            else:
+                self._observer = Observer()
+                self._observer.schedule(_WakeUpHandler(self._wake_up), self.watch_path, recursive=True)
+                self._observer.start()
+
+    def poll_once(self):
+        """
+        Search once for new or changed branches and put them into the work queue.
+
+        :return: int
+            Number of new branches in the work queue
+        """
+        n_new = 0
+        for i_track_hash in self.find_new_branches():
+            if self.enqueue(i_track_hash):
+                n_new += 1
+        return n_new
+
+    def run_forever(self):
+        """
+        Start the service and poll until stop() is called or the process is interrupted.
+
+        :return: None
+        """
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self._wake_up.clear()
+                n_new = self.poll_once()
+                if n_new > 0:
+                    print(f"{n_new} new branches queued ({self.work_queue.qsize()} waiting, "
+                          f"{self.n_processed} processed, {self.n_failed} failed)")
+                self._wake_up.wait(timeout=self.poll_interval)
+                self._stop.wait(timeout=self.debounce)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stop polling, the workers and the file system observer. Branches which are
+        processed right now are finished.
+
+        :return: None
+        """
+        self._stop.set()
+        self._wake_up.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        for i_thread in self._threads:
+            i_thread.join()
+        self._threads = []
@@ -136,8 +136,8 @@ class Plugin_SimpleProjection():
         :return:
         """
         #Fetch all important data for calculations:
-        sdistances = self.data_dict.get("simple_distances")
-        sgps = self.data_dict.get("gps")
+        sdistances = self._data_dict.get("simple_distances")
+        sgps = self._data_dict.get("gps")
 
         final = {"tot_dist_geodasic": [sdistances["dist_geodasic"].sum()],
                  "tot_dist_euclidiac": [sdistances["dist_euclidiac"].sum()],
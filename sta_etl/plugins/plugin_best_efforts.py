@@ -0,0 +1,210 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+
+import pandas as pd
+import numpy as np
+
+@Collector
+class Plugin_BestEfforts():
+    """
+    This plugin finds the fastest effort of a track for standard distances (e.g.
+    fastest 1k/5k/10k) and the longest distance for standard durations (e.g. best
+    5/20/60 minutes). It works on the cumulative distance and duration of
+    Plugin_SimpleDistance: For every point as end of the window, the start of the
+    window is found by np.searchsorted on the cumulative array and interpolated
+    exactly, so the whole track is scanned in one vectorized sweep per target
+    instead of comparing all pairs of points.
+
+    The result holds one row per reached target with the columns:
+    - kind: 'distance' or 'duration'
+    - target: Target distance (meter) or duration
+    - best_duration: Duration of the best effort
+    - best_distance: Distance of the best effort (meter)
+    - speed: best_distance / best_duration
+    - start_duration: Start of the best effort (elapsed duration of the track)
+    - end_duration: End of the best effort (elapsed duration of the track)
+
+    See sta_etl.analytics.personal_records(...) for the records across tracks.
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Best_Efforts",
+            "plugin_dependencies": ["simple_distances"],
+            "plugin_description": """
+            This plugin finds the best efforts of a track for standard distances and
+            durations.
+            """,
+            "leaf_name": "best_efforts",
+            "target_distances": [1000., 5000., 10000., 21097.5, 42195.],
+            "target_durations": [300., 1200., 3600.]
+        }
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+
+    def _interpolate_at(self, values, x, y):
+        """
+        Interpolate y linearly at values of the non-decreasing array x. Repeated values
+        in x (e.g. standing still) are handled by using the first point with x >= value.
+
+        :param values: np.array
+        :param x: np.array
+        :param y: np.array
+        :return: np.array
+        """
+        idx = np.clip(np.searchsorted(x, values, side="left"), 1, len(x) - 1)
+        x0, x1 = x[idx - 1], x[idx]
+        dx = x1 - x0
+        frac = np.divide(values - x0, dx, out=np.zeros_like(values), where=dx > 0)
+        frac = np.clip(frac, 0., 1.)
+        return y[idx - 1] + frac * (y[idx] - y[idx - 1])
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sdistances = self._data_dict.get("simple_distances")
+
+        dist = sdistances["dist_geodasic_sum"].to_numpy(dtype=float)
+        duration = sdistances["duration_sum"].to_numpy(dtype=float)
+
+        columns = ["kind", "target", "best_duration", "best_distance", "speed",
+                   "start_duration", "end_duration"]
+        results = []
+
+        if len(dist) >= 2:
+            t0 = duration[0]
+            for target in self._plugin_config.get("target_distances"):
+                # Every point which is at least target meters away from the start is an end:
+                ends = np.flatnonzero(dist - dist[0] >= target)
+                if len(ends) == 0:
+                    continue
+                t_start = self._interpolate_at(dist[ends] - target, dist, duration)
+                elapsed = duration[ends] - t_start
+                i_best = int(np.argmin(elapsed))
+                results.append(["distance", target, elapsed[i_best], target,
+                                target / elapsed[i_best] if elapsed[i_best] > 0 else np.nan,
+                                t_start[i_best] - t0, duration[ends][i_best] - t0])
+
+            for target in self._plugin_config.get("target_durations"):
+                ends = np.flatnonzero(duration - duration[0] >= target)
+                if len(ends) == 0:
+                    continue
+                d_start = self._interpolate_at(duration[ends] - target, duration, dist)
+                covered = dist[ends] - d_start
+                i_best = int(np.argmax(covered))
+                results.append(["duration", target, target, covered[i_best],
+                                covered[i_best] / target,
+                                duration[ends][i_best] - target - t0, duration[ends][i_best] - t0])
+
+        self._proc_result = pd.DataFrame(results, columns=columns)
+
+        # if you make it to here:
+        self._proc_success = True
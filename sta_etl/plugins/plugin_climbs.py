@@ -0,0 +1,300 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+
+import pandas as pd
+import numpy as np
+
+@Collector
+class Plugin_Climbs():
+    """
+    This plugin calculates the elevation gain of a track on a smoothed altitude
+    profile and detects its climbs.
+
+    1) The altitude is interpolated onto a grid of grid_spacing meter along the
+       cumulative distance and smoothed by a moving average over smoothing_distance
+       meter (np.cumsum). Smoothing over distance instead of points keeps the filter
+       independent of the sampling rate and of pauses.
+    2) Elevation gain and loss use a hysteresis: Only ups and downs of more than
+       gain_threshold meter between turning points of the smoothed profile count. The
+       noise of barometric or GPS altitude does not add up this way.
+    3) Climbs are runs of grid steps with a gradient of at least min_gradient percent.
+       Flatter gaps shorter than max_gap meter are closed, runs shorter than
+       min_climb_length or with less gain than min_climb_gain are dropped. All of this
+       uses run lengths on arrays.
+
+    The result holds one row per climb with the columns:
+    - start_distance, end_distance, length: Position of the climb on the track (meter)
+    - start_altitude, end_altitude, gain: Smoothed altitudes and their difference
+    - avg_gradient, max_gradient: Gradients in percent (max_gradient over
+      smoothing_distance)
+    - start_index, end_index: Rows of simple_distances
+
+    The totals (elevation_gain, elevation_loss, raw_gain, n_climbs, climb_gain) are
+    stored in the leaf attributes (see 'leaf_attrs' in the leaf configuration).
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Climbs",
+            "plugin_dependencies": ["simple_distances", "gps"],
+            "plugin_description": """
+            This plugin calculates the smoothed elevation gain and detects climbs.
+            """,
+            "leaf_name": "climbs",
+            "grid_spacing": 10.,
+            "smoothing_distance": 100.,
+            "gain_threshold": 5.,
+            "min_gradient": 3.,
+            "max_gap": 100.,
+            "min_climb_length": 500.,
+            "min_climb_gain": 20.
+        }
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+    def _runs(self, mask):
+        """
+        Start and end (inclusive) of all runs of True values.
+
+        :param mask: np.array of bool
+        :return: tuple
+            (starts, ends) as np.array
+        """
+        change = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+        return np.flatnonzero(change == 1), np.flatnonzero(change == -1) - 1
+
+    def _hysteresis_gain(self, altitude, threshold):
+        """
+        Elevation gain and loss with a dead band: A change counts once the altitude is
+        more than threshold away from the altitude of the last counted change. Only the
+        turning points of the profile are visited.
+
+        :param altitude: np.array
+        :param threshold: float
+        :return: tuple
+            (gain, loss)
+        """
+        if len(altitude) < 2:
+            return 0., 0.
+        slope = np.sign(np.diff(altitude))
+        turns = np.flatnonzero(slope[1:] != slope[:-1]) + 1
+        points = altitude[np.concatenate([[0], turns, [len(altitude) - 1]])]
+
+        gain = 0.
+        loss = 0.
+        last = points[0]
+        for i_alt in points[1:]:
+            if i_alt - last > threshold:
+                gain += i_alt - last
+                last = i_alt
+            elif last - i_alt > threshold:
+                loss += last - i_alt
+                last = i_alt
+        return float(gain), float(loss)
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sdistances = self._data_dict.get("simple_distances")
+        gps = self._data_dict.get("gps")
+
+        spacing = self._plugin_config.get("grid_spacing")
+        dist = sdistances["dist_geodasic_sum"].to_numpy(dtype=float)
+        altitude = gps["altitude"].to_numpy(dtype=float)
+        valid = np.isfinite(altitude) & np.isfinite(dist)
+        dist, altitude = dist[valid], altitude[valid]
+        rows = np.flatnonzero(valid)
+
+        columns = ["start_distance", "end_distance", "length", "start_altitude", "end_altitude",
+                   "gain", "avg_gradient", "max_gradient", "start_index", "end_index"]
+        raw_diff = np.diff(altitude)
+        attrs = {"elevation_gain": 0., "elevation_loss": 0.,
+                 "raw_gain": float(raw_diff[raw_diff > 0].sum()), "n_climbs": 0, "climb_gain": 0.}
+
+        if len(dist) < 2 or dist[-1] - dist[0] < spacing:
+            self._proc_result = pd.DataFrame(columns=columns)
+            self._proc_result.attrs = attrs
+            self._proc_success = True
+            return
+
+        # 1) Profile on a distance grid: The mean altitude of all points per grid cell
+        # (cells without points are interpolated), then a moving average over
+        # smoothing_distance:
+        cells = ((dist - dist[0]) / spacing).astype(np.int64)
+        n_cells = cells[-1] + 1
+        counts = np.bincount(cells, minlength=n_cells)
+        sums = np.bincount(cells, weights=altitude, minlength=n_cells)
+        filled = np.flatnonzero(counts > 0)
+        profile = np.interp(np.arange(n_cells), filled, sums[filled] / counts[filled])
+        grid = dist[0] + (np.arange(n_cells) + 0.5) * spacing
+        window = max(1, int(round(self._plugin_config.get("smoothing_distance") / spacing)))
+        window = min(window, len(profile))
+        csum = np.concatenate([[0.], np.cumsum(profile)])
+        smooth = (csum[window:] - csum[:-window]) / window
+        # Centre the moving average and pad the ends with the nearest value:
+        pad_left = (window - 1) // 2
+        smooth = np.concatenate([np.full(pad_left, smooth[0]), smooth,
+                                 np.full(len(profile) - len(smooth) - pad_left, smooth[-1])])
+
+        # 2) Hysteresis gain:
+        attrs["elevation_gain"], attrs["elevation_loss"] = \
+            self._hysteresis_gain(smooth, self._plugin_config.get("gain_threshold"))
+
+        # 3) Climbs by run lengths of the gradient:
+        gradient = 100. * np.diff(smooth) / spacing
+        climbing = gradient >= self._plugin_config.get("min_gradient")
+        gap_starts, gap_ends = self._runs(~climbing)
+        max_gap_steps = int(self._plugin_config.get("max_gap") / spacing)
+        inner = (gap_starts > 0) & (gap_ends < len(climbing) - 1) & (gap_ends - gap_starts + 1 <= max_gap_steps)
+        fill = np.zeros(len(climbing) + 1, dtype=np.int64)
+        np.add.at(fill, gap_starts[inner], 1)
+        np.add.at(fill, gap_ends[inner] + 1, -1)
+        climbing |= np.cumsum(fill[:-1]) > 0
+
+        starts, ends = self._runs(climbing)
+        # A run of gradient steps from step s to step e goes from grid point s to e + 1:
+        start_alt, end_alt = smooth[starts], smooth[ends + 1]
+        length = (ends + 1 - starts) * spacing
+        gain = end_alt - start_alt
+        is_climb = (length >= self._plugin_config.get("min_climb_length")) & \
+                   (gain >= self._plugin_config.get("min_climb_gain"))
+        starts, ends, start_alt, end_alt, length, gain = \
+            starts[is_climb], ends[is_climb], start_alt[is_climb], end_alt[is_climb], length[is_climb], gain[is_climb]
+
+        # Max gradient over smoothing_distance (the gradient per grid step is too noisy).
+        # Climbs shorter than smoothing_distance keep their average gradient:
+        gradient_window = 100. * (smooth[window:] - smooth[:-window]) / (window * spacing)
+        max_gradient = 100. * gain / length
+        for i_climb, (i_start, i_end) in enumerate(zip(starts, ends)):
+            if i_end + 2 - window > i_start:
+                max_gradient[i_climb] = max(max_gradient[i_climb],
+                                            gradient_window[i_start:i_end + 2 - window].max())
+
+        start_distance = grid[starts]
+        end_distance = grid[ends + 1]
+        self._proc_result = pd.DataFrame({
+            "start_distance": start_distance - grid[0],
+            "end_distance": end_distance - grid[0],
+            "length": length,
+            "start_altitude": start_alt,
+            "end_altitude": end_alt,
+            "gain": gain,
+            "avg_gradient": 100. * gain / length,
+            "max_gradient": max_gradient,
+            "start_index": rows[np.clip(np.searchsorted(dist, start_distance), 0, len(dist) - 1)],
+            "end_index": rows[np.clip(np.searchsorted(dist, end_distance), 0, len(dist) - 1)]
+        }, columns=columns)
+
+        attrs["n_climbs"] = int(len(starts))
+        attrs["climb_gain"] = float(gain.sum())
+        self._proc_result.attrs = attrs
+
+        # if you make it to here:
+        self._proc_success = True
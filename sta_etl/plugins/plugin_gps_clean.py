@@ -0,0 +1,229 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.geo_tools import step_distances, timestamps_to_seconds
+
+import numpy as np
+
+@Collector
+class Plugin_GpsClean():
+    """
+    This plugin removes outliers and jitter from the raw 'gps' leaf and stores the
+    result as 'gps_clean' (same columns as 'gps' plus 'gps_index', the row of the point
+    in 'gps'). Plugins can depend on 'gps_clean' instead of 'gps' to avoid spikes in
+    distances and velocities.
+
+    The cleaning runs in vectorized steps:
+    1) Points without coordinates and points which do not move forward in time are dropped.
+    2) Speed gate: A point is a spike if the implied speed to its predecessor and to its
+       successor both exceed max_speed. Spikes are dropped and the gate is repeated on
+       the remaining points (at most max_iterations times), since dropping a point
+       changes the steps of its neighbours.
+    3) Acceleration gate: Same as 2) with a jump in the speed of more than
+       max_acceleration up into and down out of the point.
+    4) Latitude, longitude and altitude are smoothed with a centered rolling median of
+       median_window points.
+
+    The per track report (points in/out, dropped per step) is stored in the leaf
+    attributes (see 'leaf_attrs' in the leaf configuration).
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "GpsClean",
+            "plugin_dependencies": ["gps"],
+            "plugin_description": """
+            This plugin removes GPS spikes by speed and acceleration gates and smooths
+            the track with a rolling median.
+            """,
+            "leaf_name": "gps_clean",
+            "max_speed": 50.,
+            "max_acceleration": 10.,
+            "max_iterations": 3,
+            "median_window": 5
+        }
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+    def _spikes(self, values_in, values_out, limit):
+        """
+        A point is a spike if the values before and after the point both exceed the limit.
+
+        :param values_in: np.array
+        :param values_out: np.array
+        :param limit: float
+        :return: np.array of bool
+        """
+        return (values_in > limit) & (values_out > limit)
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        gps = self._data_dict.get("gps")
+
+        max_speed = self._plugin_config.get("max_speed")
+        max_acceleration = self._plugin_config.get("max_acceleration")
+        max_iterations = self._plugin_config.get("max_iterations")
+
+        t = timestamps_to_seconds(gps["timestamp"])
+        lat = gps["latitude"].to_numpy(dtype=float)
+        lon = gps["longitude"].to_numpy(dtype=float)
+
+        # 1) Invalid coordinates and points which do not move forward in time:
+        keep = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(t)
+        t_prev_max = np.maximum.accumulate(np.where(keep, t, -np.inf))
+        keep[1:] &= t[1:] > t_prev_max[:-1]
+        n_invalid = int(len(t) - keep.sum())
+
+        # 2) and 3) Speed and acceleration gates on the remaining points:
+        n_speed = 0
+        n_acceleration = 0
+        for _ in range(max_iterations):
+            idx = np.flatnonzero(keep)
+            if len(idx) < 3:
+                break
+            dt = np.diff(t[idx])
+            speed = step_distances(lat[idx], lon[idx])[1:] / dt
+
+            # speed[i] is the step from point i to i+1, so point i has speed[i-1] in and speed[i] out:
+            spikes_speed = np.zeros(len(idx), dtype=bool)
+            spikes_speed[1:-1] = self._spikes(speed[:-1], speed[1:], max_speed)
+
+            # The acceleration between two steps belongs to the point in between. A displaced
+            # point p speeds up at p-1 and slows down at p+1:
+            acceleration = np.zeros(len(idx))
+            acceleration[1:-1] = np.diff(speed) / (0.5 * (dt[:-1] + dt[1:]))
+            spikes_acceleration = np.zeros(len(idx), dtype=bool)
+            spikes_acceleration[2:-2] = self._spikes(acceleration[1:-3], -acceleration[3:-1], max_acceleration)
+            spikes_acceleration &= ~spikes_speed
+
+            if not spikes_speed.any() and not spikes_acceleration.any():
+                break
+            n_speed += int(spikes_speed.sum())
+            n_acceleration += int(spikes_acceleration.sum())
+            keep[idx[spikes_speed | spikes_acceleration]] = False
+
+        # 4) Rolling median:
+        clean = gps[keep].copy()
+        window = self._plugin_config.get("median_window")
+        for i_column in ["latitude", "longitude", "altitude"]:
+            if i_column in clean.columns and window > 1:
+                clean[i_column] = clean[i_column].rolling(window, center=True, min_periods=1).median()
+        clean["gps_index"] = np.flatnonzero(keep)
+        clean = clean.reset_index(drop=True)
+
+        clean.attrs = {"n_points_in": len(gps),
+                       "n_points_out": len(clean),
+                       "n_dropped_invalid": n_invalid,
+                       "n_dropped_speed": n_speed,
+                       "n_dropped_acceleration": n_acceleration}
+        self._proc_result = clean
+
+        # if you make it to here:
+        self._proc_success = True
@@ -0,0 +1,193 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.stores.heatmap import HeatmapStore
+
+import pandas as pd
+import numpy as np
+
+@Collector
+class Plugin_Heatmap():
+    """
+    This plugin adds a track to the heatmap across all tracks (see HeatmapStore in
+    stores/heatmap.py). The GPS points are binned into the pixels of a tile pyramid
+    and the counts are added to the tile rasters (.npy files). A track which was added
+    before is subtracted first, so reprocessing never counts a track twice and the
+    heatmap is never rebuilt from all tracks.
+
+    The leaf of this plugin holds the tiles the track covers (zoom, tile_x, tile_y,
+    n_pixels, n_points).
+
+    .. note::
+        This plugin needs the track hash and the store path from the PluginLoader
+        (see set_plugin_context(...)).
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Heatmap",
+            "plugin_dependencies": ["gps"],
+            "plugin_description": """
+            This plugin adds the GPS points of a track to a heatmap across all tracks.
+            """,
+            "leaf_name": "heatmap",
+            "zoom_levels": [8, 11, 14],
+            "tile_size": 256
+        }
+        self._context = {}
+
+    def set_plugin_context(self, track_hash, store_path):
+        """
+        The PluginLoader hands over the track hash and the store path before processing.
+
+        :param track_hash: str
+        :param store_path: str
+            The directory of the stores across tracks
+        :return: None
+        """
+        self._context = {"track_hash": track_hash, "store_path": store_path}
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sgps = self._data_dict.get("gps")
+        track_hash = self._context.get("track_hash")
+        store_path = self._context.get("store_path")
+
+        if track_hash is None or store_path is None:
+            print("Plugin_Heatmap requires a track hash and a store path")
+            return
+
+        lat = sgps["latitude"].to_numpy(dtype=float)
+        lon = sgps["longitude"].to_numpy(dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+
+        hm = HeatmapStore(store_path=store_path,
+                          zoom_levels=self._plugin_config.get("zoom_levels"),
+                          tile_size=self._plugin_config.get("tile_size"))
+        contribution = hm.update_track(track_hash=track_hash, lat=lat[valid], lon=lon[valid])
+
+        # Summary per covered tile:
+        ts2 = hm.tile_size * hm.tile_size
+        tiles = []
+        for i_zoom, (keys, counts) in contribution.items():
+            i_tiles = pd.DataFrame({"tile": keys // ts2, "n_points": counts.astype(np.int64)})
+            i_tiles = i_tiles.groupby("tile")["n_points"].agg(["size", "sum"]).reset_index()
+            tiles.append(pd.DataFrame({"zoom": i_zoom,
+                                       "tile_x": i_tiles["tile"] // 2 ** i_zoom,
+                                       "tile_y": i_tiles["tile"] % 2 ** i_zoom,
+                                       "n_pixels": i_tiles["size"],
+                                       "n_points": i_tiles["sum"]}))
+        self._proc_result = pd.concat(tiles, ignore_index=True) if len(tiles) > 0 else \
+            pd.DataFrame(columns=["zoom", "tile_x", "tile_y", "n_pixels", "n_points"])
+
+        # if you make it to here:
+        self._proc_success = True
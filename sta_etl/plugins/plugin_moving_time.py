@@ -0,0 +1,218 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+
+import pandas as pd
+import numpy as np
+
+@Collector
+class Plugin_MovingTime():
+    """
+    This plugin separates the moving time of a track from its pauses. Every step of
+    Plugin_SimpleDistance (from one point to the next) is classified as moving or
+    stopped by its velocity with a hysteresis: A step is moving above start_speed,
+    stopped below stop_speed and keeps the state of the previous step in between.
+    Stopped runs shorter than min_pause are counted as moving (e.g. a short traffic
+    light). Everything is vectorized (forward fill for the hysteresis, run lengths
+    by np.diff), so the plugin runs in linear time.
+
+    The result holds one row per pause with the columns:
+    - start_duration, end_duration: Start and end of the pause (elapsed duration of the track)
+    - duration: Length of the pause
+    - start_index, end_index: First and last step of the pause (rows of simple_distances)
+
+    The totals (total_duration, moving_duration, paused_duration, n_pauses,
+    moving_distance, avg_moving_velocity, avg_total_velocity) are stored in the leaf
+    attributes (see 'leaf_attrs' in the leaf configuration).
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "MovingTime",
+            "plugin_dependencies": ["simple_distances"],
+            "plugin_description": """
+            This plugin detects pauses and the moving time of a track.
+            """,
+            "leaf_name": "moving_time",
+            "start_speed": 1.0,
+            "stop_speed": 0.5,
+            "min_pause": 10.
+        }
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+    def _to_seconds(self, values):
+        """
+        Durations of simple_distances are float seconds or timedeltas (for datetime
+        timestamps).
+
+        :param values: pd.Series
+        :return: np.array
+        """
+        if pd.api.types.is_timedelta64_dtype(values):
+            return values.dt.total_seconds().to_numpy(dtype=float)
+        return values.to_numpy(dtype=float)
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sdistances = self._data_dict.get("simple_distances")
+
+        duration = self._to_seconds(sdistances["duration"])
+        distance = sdistances["dist_geodasic"].to_numpy(dtype=float)
+        velocity = sdistances["velocity_geodasic"].to_numpy(dtype=float)
+        elapsed = np.cumsum(duration)
+
+        # Hysteresis: Set the state where it is decided and forward fill the rest.
+        # Steps before the first decision count as stopped.
+        state = np.full(len(velocity), np.nan)
+        state[velocity > self._plugin_config.get("start_speed")] = 1.
+        state[velocity < self._plugin_config.get("stop_speed")] = 0.
+        moving = pd.Series(state).ffill().fillna(0.).to_numpy() > 0.5
+        # The first row is no step:
+        if len(moving) > 0:
+            moving[0] = True
+
+        # Runs of stopped steps:
+        change = np.diff(np.concatenate([[0], (~moving).astype(np.int8), [0]]))
+        run_starts = np.flatnonzero(change == 1)
+        run_ends = np.flatnonzero(change == -1) - 1
+        run_durations = elapsed[run_ends] - elapsed[run_starts] + duration[run_starts]
+
+        is_pause = run_durations >= self._plugin_config.get("min_pause")
+        run_starts, run_ends, run_durations = run_starts[is_pause], run_ends[is_pause], run_durations[is_pause]
+
+        self._proc_result = pd.DataFrame({"start_duration": elapsed[run_starts] - duration[run_starts],
+                                          "end_duration": elapsed[run_ends],
+                                          "duration": run_durations,
+                                          "start_index": run_starts,
+                                          "end_index": run_ends})
+
+        # Distance of the steps in pauses does not count as moving distance:
+        paused = np.zeros(len(velocity) + 1, dtype=np.int64)
+        np.add.at(paused, run_starts, 1)
+        np.add.at(paused, run_ends + 1, -1)
+        paused = np.cumsum(paused[:-1]) > 0
+
+        total_duration = float(elapsed[-1]) if len(elapsed) > 0 else 0.
+        paused_duration = float(run_durations.sum())
+        moving_duration = total_duration - paused_duration
+        moving_distance = float(distance[~paused].sum())
+        self._proc_result.attrs = {
+            "total_duration": total_duration,
+            "moving_duration": moving_duration,
+            "paused_duration": paused_duration,
+            "n_pauses": int(len(run_starts)),
+            "moving_distance": moving_distance,
+            "avg_moving_velocity": moving_distance / moving_duration if moving_duration > 0 else 0.,
+            "avg_total_velocity": float(distance.sum()) / total_duration if total_duration > 0 else 0.
+        }
+
+        # if you make it to here:
+        self._proc_success = True
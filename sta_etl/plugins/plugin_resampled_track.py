@@ -0,0 +1,244 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.geo_tools import timestamps_to_seconds
+
+import pandas as pd
+import numpy as np
+
+@Collector
+class Plugin_ResampledTrack():
+    """
+    This plugin resamples the 'gps' leaf onto a fixed time grid (e.g. every second).
+    Latitude and longitude are interpolated linearly or along the great circle, all
+    other numeric columns (altitude, ...) linearly. A gap of the recording which is
+    longer than max_gap seconds (a pause) is not interpolated: The grid stops at the
+    last point before the gap and starts again at the first point after it, with a
+    new segment number. Plugins which use rolling windows or spectra on uniform time
+    steps can depend on 'gps_resampled' instead of 'gps'.
+
+    Datetime timestamps (also timezone aware) are kept as datetimes in their timezone.
+
+    The leaf holds the columns timestamp, latitude, longitude, the other numeric
+    columns of 'gps' and segment.
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Resampled_Track",
+            "plugin_dependencies": ["gps"],
+            "plugin_description": """
+            This plugin resamples the GPS points of a track onto a fixed time grid and
+            treats long gaps as pauses.
+            """,
+            "leaf_name": "gps_resampled",
+            "interval": 1.,
+            "max_gap": 30.,
+            "interpolation": "linear"
+        }
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+
+    def _slerp(self, lat0, lon0, lat1, lon1, frac):
+        """
+        Interpolate along the great circle between two sets of points.
+
+        :param lat0: np.array
+        :param lon0: np.array
+        :param lat1: np.array
+        :param lon1: np.array
+        :param frac: np.array
+            Position between the points (0 ... 1)
+        :return: tuple
+            (lat, lon) as np.array
+        """
+        phi0, lam0 = np.radians(lat0), np.radians(lon0)
+        phi1, lam1 = np.radians(lat1), np.radians(lon1)
+        v0 = np.stack([np.cos(phi0) * np.cos(lam0), np.cos(phi0) * np.sin(lam0), np.sin(phi0)])
+        v1 = np.stack([np.cos(phi1) * np.cos(lam1), np.cos(phi1) * np.sin(lam1), np.sin(phi1)])
+        omega = np.arccos(np.clip((v0 * v1).sum(axis=0), -1., 1.))
+        sin_omega = np.sin(omega)
+        small = sin_omega < 1e-12
+        safe = np.where(small, 1., sin_omega)
+        w0 = np.where(small, 1. - frac, np.sin((1. - frac) * omega) / safe)
+        w1 = np.where(small, frac, np.sin(frac * omega) / safe)
+        v = w0 * v0 + w1 * v1
+        lat = np.degrees(np.arctan2(v[2], np.sqrt(v[0] ** 2 + v[1] ** 2)))
+        lon = np.degrees(np.arctan2(v[1], v[0]))
+        return lat, lon
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sgps = self._data_dict.get("gps")
+        interval = self._plugin_config.get("interval")
+        max_gap = self._plugin_config.get("max_gap")
+
+        is_datetime = pd.api.types.is_datetime64_any_dtype(sgps["timestamp"])
+        tz = sgps["timestamp"].dt.tz if is_datetime else None
+        t = timestamps_to_seconds(sgps["timestamp"])
+
+        # Keep the first point of every timestamp, interpolation needs increasing times:
+        keep = np.concatenate([[True], np.diff(t) > 0]) if len(t) > 0 else np.zeros(0, dtype=bool)
+        gps = sgps[keep]
+        t = t[keep]
+
+        value_columns = [i for i in gps.columns
+                         if i not in ["timestamp", "latitude", "longitude"]
+                         and np.issubdtype(gps[i].dtype, np.number)]
+        columns = ["timestamp", "latitude", "longitude"] + value_columns + ["segment"]
+
+        if len(t) < 2:
+            self._proc_result = pd.DataFrame(columns=columns)
+            self._proc_success = True
+            return
+
+        # Every segment between two long gaps gets its own grid from its first point,
+        # so no grid point lies inside a gap:
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(t) > max_gap) + 1])
+        ends = np.concatenate([starts[1:] - 1, [len(t) - 1]])
+        grids, segments = [], []
+        for i_segment, (i_start, i_end) in enumerate(zip(starts, ends)):
+            grids.append(np.arange(t[i_start], t[i_end] + 1e-9, interval))
+            segments.append(np.full(len(grids[-1]), i_segment))
+        grid = np.concatenate(grids)
+        segment = np.concatenate(segments)
+
+        # A grid point lies between the points idx and idx + 1 of its segment:
+        idx = np.clip(np.searchsorted(t, grid, side="right") - 1, 0, len(t) - 2)
+        dt = t[idx + 1] - t[idx]
+        frac = np.clip((grid - t[idx]) / dt, 0., 1.)
+
+        lat = gps["latitude"].to_numpy(dtype=float)
+        lon = gps["longitude"].to_numpy(dtype=float)
+        if self._plugin_config.get("interpolation") == "great_circle":
+            r_lat, r_lon = self._slerp(lat[idx], lon[idx], lat[idx + 1], lon[idx + 1], frac)
+        else:
+            r_lat = lat[idx] + frac * (lat[idx + 1] - lat[idx])
+            r_lon = lon[idx] + frac * (lon[idx + 1] - lon[idx])
+
+        if is_datetime and tz is not None:
+            timestamps = pd.to_datetime(grid, unit="s", utc=True).tz_convert(tz)
+        elif is_datetime:
+            timestamps = pd.to_datetime(grid, unit="s")
+        else:
+            timestamps = grid
+        result = {"timestamp": timestamps,
+                  "latitude": r_lat,
+                  "longitude": r_lon}
+        for i_column in value_columns:
+            values = gps[i_column].to_numpy(dtype=float)
+            result[i_column] = values[idx] + frac * (values[idx + 1] - values[idx])
+        result["segment"] = segment
+
+        self._proc_result = pd.DataFrame(result)[columns]
+
+        # if you make it to here:
+        self._proc_success = True
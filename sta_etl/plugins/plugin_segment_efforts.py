@@ -0,0 +1,271 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.geo_tools import step_distances, timestamps_to_seconds
+from sta_etl.stores.segments import SegmentLibrary, to_xyz
+
+import pandas as pd
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+@Collector
+class Plugin_SegmentEfforts():
+    """
+    This plugin finds and times the traversals (efforts) of all segments of the
+    segment library (see SegmentLibrary in stores/segments.py) in a track.
+
+    1) Candidates: All track points close to a segment start or end point are found
+       with one vectorized neighbour query against the index of all segment start and
+       end points (KD-tree with scipy, otherwise a grid). Only segments with hits are
+       looked at, so the cost scales with the track length and not with the size of
+       the library. The index is built once per run and library version.
+    2) Passes: Consecutive hits form a pass, the closest point of a pass is its
+       position. Every start pass is paired with the first end pass after it if no
+       other start pass comes in between.
+    3) Verification: The resampled shape points of the segment must be within
+       'tolerance' meter of the track between start and end ('min_coverage') and they
+       must be passed in order ('min_order').
+
+    The result holds one row per effort with the columns segment_id, name,
+    start_index, end_index (rows of 'gps'), start_duration (elapsed time of the track
+    at the start), elapsed_time, distance, segment_length, speed and coverage.
+
+    .. note::
+        This plugin needs the store path from the PluginLoader
+        (see set_plugin_context(...)).
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "SegmentEfforts",
+            "plugin_dependencies": ["gps"],
+            "plugin_description": """
+            This plugin matches a track against a library of user defined segments
+            and times every effort.
+            """,
+            "leaf_name": "segment_efforts",
+            "match_radius": 25.,
+            "tolerance": 30.,
+            "min_coverage": 0.95,
+            "min_order": 0.9,
+            "spacing": 10.
+        }
+        self._context = {}
+
+    def set_plugin_context(self, track_hash, store_path):
+        """
+        The PluginLoader hands over the track hash and the store path before processing.
+
+        :param track_hash: str
+        :param store_path: str
+            The directory of the stores across tracks
+        :return: None
+        """
+        self._context = {"track_hash": track_hash, "store_path": store_path}
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+    def _passes(self, hits):
+        """
+        Group the hits of one endpoint into passes: Runs of consecutive track points.
+        The closest point of every run is the position of the pass.
+
+        :param hits: pd.DataFrame
+            Columns point, distance
+        :return: np.array
+            Track point of every pass (sorted)
+        """
+        if len(hits) == 0:
+            return np.zeros(0, dtype=np.int64)
+        hits = hits.sort_values("point")
+        run = np.concatenate([[0], np.cumsum(np.diff(hits["point"].to_numpy()) > 1)])
+        return np.sort(hits.loc[hits.groupby(run)["distance"].idxmin(), "point"].to_numpy())
+
+    def _nearest(self, shape, xyz):
+        """
+        Distance and index of the nearest track point for every shape point.
+
+        :param shape: np.array
+            Shape (m, 3)
+        :param xyz: np.array
+            Shape (n, 3)
+        :return: tuple
+            (distance, index) as np.array
+        """
+        if cKDTree is not None:
+            return cKDTree(xyz).query(shape)
+        dist = np.empty(len(shape))
+        index = np.empty(len(shape), dtype=np.int64)
+        # Chunks of shape points to bound the memory of the distance matrix:
+        for i in range(0, len(shape), 64):
+            d2 = ((shape[i:i + 64, None, :] - xyz[None, :, :]) ** 2).sum(axis=2)
+            index[i:i + 64] = d2.argmin(axis=1)
+            dist[i:i + 64] = np.sqrt(d2[np.arange(len(d2)), index[i:i + 64]])
+        return dist, index
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sgps = self._data_dict.get("gps")
+        store_path = self._context.get("store_path")
+
+        if store_path is None:
+            print("Plugin_SegmentEfforts requires a store path")
+            return
+
+        columns = ["segment_id", "name", "start_index", "end_index", "start_duration",
+                   "elapsed_time", "distance", "segment_length", "speed", "coverage"]
+
+        lat = sgps["latitude"].to_numpy(dtype=float)
+        lon = sgps["longitude"].to_numpy(dtype=float)
+        t = timestamps_to_seconds(sgps["timestamp"])
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon) & np.isfinite(t))
+        lat, lon, t = lat[valid], lon[valid], t[valid]
+        xyz = to_xyz(lat, lon)
+        dist = np.cumsum(step_distances(lat, lon))
+
+        index = SegmentLibrary(store_path).get_index(spacing=self._plugin_config.get("spacing"))
+        hits = index.find_endpoint_hits(xyz, radius=self._plugin_config.get("match_radius"))
+
+        efforts = []
+        for i_segment, i_hits in hits.groupby("segment"):
+            start_passes = self._passes(i_hits[~i_hits["is_end"]])
+            end_passes = self._passes(i_hits[i_hits["is_end"]])
+            if len(start_passes) == 0 or len(end_passes) == 0:
+                continue
+
+            # The first end pass after every start pass, unless another start pass is closer:
+            i_end = np.searchsorted(end_passes, start_passes, side="right")
+            next_start = np.append(start_passes[1:], np.iinfo(np.int64).max)
+            paired = i_end < len(end_passes)
+            paired[paired] &= end_passes[i_end[paired]] < next_start[paired]
+
+            shape = index.shapes[i_segment]
+            segment = index.segments.iloc[i_segment]
+            for i_start, i_stop in zip(start_passes[paired], end_passes[i_end[paired]]):
+                d_shape, i_shape = self._nearest(shape, xyz[i_start:i_stop + 1])
+                coverage = float(np.mean(d_shape <= self._plugin_config.get("tolerance")))
+                order = float(np.mean(np.diff(i_shape) >= 0)) if len(i_shape) > 1 else 1.
+                if coverage < self._plugin_config.get("min_coverage") or order < self._plugin_config.get("min_order"):
+                    continue
+
+                elapsed_time = t[i_stop] - t[i_start]
+                distance = dist[i_stop] - dist[i_start]
+                efforts.append([segment["segment_id"], segment["name"], valid[i_start], valid[i_stop],
+                                t[i_start] - t[0], elapsed_time, distance, segment["length"],
+                                distance / elapsed_time if elapsed_time > 0 else np.nan, coverage])
+
+        self._proc_result = pd.DataFrame(efforts, columns=columns)
+
+        # if you make it to here:
+        self._proc_success = True
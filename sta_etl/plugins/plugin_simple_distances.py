@@ -1,4 +1,5 @@
 from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.geo_tools import timestamps_to_seconds
 
 import pandas as pd
 import numpy as np
@@ -10,6 +11,16 @@ class Plugin_SimpleDistance():
     """
     This is a simple distance plugin to calculate individual time and position
     differences.
+
+    The plugin runs in append mode (see "incremental" and PluginLoader.i_process(...)):
+    When the 'gps' leaf of a track only grew, it gets the new rows only and continues
+    from the last point and the sums in its carry-over state.
+
+    .. note::
+        'duration' and 'duration_sum' are float seconds (see
+        geo_tools.timestamps_to_seconds(...)). For numeric timestamps in seconds this is
+        the plain timestamp difference of older leaves. Datetime timestamps failed before
+        (Timedelta durations), so no older leaf holds another unit.
     """
     def __init__(self):
         """
@@ -24,8 +35,10 @@ class Plugin_SimpleDistance():
             This is a simple distance plugin to calculate individual time and position
             differences.
             """,
-            "leaf_name": "simple_distances"
+            "leaf_name": "simple_distances",
+            "incremental": True
         }
+        self._state = None
 
     def init(self):
         """
@@ -92,6 +105,16 @@ class Plugin_SimpleDistance():
         print(self._plugin_config.get('plugin_description'))
         print("<-----------")
 
+    def set_plugin_state(self, state=None):
+        """
+        The PluginLoader hands over the carry-over state of the last run before
+        processing new rows in append mode (None: process from the first row).
+
+        :param state: dictionary or None
+        :return: None
+        """
+        self._state = state
+
     def set_plugin_data(self, data_dict={}):
         """
         A function to set the necessary data as a dictionary. The dictionary self._data_dict
@@ -129,7 +152,8 @@ class Plugin_SimpleDistance():
         :return:
         """
         #Fetch all important data for calculations:
-        gps_data = self.data_dict.get("gps")
+        gps_data = self._data_dict.get("gps")
+        state = self._state if self._state is not None else {}
 
         # Your calculations start here:
         #collecter:
@@ -137,24 +161,25 @@ class Plugin_SimpleDistance():
         dx_list = []
         dxz_list = []
         time_list = []
-        gps0 = None
-        time0 = None
+        # Continue from the last point of the last run in append mode:
+        gps0 = tuple(state["gps"]) if "gps" in state else None
+        time0 = state.get("timestamp")
+        # Timestamps in float seconds (datetime or numeric timestamp columns):
+        seconds = timestamps_to_seconds(gps_data["timestamp"])
 
         # Iterate over rows, extract, transform, append
-        for row in gps_data.T.iteritems():
+        for row, i_time in zip(gps_data.itertuples(), seconds.tolist()):
             # Extract the first row
-            i_gps = (row[1]["latitude"], row[1]["longitude"], row[1]["altitude"])
-            i_time = row[1]["timestamp"]
-            time_list.append(i_time)
+            i_gps = (row.latitude, row.longitude, row.altitude)
+            time_list.append(row.timestamp)
             # Set the gps/time to zero
             if gps0 is None:
                 gps0 = i_gps
             if time0 is None:
                 time0 = i_time
 
-            # time difference:
-            #dt = (i_time - time0).total_seconds()
-            dt = (i_time - time0)
+            # time difference in seconds:
+            dt = i_time - time0
 
             # geodasic distance (x/y)
             dx = geopy_distance(i_gps[:2], gps0[:2]).m
@@ -170,9 +195,9 @@ class Plugin_SimpleDistance():
             time0 = i_time
 
         # post processing:
-        dt_cumsum_list = np.cumsum(dt_list)
-        dx_cumsum_list = np.cumsum(dx_list)
-        dxz_cumsum_list = np.cumsum(dxz_list)
+        dt_cumsum_list = state.get("duration_sum", 0.) + np.cumsum(dt_list)
+        dx_cumsum_list = state.get("dist_geodasic_sum", 0.) + np.cumsum(dx_list)
+        dxz_cumsum_list = state.get("dist_euclidiac_sum", 0.) + np.cumsum(dxz_list)
 
         dv_geodasic = [i / j if j > 0 else 0 for i, j in zip(dx_list, dt_list)]
         dv_euclidian = [i / j if j > 0 else 0 for i, j in zip(dxz_list, dt_list)]
@@ -192,6 +217,18 @@ class Plugin_SimpleDistance():
 
         self._proc_result = pd.DataFrame(data=results)
 
+        # The carry-over state for the next rows (see set_plugin_state(...)):
+        if len(time_list) > 0:
+            self._proc_result.attrs["carry_state"] = {
+                "gps": [float(i) for i in gps0],
+                "timestamp": float(time0),
+                "duration_sum": float(dt_cumsum_list[-1]),
+                "dist_geodasic_sum": float(dx_cumsum_list[-1]),
+                "dist_euclidiac_sum": float(dxz_cumsum_list[-1])
+            }
+        else:
+            self._proc_result.attrs["carry_state"] = self._state
+
 
         #if you make it to here:
         self._proc_success = True
@@ -0,0 +1,219 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.geo_tools import to_local_xy
+
+import numpy as np
+
+@Collector
+class Plugin_SimplifiedTrack():
+    """
+    This plugin simplifies a track with the Douglas-Peucker algorithm: Only the
+    points which deviate more than a spatial tolerance (meter) from the simplified
+    line are kept. Consumers which do not need every GPS point (maps, route matching,
+    export) can depend on the 'gps_simplified' leaf instead of 'gps'.
+
+    The leaf holds the kept rows of the 'gps' leaf (all columns) and their original
+    row number in the column point_index. The summary of the simplification is
+    stored in DataFrame.attrs (n_points_in, n_points_out, compression_ratio).
+
+    .. note::
+        The algorithm works with an explicit stack of index ranges instead of recursion
+        and calculates the distances of a range in one vectorized step. Therefore, it
+        is safe for tracks with millions of points.
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Simplified_Track",
+            "plugin_dependencies": ["gps"],
+            "plugin_description": """
+            This plugin reduces the GPS points of a track with the Douglas-Peucker
+            algorithm and a configurable spatial tolerance.
+            """,
+            "leaf_name": "gps_simplified",
+            "tolerance": 5.
+        }
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+
+    def _douglas_peucker(self, x, y, tolerance):
+        """
+        Iterative Douglas-Peucker simplification.
+
+        :param x: np.array
+            x coordinates in meter
+        :param y: np.array
+            y coordinates in meter
+        :param tolerance: float
+            Maximum distance (meter) of a removed point to the simplified line.
+        :return: np.array
+            A boolean mask of the kept points
+        """
+        n = len(x)
+        keep = np.zeros(n, dtype=bool)
+        if n == 0:
+            return keep
+        keep[0] = True
+        keep[-1] = True
+
+        stack = [(0, n - 1)]
+        while len(stack) > 0:
+            i_first, i_last = stack.pop()
+            if i_last - i_first < 2:
+                continue
+
+            # Distance of all inner points to the segment first -> last:
+            sx = x[i_last] - x[i_first]
+            sy = y[i_last] - y[i_first]
+            px = x[i_first + 1:i_last] - x[i_first]
+            py = y[i_first + 1:i_last] - y[i_first]
+            seg_len2 = sx * sx + sy * sy
+            if seg_len2 > 0:
+                t = np.clip((px * sx + py * sy) / seg_len2, 0., 1.)
+                dist2 = (px - t * sx) ** 2 + (py - t * sy) ** 2
+            else:
+                dist2 = px * px + py * py
+
+            i_max = int(np.argmax(dist2))
+            if dist2[i_max] > tolerance * tolerance:
+                i_split = i_first + 1 + i_max
+                keep[i_split] = True
+                stack.append((i_first, i_split))
+                stack.append((i_split, i_last))
+
+        return keep
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sgps = self._data_dict.get("gps")
+
+        valid = (np.isfinite(sgps["latitude"].to_numpy(dtype=float)) &
+                 np.isfinite(sgps["longitude"].to_numpy(dtype=float)))
+        gps_valid = sgps[valid]
+
+        x, y = to_local_xy(gps_valid["latitude"].to_numpy(dtype=float),
+                           gps_valid["longitude"].to_numpy(dtype=float))
+        keep = self._douglas_peucker(x, y, self._plugin_config.get("tolerance"))
+
+        result = gps_valid[keep].copy()
+        result["point_index"] = np.flatnonzero(valid)[keep]
+        result = result.reset_index(drop=True)
+
+        n_in = len(sgps)
+        n_out = len(result)
+        result.attrs["n_points_in"] = int(n_in)
+        result.attrs["n_points_out"] = int(n_out)
+        result.attrs["compression_ratio"] = float(n_in / n_out) if n_out > 0 else 0.
+        self._proc_result = result
+
+        # if you make it to here:
+        self._proc_success = True
@@ -0,0 +1,181 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.sketches import DDSketch, FixedHistogram, sketches_to_frame
+
+import numpy as np
+
+@Collector
+class Plugin_Sketches():
+    """
+    This plugin summarizes the distributions of velocity, gradient and altitude of a
+    track in mergeable sketches: A DDSketch (relative quantile accuracy 'alpha') and a
+    histogram with fixed bins per quantity. Unlike the exact percentiles of
+    Plugin_SimpleProjection, the sketches of many tracks are merged by adding their
+    counts, so percentiles across tracks (e.g. the 90th percentile of the velocity of a
+    year) are answered without reading any 'gps' or 'simple_distances' leaf again.
+
+    The result is stored in long format, see sta_etl.sketches.sketches_to_frame(...).
+    See sta_etl.analytics.sketch_quantiles(...) for the queries across tracks.
+
+    .. note::
+        The histogram bins are given as [start, stop, step] in the plugin configuration.
+        They must not change for existing leaves, otherwise the histograms can not be
+        merged anymore.
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Sketches",
+            "plugin_dependencies": ["simple_distances", "gps"],
+            "plugin_description": """
+            This plugin stores mergeable quantile sketches and histograms of velocity,
+            gradient and altitude.
+            """,
+            "leaf_name": "sketches",
+            "alpha": 0.01,
+            "min_gradient_distance": 1.,
+            "histograms": {"velocity": [0., 30., 0.5],
+                           "gradient": [-30., 30., 1.],
+                           "altitude": [-500., 5000., 50.]}
+        }
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sdistances = self._data_dict.get("simple_distances")
+        gps = self._data_dict.get("gps")
+
+        # The first point has no step and no velocity:
+        velocity = sdistances["velocity_geodasic"].to_numpy(dtype=float)[1:]
+
+        # Gradient in percent between two points which are at least min_gradient_distance apart:
+        altitude = gps["altitude"].to_numpy(dtype=float)
+        dist = sdistances["dist_geodasic"].to_numpy(dtype=float)[1:]
+        d_alt = np.diff(altitude)
+        moved = dist >= self._plugin_config.get("min_gradient_distance")
+        gradient = 100. * d_alt[moved] / dist[moved]
+
+        values = {"velocity": velocity, "gradient": gradient, "altitude": altitude}
+        sketches = {}
+        histograms = {}
+        for i_name, i_values in values.items():
+            sketches[i_name] = DDSketch(alpha=self._plugin_config.get("alpha"))
+            sketches[i_name].add(i_values)
+
+            start, stop, step = self._plugin_config.get("histograms")[i_name]
+            histograms[i_name] = FixedHistogram(np.arange(start, stop + step / 2., step))
+            histograms[i_name].add(i_values)
+
+        self._proc_result = sketches_to_frame(sketches, histograms)
+
+        # if you make it to here:
+        self._proc_success = True
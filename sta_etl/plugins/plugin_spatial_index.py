@@ -0,0 +1,188 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.stores.spatial_index import SpatialIndex
+
+import numpy as np
+
+@Collector
+class Plugin_SpatialIndex():
+    """
+    This plugin adds a track to the spatial index across all tracks (see SpatialIndex
+    in stores/spatial_index.py). The GPS points are binned into grid cells and the
+    index entries of the track are replaced with the new cells. Region queries
+    (bounding box, radius) are then answered by the index without reading any 'gps'
+    leaf.
+
+    The leaf of this plugin holds the grid cells of the track (row, col, n_points),
+    so the index can be rebuilt from the leaves at any time.
+
+    .. note::
+        This plugin needs the track hash and the store path from the PluginLoader
+        (see set_plugin_context(...)).
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Spatial_Index",
+            "plugin_dependencies": ["gps"],
+            "plugin_description": """
+            This plugin maintains a spatial index of grid cells across all tracks to find
+            tracks by region.
+            """,
+            "leaf_name": "spatial_index",
+            "cell_size": 0.01
+        }
+        self._context = {}
+
+    def set_plugin_context(self, track_hash, store_path):
+        """
+        The PluginLoader hands over the track hash and the store path before processing.
+
+        :param track_hash: str
+        :param store_path: str
+            The directory of the stores across tracks
+        :return: None
+        """
+        self._context = {"track_hash": track_hash, "store_path": store_path}
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sgps = self._data_dict.get("gps")
+        track_hash = self._context.get("track_hash")
+        store_path = self._context.get("store_path")
+
+        if track_hash is None or store_path is None:
+            print("Plugin_SpatialIndex requires a track hash and a store path")
+            return
+
+        lat = sgps["latitude"].to_numpy(dtype=float)
+        lon = sgps["longitude"].to_numpy(dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        lat = lat[valid]
+        lon = lon[valid]
+
+        si = SpatialIndex(store_path=store_path, cell_size=self._plugin_config.get("cell_size"))
+        cells = si.get_cells(lat, lon)
+
+        if len(lat) == 0:
+            si.remove_track(track_hash)
+        else:
+            si.update_track(track_hash=track_hash,
+                            cells=cells,
+                            bbox=(lat.min(), lon.min(), lat.max(), lon.max(), len(lat)))
+
+        self._proc_result = cells
+
+        # if you make it to here:
+        self._proc_success = True
@@ -0,0 +1,212 @@
+from sta_etl.plugin_handler.etl_collector import Collector
+
+import pandas as pd
+import numpy as np
+
+@Collector
+class Plugin_Splits():
+    """
+    This plugin calculates split times per kilometre and per mile from the cumulative
+    distance and duration of Plugin_SimpleDistance. Every split boundary is interpolated
+    exactly between the two GPS points around it. The last (incomplete) split is part
+    of the result too.
+
+    The result holds one row per split with the columns:
+    - unit: 'km' or 'mi'
+    - split: Split number (starts with 1)
+    - split_distance: Length of the split in meter (shorter for the last split)
+    - split_duration: Duration of the split
+    - elapsed_duration: Duration from the start of the track to the end of the split
+    - pace: Duration per unit (km or mi)
+    - elevation_delta: Altitude difference between the end and the start of the split
+    """
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Splits",
+            "plugin_dependencies": ["simple_distances", "gps"],
+            "plugin_description": """
+            This plugin calculates per-kilometre and per-mile split times, paces and
+            elevation differences.
+            """,
+            "leaf_name": "splits",
+            "split_units": {"km": 1000., "mi": 1609.344}
+        }
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+
+    def _interpolate_at(self, boundaries, x, y):
+        """
+        Interpolate y linearly at the boundaries of the non-decreasing array x. For
+        every boundary b we use the first point with x >= b and its predecessor, so
+        repeated values in x (e.g. standing still) do not matter.
+
+        :param boundaries: np.array
+        :param x: np.array
+            Non-decreasing array (cumulative distance)
+        :param y: np.array
+        :return: np.array
+        """
+        idx = np.searchsorted(x, boundaries, side="left")
+        idx = np.clip(idx, 1, len(x) - 1)
+        x0 = x[idx - 1]
+        x1 = x[idx]
+        y0 = y[idx - 1]
+        y1 = y[idx]
+        dx = x1 - x0
+        frac = np.divide(boundaries - x0, dx, out=np.zeros_like(boundaries), where=dx > 0)
+        frac = np.clip(frac, 0., 1.)
+        return y0 + frac * (y1 - y0)
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        #Fetch all important data for calculations:
+        sdistances = self._data_dict.get("simple_distances")
+        sgps = self._data_dict.get("gps")
+
+        dist = sdistances["dist_geodasic_sum"].to_numpy(dtype=float)
+        duration = sdistances["duration_sum"].to_numpy(dtype=float)
+        altitude = sgps["altitude"].to_numpy(dtype=float)
+
+        columns = ["unit", "split", "split_distance", "split_duration",
+                   "elapsed_duration", "pace", "elevation_delta"]
+        if len(dist) < 2 or dist[-1] <= 0:
+            self._proc_result = pd.DataFrame(columns=columns)
+            self._proc_success = True
+            return
+
+        results = []
+        for unit, unit_length in self._plugin_config.get("split_units").items():
+            # The boundaries of all splits incl. the start and the end of the track:
+            boundaries = np.arange(0, dist[-1], unit_length, dtype=float)
+            boundaries = np.append(boundaries, dist[-1])
+
+            t_boundaries = self._interpolate_at(boundaries, dist, duration)
+            a_boundaries = self._interpolate_at(boundaries, dist, altitude)
+
+            split_distance = np.diff(boundaries)
+            split_duration = np.diff(t_boundaries)
+
+            results.append(pd.DataFrame({
+                "unit": unit,
+                "split": np.arange(1, len(split_distance) + 1),
+                "split_distance": split_distance,
+                "split_duration": split_duration,
+                "elapsed_duration": t_boundaries[1:] - t_boundaries[0],
+                "pace": split_duration / (split_distance / unit_length),
+                "elevation_delta": np.diff(a_boundaries)
+            }))
+
+        self._proc_result = pd.concat(results, ignore_index=True)[columns]
+
+        # if you make it to here:
+        self._proc_success = True
@@ -0,0 +1,370 @@
+from sta_etl.plugin_handler.etl_collector import Collector, NameCollector, ClassCollector
+
+import os
+import time
+import zlib
+import tempfile
+import pandas as pd
+import numpy as np
+
+
+class Plugin_Synthetic():
+    """
+    This is a synthetic workload plugin (load generator) to measure the PluginLoader
+    (scheduling, admission control, worker pool, journal, ...) under controlled load.
+    Every synthetic plugin reads all its dependencies (fan-in) and simulates a plugin
+    with a configurable
+    - number of output rows and columns ('rows', 'columns')
+    - CPU time ('cpu_seconds', varied per track by a log-normal 'cpu_jitter')
+    - memory footprint, held while the plugin runs ('memory_mb')
+    - file I/O: a temporary file is written and read back ('io_mb')
+    - failure probability ('failure_probability'). 'failure_mode' is 'retry' (no
+      processing success) or 'error' (an exception).
+
+    All random decisions and the output are seeded by 'seed', the leaf name and the track
+    hash, so a run can be repeated exactly.
+
+    .. note::
+        Synthetic plugins are not registered by default. Build a DAG of them with
+        make_synthetic_dag(...) and register it with register_synthetic_plugins(...)
+        before the PluginLoader is created (or call its get_all_existing_leaf_names(...)).
+        Runtime registered plugins are only known to a PluginWorkerPool(...) with the
+        'fork' start method: 'spawn' workers import the loader module and know only the
+        plugins which are registered there, so every synthetic plugin fails in them.
+        Use PluginWorkerPool(start_method="fork") and register before the pool starts
+        its workers.
+
+    :Example:
+        specs = make_synthetic_dag(n_layers=3, width=8, fan_in=2, seed=1, cpu_seconds=0.05)
+        plugin_names = register_synthetic_plugins(specs)
+        pl = PluginLoader()
+        pl.set_processor_plugins(",".join(plugin_names))
+    """
+
+    # The configuration of the synthetic plugin, set by register_synthetic_plugins(...):
+    _synthetic_config = {}
+
+    def __init__(self):
+        """
+        The class init function. This function holds only information
+        about the plugin itself. In that way we can always load the plugin
+        without initiating further variables and member functions
+        """
+        self._plugin_config = {
+            "plugin_name": "Synthetic",
+            "plugin_dependencies": ["gps"],
+            "plugin_description": """
+            This is a synthetic workload plugin with configurable output, CPU time,
+            memory footprint, I/O and failure probability.
+            """,
+            "leaf_name": "synthetic",
+            "rows": 100,
+            "columns": 4,
+            "cpu_seconds": 0.,
+            "cpu_jitter": 0.,
+            "memory_mb": 0.,
+            "io_mb": 0.,
+            "failure_probability": 0.,
+            "failure_mode": "retry",
+            "seed": 0
+        }
+        self._plugin_config.update(self._synthetic_config)
+        self._context = {}
+
+    def set_plugin_context(self, track_hash, store_path):
+        """
+        The PluginLoader hands over the track hash and the store path before processing.
+
+        :param track_hash: str
+        :param store_path: str
+            The directory of the stores across tracks
+        :return: None
+        """
+        self._context = {"track_hash": track_hash, "store_path": store_path}
+
+    def __del__(self):
+        """
+        At this point, adjust the destructor of your plugin to remove unnecessary
+        objects from RAM. In that way we can keep the RAM usage low.
+        :return: None
+        """
+        pass
+
+    def init(self):
+        """
+        The "true" init is used here to setup the plugin. At this point, a dictionary
+        (self._data_dict) is created which holds data which are required that this plugin runs through.
+        (see set_plugin_data(...) for more information). If self._data_dict is not set
+        externally, it could also mean that there are no requirements for data sources.
+        Have a look at the processing instruction of this plugin to verify its function.
+
+        .. note::
+            - self._data_dict is always a dictionary which can be empty if not data are
+              required by this plugin
+            - self._proc_success is always False initially. Set to True if processing is
+              successful to notify the PluginLoader about the outcome.
+            - self._proc_result is initially None and becomes a pandas DataFrame or any
+              other data storage object. It is mandatory that the PluginLoader understands
+              how to handle the result and write it to the underlying storage facility.
+        :return: None
+        """
+        self._data_dict = {}
+        self._proc_success = False
+        self._proc_result = None
+
+    def get_result(self):
+        """
+        A return function for this plugin to transfer processed data the the PluginLoader.
+
+        This plugin returns None or pd.DataFrame as result. The plugin handler needs to
+        understand return object for creating the correct database entry and handle storage
+        of the plugin result on disk. See i_process(...) in loader.py for handling the result.
+
+        :return: Pandas DataFrame or None
+        """
+        return self._proc_result
+
+    def get_processing_success(self):
+        """
+        Reports the processing status back to the PluginLoader. This variable is set to False
+        by default and needs to be set to True if processing of the plugin is successful.
+        :return: bool
+        """
+        return self._proc_success
+
+    def get_plugin_config(self):
+        """
+        Standard function: Return
+        :return: A dictionary with the plugin configuration
+        """
+        return self._plugin_config
+
+    def print_plugin_config(self):
+        """
+        This one is just presenting the initial plugin configuration inside or outside this
+        plugin to users.
+        .. todo: This function uses Python print(...) right now. Change to logging soon.
+
+        :return: None
+        """
+        print("<-----------")
+        print(f"Plugin name {self._plugin_config.get('name')}")
+        print(f"Plugin dependencies: {self._plugin_config.get('plugin_dependencies')}")
+        print(f"Plugin produces leaf name (aka data asset): {self._plugin_config.get('leaf_name')}")
+        print(f"Plugin description:")
+        print(self._plugin_config.get('plugin_description'))
+        print("<-----------")
+
+    def set_plugin_data(self, data_dict={}):
+        """
+        A function to set the necessary data as a dictionary. The dictionary self._data_dict
+        is set before when running init(...) but have to set dictionary data beforehand when
+        your code below requires it for running.
+
+        :param data_dict: dictionary
+            A dictionary with data objects which can be understood by the processor code
+            below.
+        :return: None
+        """
+
+        self._data_dict = data_dict
+
+    def run(self):
+        """
+        A data processor can be sometimes more complicated. So you are supposed to use
+        run(...) as call for starting the processing instruction. You might like to put
+        control mechanism to it check the correct behavior of the plugin processor code.
+
+        .. note::
+            All processing instruction, helper functions,... are in the scope of "private"
+            of this plugin processor class. Therefore, stick to the _<name> convention when
+            defining names in your plugins.
+
+        :return: None
+        """
+        #Run individual steps of the data processing:
+        self._processer()
+
+    def _get_rng(self):
+        """
+        A random generator seeded by the seed of the configuration, the leaf name and the
+        track hash (crc32 is the same in every process, other than hash(...)).
+        """
+        key = f"{self._plugin_config.get('seed')}:{self._plugin_config.get('leaf_name')}:{self._context.get('track_hash')}"
+        return np.random.default_rng(zlib.crc32(key.encode()))
+
+    def _burn_cpu(self, seconds):
+        """
+        Keep one core busy for the given CPU time.
+        """
+        a = np.random.default_rng(0).standard_normal((64, 64))
+        t_start = time.process_time()
+        while time.process_time() - t_start < seconds:
+            a = np.tanh(a @ a)
+
+    def _do_io(self, n_bytes, rng):
+        """
+        Write n_bytes into a temporary file (in the store directory if there is one) and
+        read them back.
+        """
+        store_path = self._context.get("store_path")
+        directory = None
+        if store_path is not None:
+            directory = os.path.join(store_path, "synthetic")
+            os.makedirs(directory, exist_ok=True)
+        chunk = rng.integers(0, 256, size=min(n_bytes, 1024 ** 2), dtype=np.uint8).tobytes()
+        with tempfile.TemporaryFile(dir=directory) as f:
+            written = 0
+            while written < n_bytes:
+                written += f.write(chunk[:n_bytes - written])
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            while len(f.read(1024 ** 2)) > 0:
+                pass
+
+    def _processer(self):
+        """
+        The main function which is used in this plugin to process data
+        :return:
+        """
+        config = self._plugin_config
+        rng = self._get_rng()
+        # Draw the failure first, so it does not depend on the other settings:
+        fails = rng.random() < config.get("failure_probability")
+
+        # Fan-in: Read every dependency once:
+        input_rows = 0
+        for i_leaf_name in config.get("plugin_dependencies"):
+            i_data = self._data_dict.get(i_leaf_name)
+            if isinstance(i_data, pd.DataFrame):
+                input_rows += len(i_data)
+                i_data.select_dtypes("number").sum()
+
+        # Memory footprint (np.ones touches every page):
+        ballast = np.ones(int(config.get("memory_mb") * 1024 ** 2 / 8))
+
+        cpu_seconds = config.get("cpu_seconds")
+        if config.get("cpu_jitter") > 0:
+            cpu_seconds *= rng.lognormal(0., config.get("cpu_jitter"))
+        self._burn_cpu(cpu_seconds)
+
+        if config.get("io_mb") > 0:
+            self._do_io(int(config.get("io_mb") * 1024 ** 2), rng)
+        del ballast
+
+        if fails:
+            if config.get("failure_mode") == "error":
+                raise RuntimeError(f"Synthetic failure of {config.get('leaf_name')} on {self._context.get('track_hash')}")
+            return
+
+        leaf_name = config.get("leaf_name")
+        df = pd.DataFrame(rng.standard_normal((config.get("rows"), config.get("columns"))),
+                          columns=[f"{leaf_name}-{i}" for i in range(config.get("columns"))])
+        df["input_rows"] = input_rows
+
+        self._proc_result = df
+        self._proc_success = True
+
+
+def make_synthetic_dag(n_layers=3, width=4, fan_in=2, seed=0, source_leaves=("gps",), fan_out=None,
+                       **plugin_config):
+    """
+    The configurations of a layered DAG of synthetic plugins. The plugins of the first
+    layer depend on the source leaves, every other plugin on 'fan_in' random plugins of
+    the layer before (the fan-out follows from the random choice).
+
+    With fan_out, every plugin gets 'fan_out' random dependents in the next layer
+    instead (fan_in is ignored, the fan-in follows from the random choice). A plugin
+    which is chosen by no plugin of the layer before depends on the source leaves.
+
+    :param n_layers: int
+    :param width: int
+        Plugins per layer.
+    :param fan_in: int
+        Dependencies per plugin (at most width).
+    :param fan_out: int or None
+        Dependents per plugin in the next layer (at most width).
+    :param seed: int
+        Seed of the DAG shape and of the plugins.
+    :param source_leaves: list
+        The leaves of the first layer (e.g. 'gps').
+    :param plugin_config: keyword arguments
+        Settings of all plugins (see Plugin_Synthetic), e.g. cpu_seconds=0.1
+    :return: list
+        One configuration (dictionary) per plugin, in processing order.
+    """
+    rng = np.random.default_rng(seed)
+    specs = []
+    previous = list(source_leaves)
+    for i_layer in range(n_layers):
+        # Node -> dependencies, if every plugin of the layer before picks its dependents:
+        picked = {i_node: [] for i_node in range(width)}
+        if fan_out is not None and i_layer > 0:
+            for i_leaf_name in previous:
+                for i_node in rng.choice(width, size=min(fan_out, width), replace=False):
+                    picked[int(i_node)].append(i_leaf_name)
+
+        layer = []
+        for i_node in range(width):
+            if i_layer == 0:
+                dependencies = list(source_leaves)
+            elif fan_out is not None:
+                dependencies = sorted(picked[i_node]) if len(picked[i_node]) > 0 else list(source_leaves)
+            else:
+                dependencies = sorted(rng.choice(previous, size=min(fan_in, len(previous)), replace=False).tolist())
+            spec = dict(plugin_config)
+            spec.setdefault("seed", seed)
+            spec["leaf_name"] = f"synthetic_{i_layer}_{i_node}"
+            spec["plugin_dependencies"] = dependencies
+            specs.append(spec)
+            layer.append(spec["leaf_name"])
+        previous = layer
+    return specs
+
+
+def register_synthetic_plugins(specs, plugin_loader=None):
+    """
+    Register synthetic plugins in the plugin collector: One subclass of Plugin_Synthetic
+    per configuration, named Plugin_Synthetic_<leaf name>.
+
+    :param specs: list
+        Plugin configurations (dictionaries with at least 'leaf_name'), e.g. from
+        make_synthetic_dag(...)
+    :param plugin_loader: PluginLoader or None
+        A PluginLoader which learns the new leaves.
+    :return: list
+        The plugin names (str)
+    """
+    plugin_names = []
+    for i_spec in specs:
+        plugin_name = f"Plugin_Synthetic_{i_spec['leaf_name']}"
+        if plugin_name in NameCollector:
+            raise ValueError(f"{plugin_name} is registered already, see unregister_synthetic_plugins(...)")
+        config = dict(i_spec)
+        config.setdefault("plugin_name", plugin_name[len("Plugin_"):])
+        Collector(type(plugin_name, (Plugin_Synthetic,), {"_synthetic_config": config}))
+        plugin_names.append(plugin_name)
+
+    if plugin_loader is not None:
+        plugin_loader.get_all_existing_leaf_names()
+    return plugin_names
+
+
+def unregister_synthetic_plugins(plugin_loader=None):
+    """
+    Remove all synthetic plugins from the plugin collector.
+
+    :param plugin_loader: PluginLoader or None
+        A PluginLoader which forgets the synthetic leaves.
+    :return: list
+        The removed plugin names (str)
+    """
+    removed = [i for i in NameCollector if i.startswith("Plugin_Synthetic_")]
+    for i_plugin in removed:
+        NameCollector.remove(i_plugin)
+        del ClassCollector[i_plugin]
+
+    if plugin_loader is not None:
+        plugin_loader.get_all_existing_leaf_names()
+    return removed
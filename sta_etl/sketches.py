@@ -0,0 +1,274 @@
+"""Mergeable summaries of value distributions (quantile sketches and histograms)."""
+
+import numpy as np
+import pandas as pd
+
+
+class DDSketch():
+    """
+    This is DDSketch(...) - A quantile sketch with a relative accuracy guarantee
+    (Masson et al., DDSketch). Values are counted in logarithmic buckets: bucket k
+    holds all values in (gamma^(k-1), gamma^k] with gamma = (1 + alpha) / (1 - alpha).
+    Every quantile is returned with a relative error of at most alpha. Negative values
+    are counted in a mirrored set of buckets, values close to zero in a zero bucket.
+
+    Two sketches with the same alpha are merged by adding their bucket counts, so the
+    sketches of single tracks answer quantile queries over any set of tracks.
+
+    :Example:
+        sk = DDSketch(alpha=0.01)
+        sk.add(velocity)
+        sk.merge(other_sketch)
+        sk.quantile([0.5, 0.9])
+    """
+
+    def __init__(self, alpha=0.01, min_value=1e-9):
+        """
+        DDSketch constructor.
+
+        :param alpha: float
+            Relative accuracy of the quantiles.
+        :param min_value: float
+            Values with a magnitude below min_value are counted as zero.
+        """
+        self.alpha = alpha
+        self.min_value = min_value
+        self.gamma = (1. + alpha) / (1. - alpha)
+        self._log_gamma = np.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _get_keys(self, values):
+        """
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def _get_value(self, key):
+        """
+        The representative value of a bucket.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        return 2. * self.gamma ** key / (self.gamma + 1.)
+
+    def _add_counts(self, buckets, keys):
+        """
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        u_keys, u_counts = np.unique(keys, return_counts=True)
+        for i_key, i_count in zip(u_keys.tolist(), u_counts.tolist()):
+            buckets[i_key] = buckets.get(i_key, 0) + i_count
+
+    def add(self, values):
+        """
+        Add values to the sketch. NaN and infinite values are ignored.
+
+        :param values: np.array or list
+        :return: None
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+
+        is_pos = values >= self.min_value
+        is_neg = values <= -self.min_value
+        self._add_counts(self.positive, self._get_keys(values[is_pos]))
+        self._add_counts(self.negative, self._get_keys(-values[is_neg]))
+        self.zero_count += int(len(values) - is_pos.sum() - is_neg.sum())
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        """
+        Add the counts of another sketch to this sketch.
+
+        :param other: DDSketch
+            A sketch with the same alpha.
+        :return: None
+        """
+        if not np.isclose(other.alpha, self.alpha):
+            raise ValueError(f"Can not merge sketches with alpha {self.alpha} and {other.alpha}")
+        for i_key, i_count in other.positive.items():
+            self.positive[i_key] = self.positive.get(i_key, 0) + i_count
+        for i_key, i_count in other.negative.items():
+            self.negative[i_key] = self.negative.get(i_key, 0) + i_count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """
+        :param q: float or list
+            Quantile(s) between 0 and 1.
+        :return: float or np.array
+            NaN for an empty sketch.
+        """
+        qs = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.count == 0:
+            result = np.full(len(qs), np.nan)
+            return result if np.ndim(q) > 0 else float(result[0])
+
+        # All buckets in increasing order of their values:
+        neg_keys = sorted(self.negative, reverse=True)
+        pos_keys = sorted(self.positive)
+        values = np.concatenate([[-self._get_value(k) for k in neg_keys], [0.],
+                                 [self._get_value(k) for k in pos_keys]])
+        counts = np.concatenate([[self.negative[k] for k in neg_keys], [self.zero_count],
+                                 [self.positive[k] for k in pos_keys]])
+        cum_counts = np.cumsum(counts)
+
+        ranks = np.clip(qs, 0., 1.) * (self.count - 1)
+        idx = np.searchsorted(cum_counts, ranks, side="right")
+        result = np.clip(values[np.minimum(idx, len(values) - 1)], self.min, self.max)
+        return result if np.ndim(q) > 0 else float(result[0])
+
+
+class FixedHistogram():
+    """
+    This is FixedHistogram(...) - A histogram with fixed bin edges. Values outside the
+    edges are counted in an underflow and an overflow bin. Histograms with the same
+    edges are merged by adding their counts.
+    """
+
+    def __init__(self, edges):
+        """
+        FixedHistogram constructor.
+
+        :param edges: np.array or list
+            Increasing bin edges.
+        """
+        self.edges = np.asarray(edges, dtype=float)
+        # counts[0] is the underflow, counts[-1] the overflow bin:
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+
+    def add(self, values):
+        """
+        Add values to the histogram. NaN and infinite values are ignored.
+
+        :param values: np.array or list
+        :return: None
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        idx = np.searchsorted(self.edges, values, side="right")
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def merge(self, other):
+        """
+        :param other: FixedHistogram
+            A histogram with the same edges.
+        :return: None
+        """
+        if len(other.edges) != len(self.edges) or not np.allclose(other.edges, self.edges):
+            raise ValueError("Can not merge histograms with different edges")
+        self.counts += other.counts
+
+    def to_frame(self):
+        """
+        :return: pd.DataFrame
+            Columns lower, upper, count (including the under- and overflow bin with an
+            infinite edge)
+        """
+        edges = np.concatenate([[-np.inf], self.edges, [np.inf]])
+        return pd.DataFrame({"lower": edges[:-1], "upper": edges[1:], "count": self.counts})
+
+
+def sketches_to_frame(sketches, histograms):
+    """
+    Put the sketches and histograms of a track into a DataFrame in long format
+    (one row per bucket) such as it is stored in the 'sketches' leaf.
+
+    :param sketches: dictionary
+        Quantity name -> DDSketch
+    :param histograms: dictionary
+        Quantity name -> FixedHistogram
+    :return: pd.DataFrame
+        Columns quantity, kind, key, value, count. kind is one of
+        'dd_pos', 'dd_neg', 'dd_zero', 'dd_meta', 'hist_edge', 'hist_count'.
+    """
+    rows = []
+    for i_name, i_sketch in sketches.items():
+        rows.append([i_name, "dd_meta", 0, i_sketch.alpha, i_sketch.count])
+        rows.append([i_name, "dd_meta", 1, i_sketch.min, 0])
+        rows.append([i_name, "dd_meta", 2, i_sketch.max, 0])
+        rows.append([i_name, "dd_zero", 0, 0., i_sketch.zero_count])
+        rows.extend([i_name, "dd_pos", k, 0., c] for k, c in i_sketch.positive.items())
+        rows.extend([i_name, "dd_neg", k, 0., c] for k, c in i_sketch.negative.items())
+    for i_name, i_hist in histograms.items():
+        rows.extend([i_name, "hist_edge", k, e, 0] for k, e in enumerate(i_hist.edges.tolist()))
+        rows.extend([i_name, "hist_count", k, 0., c] for k, c in enumerate(i_hist.counts.tolist()))
+
+    df = pd.DataFrame(rows, columns=["quantity", "kind", "key", "value", "count"])
+    return df.astype({"key": np.int64, "value": float, "count": np.int64})
+
+
+def sketches_from_frame(df):
+    """
+    Rebuild the sketches and histograms from a 'sketches' leaf (see sketches_to_frame(...)).
+
+    :param df: pd.DataFrame
+    :return: tuple
+        (quantity name -> DDSketch, quantity name -> FixedHistogram)
+    """
+    sketches = {}
+    histograms = {}
+    for i_name, i_df in df.groupby("quantity", sort=False):
+        by_kind = {k: v for k, v in i_df.groupby("kind")}
+
+        if "dd_meta" in by_kind:
+            meta = by_kind["dd_meta"].set_index("key")
+            sk = DDSketch(alpha=float(meta.loc[0, "value"]))
+            sk.count = int(meta.loc[0, "count"])
+            sk.min = float(meta.loc[1, "value"])
+            sk.max = float(meta.loc[2, "value"])
+            if "dd_zero" in by_kind:
+                sk.zero_count = int(by_kind["dd_zero"]["count"].sum())
+            if "dd_pos" in by_kind:
+                sk.positive = dict(zip(by_kind["dd_pos"]["key"].tolist(), by_kind["dd_pos"]["count"].tolist()))
+            if "dd_neg" in by_kind:
+                sk.negative = dict(zip(by_kind["dd_neg"]["key"].tolist(), by_kind["dd_neg"]["count"].tolist()))
+            sketches[i_name] = sk
+
+        if "hist_edge" in by_kind:
+            hist = FixedHistogram(by_kind["hist_edge"].sort_values("key")["value"].to_numpy())
+            hist.counts = np.array(by_kind["hist_count"].sort_values("key")["count"], dtype=np.int64)
+            histograms[i_name] = hist
+
+    return sketches, histograms
+
+
+def merge_sketch_frames(frames):
+    """
+    Merge the 'sketches' leaves of many tracks.
+
+    :param frames: iterable
+        pd.DataFrame leaves from Plugin_Sketches
+    :return: tuple
+        (quantity name -> DDSketch, quantity name -> FixedHistogram)
+    """
+    sketches = {}
+    histograms = {}
+    for i_df in frames:
+        i_sketches, i_histograms = sketches_from_frame(i_df)
+        for i_name, i_sketch in i_sketches.items():
+            if i_name in sketches:
+                sketches[i_name].merge(i_sketch)
+            else:
+                sketches[i_name] = i_sketch
+        for i_name, i_hist in i_histograms.items():
+            if i_name in histograms:
+                histograms[i_name].merge(i_hist)
+            else:
+                histograms[i_name] = i_hist
+    return sketches, histograms
@@ -1,13 +1,46 @@
 from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.plugin_handler.journal import RunJournal
+from sta_etl.plugin_handler.watcher import TrackWatcher
+from sta_etl.plugin_handler.batch import read_user_hashes, iter_track_hashes, process_stream
+from sta_etl.plugin_handler.backlog import scan_backlog
 from sta_core import DataBaseHandler
 import datetime
+import os
 
 def list_plugins():
     pl = PluginLoader()
     all_available_plugins = pl.get_all_plugins()
     return all_available_plugins
 
-def cli_proc(track_hash, db_info, plugins=None):
+def get_store_path(db_info):
+    """
+    The directory for stores across tracks (spatial index, heatmaps, ...). It is set
+    by db_info["store_path"] and defaults to a directory next to the database.
+
+    :param db_info: dictionary
+    :return: str
+    """
+    return db_info.get("store_path", os.path.join(db_info["db_path"], "sta_etl_store"))
+
+def cli_proc(track_hash, db_info, plugins=None, journal_path=None, ephemeral=None):
+    """
+    Process a track (or all tracks with track_hash=None) of a user with the chosen plugins.
+
+    :param track_hash: str or None
+        The track hash to process. None processes all tracks of the user db_info["db_hash"].
+    :param db_info: dictionary
+        Holds db_type, db_path, db_name and db_hash (user hash)
+    :param plugins: str or None
+        Plugin names (see PluginLoader.set_processor_plugins(...))
+    :param journal_path: str or None
+        Path to a run journal. If the journal holds an unfinished plan of a previous run
+        with the same track hash, user and plugins, only the remaining tracks of that plan
+        are processed and the user branches are not read again. Otherwise a new plan starts.
+    :param ephemeral: str or None
+        Leaf names (separated by ',') which are kept in memory only when they are processed
+        as dependency (see PluginLoader.set_ephemeral_leaves(...))
+    :return: None
+    """
     print(track_hash)
 
 
@@ -23,8 +56,6 @@ def cli_proc(track_hash, db_info, plugins=None):
     else:
         print(f"Database {db_info['db_name']} does exists")
 
-    user_tracks = dbh.read_branch(key="user_hash", attribute=db_info["db_hash"])
-
     # Plugin Loader:
     pl = PluginLoader()
     pl.set_database_handler(dbh=dbh)
@@ -33,21 +64,267 @@ def cli_proc(track_hash, db_info, plugins=None):
     # print(all_available_plugins)
 
     pl.set_processor_plugins(plugins=plugins)
+    pl.set_store_path(get_store_path(db_info))
+    pl.set_ephemeral_leaves(ephemeral)
+
+    journal = None
+    if journal_path is not None:
+        journal = RunJournal(journal_path)
+        pl.set_journal(journal)
+        pl.recover_journal()
 
-    for i_track in user_tracks:
-        i_track_hash = i_track.get("track_hash")
+    leaf_names = pl.get_leaf_names(pl.plugins_to_process)
+    request = {"user_hash": db_info["db_hash"], "track_hash": track_hash, "leaf_names": sorted(leaf_names)}
+    track_hashes = None
+    if journal is not None and journal.has_plan() and journal.get_request() == request:
+        # Resume a previous run: The journal knows what remains.
+        track_hashes = journal.get_pending_tracks()
+        if len(track_hashes) > 0:
+            print(f"Resume run from {journal_path}: {len(track_hashes)} tracks remain")
+        else:
+            track_hashes = None
 
-        if i_track_hash != track_hash:
-            continue
+    if track_hashes is None:
+        user_tracks = dbh.read_branch(key="user_hash", attribute=db_info["db_hash"])
+        track_hashes = [i_track.get("track_hash") for i_track in user_tracks
+                        if track_hash is None or i_track.get("track_hash") == track_hash]
+        if journal is not None:
+            journal.new_plan(request=request)
+            for i_track_hash in track_hashes:
+                journal.plan(track_hash=i_track_hash, leaf_names=leaf_names)
 
+    for i_track_hash in track_hashes:
         print("")
-        print(i_track)
+        print(i_track_hash)
         print("")
 
-
         pl.process_branch(i_track_hash)
 
+    if journal is not None:
+        journal.close()
+
     exit()
+
+
+def cli_batch(db_info, user_hashes, plugins=None, workers=1, window=None, journal_path=None,
+              ephemeral=None, report_interval=10., backlog=False, points_leaf="gps"):
+    """
+    Process all tracks of many users (e.g. the whole database) in one run. Users and their
+    branches are streamed: The branch list of the next user is read only when the tracks of
+    the previous user are taken into processing. Progress and throughput (tracks/s,
+    points/s) are reported every report_interval seconds.
+
+    :param db_info: dictionary
+        Holds db_type, db_path and db_name
+    :param user_hashes: str or iterable
+        The user hashes to process or the path of a text file with one user hash per line.
+    :param plugins: str or None
+        Plugin names (see PluginLoader.set_processor_plugins(...))
+    :param workers: int
+        Number of tracks which are processed at the same time.
+    :param window: int or None
+        Maximum number of tracks in flight (default 2 * workers)
+    :param journal_path: str or None
+        Path to a run journal. Tracks which are completed according to the journal are
+        skipped, so a died batch run continues where it stopped.
+    :param ephemeral: str or None
+        Leaf names which are kept in memory only (see PluginLoader.set_ephemeral_leaves(...))
+    :param report_interval: float
+        Seconds between two progress reports.
+    :param backlog: bool
+        Scan the branch information of all users first (see scan_backlog(...)) and
+        process only the tracks with work instead of streaming all tracks. Leaves which
+        are stuck in 'processing' are set back (see Backlog.get_stuck(...)), so no other
+        run may process the same tracks at the same time.
+    :param points_leaf: str or None
+        The leaf whose rows count as points (None: the rows of all input leaves).
+    :return: dictionary
+        The final throughput status (see BatchProgress.get_status())
+    """
+    dbh = DataBaseHandler(db_type=db_info["db_type"])
+    dbh.set_db_path(db_path=db_info["db_path"])
+    dbh.set_db_name(db_name=db_info["db_name"])
+
+    db_exists = dbh.get_database_exists()
+    if db_exists is False:
+        print(f"Database {db_info['db_name']} does not exists")
+        exit()
+
+    pl = PluginLoader()
+    pl.set_database_handler(dbh=dbh)
+    pl.set_processor_plugins(plugins=plugins)
+    pl.set_store_path(get_store_path(db_info))
+    pl.set_ephemeral_leaves(ephemeral)
+
+    journal = None
+    if journal_path is not None:
+        journal = RunJournal(journal_path)
+        pl.set_journal(journal)
+        pl.recover_journal()
+
+    if isinstance(user_hashes, str):
+        user_hashes = read_user_hashes(user_hashes)
+
+    if backlog is True:
+        bl = scan_backlog(pl, user_hashes)
+        # Leaves of died runs without journal are 'processing' forever otherwise:
+        for i_unit in bl.get_stuck(journal=journal):
+            pl.invalidate(i_unit["leaf_name"], [i_unit["track_hash"]])
+        track_hashes = bl.get_work_tracks(pl, journal=journal)
+        print(f"{len(track_hashes)} tracks with work according to the backlog")
+    else:
+        track_hashes = iter_track_hashes(pl, user_hashes)
+
+    status = process_stream(plugin_loader=pl,
+                            track_hashes=track_hashes,
+                            max_workers=workers,
+                            window=window,
+                            journal=journal,
+                            report_interval=report_interval,
+                            points_leaf=points_leaf)
+
+    if journal is not None:
+        journal.close()
+    return status
+
+
+def cli_backlog(db_info, user_hashes, plugins=None):
+    """
+    Print the backlog of many users: The number of tracks per leaf and status and the
+    work which is left for the chosen plugins (see scan_backlog(...)).
+
+    :param db_info: dictionary
+        Holds db_type, db_path and db_name
+    :param user_hashes: str or iterable
+        The user hashes or the path of a text file with one user hash per line.
+    :param plugins: str or None
+        Plugin names (see PluginLoader.set_processor_plugins(...))
+    :return: pd.DataFrame
+        The work list (see Backlog.get_work(...))
+    """
+    dbh = DataBaseHandler(db_type=db_info["db_type"])
+    dbh.set_db_path(db_path=db_info["db_path"])
+    dbh.set_db_name(db_name=db_info["db_name"])
+
+    db_exists = dbh.get_database_exists()
+    if db_exists is False:
+        print(f"Database {db_info['db_name']} does not exists")
+        exit()
+
+    pl = PluginLoader()
+    pl.set_database_handler(dbh=dbh)
+    pl.set_processor_plugins(plugins=plugins)
+
+    if isinstance(user_hashes, str):
+        user_hashes = read_user_hashes(user_hashes)
+
+    bl = scan_backlog(pl, user_hashes)
+    work = bl.get_work(pl)
+    print(f"Backlog of {len(bl.track_hashes)} tracks:")
+    print(bl.get_summary().to_string())
+    print(f"{len(work)} tracks with work, {int(work['blocked'].sum())} of them blocked by a missing leaf")
+    for i_leaf in work.columns.drop(["track_hash", "blocked"]):
+        print(f"    {i_leaf}: {int(work[i_leaf].sum())}")
+    return work
+
+
+def cli_invalidate(leaf_name, db_info, track_hash=None):
+    """
+    Mark a leaf and all leaves downstream of it as stale, so the next processing run
+    recomputes exactly those (see PluginLoader.invalidate(...)).
+
+    :param leaf_name: str
+        The changed leaf (e.g. 'gps' after a correction or the leaf of a changed plugin)
+    :param db_info: dictionary
+        Holds db_type, db_path, db_name and db_hash (user hash)
+    :param track_hash: str or None
+        The track to invalidate. None invalidates all tracks of the user db_info["db_hash"].
+    :return: dictionary
+        track_hash -> list of the leaf names which were marked stale
+    """
+    dbh = DataBaseHandler(db_type=db_info["db_type"])
+    dbh.set_db_path(db_path=db_info["db_path"])
+    dbh.set_db_name(db_name=db_info["db_name"])
+
+    db_exists = dbh.get_database_exists()
+    if db_exists is False:
+        print(f"Database {db_info['db_name']} does not exists")
+        exit()
+
+    pl = PluginLoader()
+    pl.set_database_handler(dbh=dbh)
+
+    if track_hash is not None:
+        track_hashes = [track_hash]
+    else:
+        track_hashes = [i_track.get("track_hash") for i_track in pl.read_user_branches(user_hash=db_info["db_hash"])]
+
+    print(f"Leaves downstream of {leaf_name}: {pl.get_downstream_leaves(leaf_name)}")
+    invalidated = pl.invalidate(leaf_name=leaf_name, track_hashes=track_hashes)
+    print(f"{sum(len(i) for i in invalidated.values())} leaves of {len(invalidated)} tracks are stale")
+    return invalidated
+
+
+def cli_daemon(db_info, plugins=None, poll_interval=30, workers=1, watermark_key=None, watch=True,
+               journal_path=None, ephemeral=None):
+    """
+    Run the processing as a service: New or changed tracks of the user are processed
+    as soon as they show up in the database. The PluginLoader and the database handler
+    stay warm between tracks. Stop with Ctrl+C.
+
+    :param db_info: dictionary
+        Holds db_type, db_path, db_name and db_hash (user hash)
+    :param plugins: str or None
+        Plugin names (see PluginLoader.set_processor_plugins(...))
+    :param poll_interval: float
+        Seconds between two polls of the branch information.
+    :param workers: int
+        Number of tracks which are processed at the same time.
+    :param watermark_key: str or None
+        Branch key with increasing values for new tracks (see TrackWatcher)
+    :param watch: bool
+        Use file system notifications on db_path (requires watchdog).
+    :param journal_path: str or None
+        Path to a run journal. Leaves which are completed according to the journal are
+        skipped without a database request, e.g. after a restart of the service.
+    :param ephemeral: str or None
+        Leaf names (separated by ',') which are kept in memory only when they are processed
+        as dependency (see PluginLoader.set_ephemeral_leaves(...))
+    :return: None
+    """
+    dbh = DataBaseHandler(db_type=db_info["db_type"])
+    dbh.set_db_path(db_path=db_info["db_path"])
+    dbh.set_db_name(db_name=db_info["db_name"])
+
+    db_exists = dbh.get_database_exists()
+    if db_exists is False:
+        print(f"Database {db_info['db_name']} does not exists")
+        exit()
+
+    pl = PluginLoader()
+    pl.set_database_handler(dbh=dbh)
+    pl.set_processor_plugins(plugins=plugins)
+    pl.set_store_path(get_store_path(db_info))
+    pl.set_ephemeral_leaves(ephemeral)
+
+    journal = None
+    if journal_path is not None:
+        journal = RunJournal(journal_path)
+        pl.set_journal(journal)
+        pl.recover_journal()
+
+    tw = TrackWatcher(plugin_loader=pl,
+                      user_hashes=[db_info["db_hash"]],
+                      poll_interval=poll_interval,
+                      watermark_key=watermark_key,
+                      n_workers=workers,
+                      watch_path=db_info["db_path"] if watch else None)
+    print(f"Watch tracks of user {db_info['db_hash']} in {db_info['db_name']}")
+    tw.run_forever()
+
+    if journal is not None:
+        journal.close()
+
     # for i_track in user_tracks:
     #     i_track_hash = i_track.get("track_hash")
     #
@@ -0,0 +1,386 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class _StoreLock():
+    """
+    A lock across threads (threading.Lock) and processes (fcntl.flock on a lock file,
+    if available) for the read-modify-write of the rasters.
+
+    .. note::
+        Only for private usage! Stick to the _
+    """
+    _thread_lock = threading.Lock()
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._f = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            self._f = open(self.lock_path, "a")
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._f is not None:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+            self._f.close()
+            self._f = None
+        self._thread_lock.release()
+
+
+class HeatmapStore():
+    """
+    This is HeatmapStore(...) - A persistent heatmap across all tracks on a tile
+    pyramid in Web Mercator (such as web map tiles). Every tile is a raster of
+    tile_size x tile_size point counts in its own .npy file:
+
+        <store>/heatmap/<zoom>/<tile x>_<tile y>.npy
+
+    The contribution of every track (pixel counts per zoom level) is kept in
+    <store>/heatmap/tracks/<track hash>.npz. Adding a track touches only the tiles it
+    covers: They are read completely and written as a whole. If the track was added
+    before, its old contribution is subtracted in the same pass, so the heatmap is
+    never rebuilt from all tracks.
+
+    .. note::
+        The zoom levels and the tile size must not change for an existing heatmap.
+
+        Every update is written ahead as an intent record with the old and the new
+        contribution of the track (<store>/heatmap/intent/). The changed tiles are
+        staged next to it and moved into place once all of them are written. A
+        HeatmapStore which finds an intent record on open replays it, so a crash in
+        the middle of an update is repaired: Either the update was not staged
+        completely and is applied again from the contributions, or the staged tiles
+        and the track record are moved into place. Counts never wrap around below zero.
+
+    :Example:
+        hm = HeatmapStore(store_path="/data/sta_etl_store")
+        hm.update_track(track_hash, lat, lon)
+        raster = hm.get_tile(zoom=14, tile_x=8710, tile_y=5686)
+    """
+
+    def __init__(self, store_path, zoom_levels=(8, 11, 14), tile_size=256):
+        """
+        HeatmapStore constructor.
+
+        :param store_path: str
+            The store directory.
+        :param zoom_levels: list
+            Zoom levels of the pyramid (0 is the whole world in one tile).
+        :param tile_size: int
+            Pixels per tile side.
+        """
+        self.store_path = store_path
+        self.heatmap_path = os.path.join(store_path, "heatmap")
+        self.zoom_levels = list(zoom_levels)
+        self.tile_size = tile_size
+        self.intent_path = os.path.join(self.heatmap_path, "intent")
+        os.makedirs(os.path.join(self.heatmap_path, "tracks"), exist_ok=True)
+
+        # Repair an update which died in the middle (see _replay_intent(...)):
+        with self._lock():
+            self._replay_intent()
+
+    def _lock(self):
+        """
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        return _StoreLock(os.path.join(self.heatmap_path, ".lock"))
+
+    def get_pixels(self, lat, lon, zoom):
+        """
+        Global Web Mercator pixel coordinates of points at a zoom level.
+
+        :param lat: np.array
+        :param lon: np.array
+        :param zoom: int
+        :return: tuple
+            (x, y) as np.array of int64
+        """
+        n_pixels = self.tile_size * 2 ** zoom
+        lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+        x = (np.asarray(lon, dtype=float) + 180.) / 360. * n_pixels
+        y = (1. - np.log(np.tan(lat_rad) + 1. / np.cos(lat_rad)) / np.pi) / 2. * n_pixels
+        return (np.clip(np.floor(x), 0, n_pixels - 1).astype(np.int64),
+                np.clip(np.floor(y), 0, n_pixels - 1).astype(np.int64))
+
+    def get_contribution(self, lat, lon):
+        """
+        Pixel counts of a track per zoom level.
+
+        :param lat: np.array
+        :param lon: np.array
+        :return: dictionary
+            zoom -> (keys, counts). A key encodes the tile and the pixel within the tile:
+            key = (tile_x * 2^zoom + tile_y) * tile_size^2 + row * tile_size + col
+        """
+        contribution = {}
+        ts = self.tile_size
+        for i_zoom in self.zoom_levels:
+            x, y = self.get_pixels(lat, lon, i_zoom)
+            tile = (x // ts) * 2 ** i_zoom + (y // ts)
+            keys = tile * ts * ts + (y % ts) * ts + (x % ts)
+            u_keys, u_counts = np.unique(keys, return_counts=True)
+            contribution[i_zoom] = (u_keys, u_counts.astype(np.uint32))
+        return contribution
+
+    def _tile_path(self, zoom, tile_x, tile_y):
+        """
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        return os.path.join(self.heatmap_path, str(zoom), f"{tile_x}_{tile_y}.npy")
+
+    def _track_path(self, track_hash):
+        """
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        return os.path.join(self.heatmap_path, "tracks", f"{track_hash}.npz")
+
+    def _apply(self, contribution, subtract=None):
+        """
+        Add a contribution to the tile rasters and subtract another one (e.g. the old
+        contribution of the same track). Only the covered tiles are read and every
+        changed tile is staged in the intent directory, the tiles themselves are not
+        touched (see _commit_intent(...)). Counts are clipped at zero instead of
+        wrapping around.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        ts2 = self.tile_size * self.tile_size
+        os.makedirs(self.intent_path, exist_ok=True)
+        for i_zoom in self.zoom_levels:
+            keys, deltas = [], []
+            if contribution is not None and i_zoom in contribution:
+                keys.append(contribution[i_zoom][0])
+                deltas.append(contribution[i_zoom][1].astype(np.int64))
+            if subtract is not None and i_zoom in subtract:
+                keys.append(subtract[i_zoom][0])
+                deltas.append(-subtract[i_zoom][1].astype(np.int64))
+            if len(keys) == 0:
+                continue
+            keys, deltas = np.concatenate(keys), np.concatenate(deltas)
+
+            tiles = keys // ts2
+            order = np.argsort(tiles, kind="stable")
+            tiles, pixels, deltas = tiles[order], keys[order] % ts2, deltas[order]
+            u_tiles, starts = np.unique(tiles, return_index=True)
+            ends = np.append(starts[1:], len(tiles))
+
+            for i_tile, i_start, i_end in zip(u_tiles.tolist(), starts, ends):
+                i_deltas = deltas[i_start:i_end]
+                if not i_deltas.any():
+                    continue
+                tile_x, tile_y = divmod(i_tile, 2 ** i_zoom)
+                path = self._tile_path(i_zoom, tile_x, tile_y)
+                if os.path.exists(path):
+                    raster = np.load(path).astype(np.int64)
+                elif (i_deltas <= 0).all():
+                    continue
+                else:
+                    raster = np.zeros((self.tile_size, self.tile_size), dtype=np.int64)
+                flat = raster.reshape(-1)
+                np.add.at(flat, pixels[i_start:i_end], i_deltas)
+                np.clip(flat, 0, np.iinfo(np.uint32).max, out=flat)
+
+                with open(os.path.join(self.intent_path, f"{i_zoom}_{tile_x}_{tile_y}.npy"), "wb") as f:
+                    np.save(f, raster.astype(np.uint32))
+
+    def _read_track(self, track_hash):
+        """
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        path = self._track_path(track_hash)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as f:
+            return self._get_arrays_contribution(f)
+
+    def _get_arrays_contribution(self, arrays, prefix=""):
+        """
+        The contribution in the arrays of a npz file (None if there is none).
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        if f"{prefix}keys_{self.zoom_levels[0]}" not in arrays:
+            return None
+        return {i_zoom: (arrays[f"{prefix}keys_{i_zoom}"], arrays[f"{prefix}counts_{i_zoom}"])
+                for i_zoom in self.zoom_levels if f"{prefix}keys_{i_zoom}" in arrays}
+
+    def _get_contribution_arrays(self, contribution, prefix=""):
+        """
+        The arrays of a contribution for a npz file.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        arrays = {}
+        if contribution is not None:
+            for i_zoom, (keys, counts) in contribution.items():
+                arrays[f"{prefix}keys_{i_zoom}"] = keys
+                arrays[f"{prefix}counts_{i_zoom}"] = counts
+        return arrays
+
+    def _save_npz(self, path, arrays):
+        """
+        Write a npz file to a temporary name and replace the file.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        path_tmp = path + ".tmp.npz"
+        np.savez(path_tmp, **arrays)
+        os.replace(path_tmp, path)
+
+    def _update(self, track_hash, contribution):
+        """
+        Replace the contribution of a track (None removes the track) in three steps:
+        1) Write the intent record with the old and the new contribution.
+        2) Stage the changed tiles (see _apply(...)) and mark the intent ready.
+        3) Move the staged tiles and the track record into place (see _commit_intent(...)).
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        old = self._read_track(track_hash)
+        os.makedirs(self.intent_path, exist_ok=True)
+        arrays = {"track_hash": np.array(track_hash)}
+        arrays.update(self._get_contribution_arrays(old, prefix="old_"))
+        arrays.update(self._get_contribution_arrays(contribution, prefix="new_"))
+        self._save_npz(os.path.join(self.intent_path, "intent.npz"), arrays)
+
+        self._apply(contribution, subtract=old)
+        open(os.path.join(self.intent_path, "ready"), "w").close()
+        self._commit_intent()
+
+    def _commit_intent(self):
+        """
+        Move the staged tiles into place, then write (or remove) the track record and
+        remove the intent. Tiles which were moved before are not staged anymore, so a
+        commit can be repeated after a crash.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        intent_file = os.path.join(self.intent_path, "intent.npz")
+        with np.load(intent_file) as f:
+            track_hash = str(f["track_hash"])
+            contribution = self._get_arrays_contribution(f, prefix="new_")
+
+        for i_file in sorted(os.listdir(self.intent_path)):
+            if not i_file.endswith(".npy"):
+                continue
+            zoom, tile_x, tile_y = (int(i) for i in i_file[:-4].split("_"))
+            os.makedirs(os.path.join(self.heatmap_path, str(zoom)), exist_ok=True)
+            os.replace(os.path.join(self.intent_path, i_file), self._tile_path(zoom, tile_x, tile_y))
+
+        if contribution is not None:
+            self._save_npz(self._track_path(track_hash), self._get_contribution_arrays(contribution))
+        elif os.path.exists(self._track_path(track_hash)):
+            os.remove(self._track_path(track_hash))
+
+        os.remove(os.path.join(self.intent_path, "ready"))
+        os.remove(intent_file)
+
+    def _replay_intent(self):
+        """
+        Finish the update of an intent record which was left by a died process: A ready
+        intent is committed, otherwise its tiles are staged again from the old and the
+        new contribution (no tile was touched yet).
+
+        .. note::
+            Only for private usage! Stick to the _
+
+        :return: bool
+            True if an intent was replayed.
+        """
+        intent_file = os.path.join(self.intent_path, "intent.npz")
+        if not os.path.exists(intent_file):
+            return False
+
+        if not os.path.exists(os.path.join(self.intent_path, "ready")):
+            for i_file in os.listdir(self.intent_path):
+                if i_file.endswith(".npy"):
+                    os.remove(os.path.join(self.intent_path, i_file))
+            with np.load(intent_file) as f:
+                old = self._get_arrays_contribution(f, prefix="old_")
+                contribution = self._get_arrays_contribution(f, prefix="new_")
+            self._apply(contribution, subtract=old)
+            open(os.path.join(self.intent_path, "ready"), "w").close()
+        print(f"Replay the heatmap update in {self.intent_path}")
+        self._commit_intent()
+        return True
+
+    def update_track(self, track_hash, lat, lon):
+        """
+        Add a track to the heatmap. The old contribution of the track is replaced.
+
+        :param track_hash: str
+        :param lat: np.array
+        :param lon: np.array
+        :return: dictionary
+            The new contribution (see get_contribution(...))
+        """
+        contribution = self.get_contribution(lat, lon)
+        with self._lock():
+            self._replay_intent()
+            self._update(track_hash, contribution)
+        return contribution
+
+    def remove_track(self, track_hash):
+        """
+        Subtract the contribution of a track from the heatmap.
+
+        :param track_hash: str
+        :return: bool
+            False if the track is not in the heatmap.
+        """
+        with self._lock():
+            self._replay_intent()
+            if not os.path.exists(self._track_path(track_hash)):
+                return False
+            self._update(track_hash, None)
+        return True
+
+    def get_tile(self, zoom, tile_x, tile_y):
+        """
+        :param zoom: int
+        :param tile_x: int
+        :param tile_y: int
+        :return: np.array
+            tile_size x tile_size point counts (zeros for an empty tile). Rows go from
+            north to south.
+        """
+        path = self._tile_path(zoom, tile_x, tile_y)
+        if not os.path.exists(path):
+            return np.zeros((self.tile_size, self.tile_size), dtype=np.uint32)
+        return np.array(np.load(path, mmap_mode="r"))
+
+    def get_tiles(self, zoom):
+        """
+        :param zoom: int
+        :return: pd.DataFrame
+            Columns tile_x, tile_y of all tiles with counts at a zoom level.
+        """
+        directory = os.path.join(self.heatmap_path, str(zoom))
+        tiles = []
+        if os.path.isdir(directory):
+            for i_file in os.listdir(directory):
+                if i_file.endswith(".npy"):
+                    tiles.append([int(i) for i in i_file[:-4].split("_")])
+        return pd.DataFrame(tiles, columns=["tile_x", "tile_y"], dtype=np.int64)
@@ -0,0 +1,286 @@
+import os
+import sqlite3
+import contextlib
+import hashlib
+import numpy as np
+import pandas as pd
+
+from sta_etl.geo_tools import step_distances, to_local_xy
+
+
+def resample_by_distance(lat, lon, spacing=None, n_points=None):
+    """
+    Resample a polyline along its cumulative distance, either with a fixed spacing
+    or to a fixed number of points.
+
+    :param lat: np.array
+    :param lon: np.array
+    :param spacing: float or None
+        Distance between two points in meter.
+    :param n_points: int or None
+        Number of points of the result (used if spacing is None).
+    :return: tuple
+        (lat, lon) as np.array
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    dist = np.cumsum(step_distances(lat, lon))
+    if len(lat) < 2 or dist[-1] <= 0:
+        return lat[:1], lon[:1]
+
+    if spacing is not None:
+        targets = np.arange(0., dist[-1], spacing)
+    else:
+        targets = np.linspace(0., dist[-1], n_points)
+
+    # Drop points without progress, np.interp requires increasing distances:
+    keep = np.concatenate([[True], np.diff(dist) > 0])
+    return np.interp(targets, dist[keep], lat[keep]), np.interp(targets, dist[keep], lon[keep])
+
+
+def discrete_frechet(xy_a, xy_b):
+    """
+    Discrete Fréchet distance between two polylines in a plane.
+
+    .. note::
+        The coupling distance of a pair of points depends on its left, upper and
+        upper-left neighbour, so all pairs of one anti-diagonal (i + j = k) depend on
+        the two anti-diagonals before only: Every anti-diagonal is computed in one
+        vectorized step (n + m - 1 steps instead of n * m).
+
+    :param xy_a: np.array
+        Shape (n, 2)
+    :param xy_b: np.array
+        Shape (m, 2)
+    :return: float
+    """
+    d = np.sqrt(((xy_a[:, None, :] - xy_b[None, :, :]) ** 2).sum(axis=2))
+    n, m = d.shape
+    # Coupling distances with a border of inf: ca[i + 1, j + 1] belongs to d[i, j]
+    ca = np.full((n + 1, m + 1), np.inf)
+    ca[0, 0] = 0.
+    for k in range(n + m - 1):
+        i = np.arange(max(0, k - m + 1), min(n - 1, k) + 1)
+        j = k - i
+        ca[i + 1, j + 1] = np.maximum(d[i, j], np.minimum(np.minimum(ca[i, j + 1], ca[i, j]), ca[i + 1, j]))
+    return float(ca[-1, -1])
+
+
+class RouteIndex():
+    """
+    This is RouteIndex(...) - A locality-sensitive hashing (LSH) index of route
+    signatures across all tracks to find repeated routes.
+
+    .. note::
+        A route signature is built in three steps:
+        1) The track is resampled every 'spacing' meter along its distance.
+        2) The resampled points are binned into grid cells of 'cell_size' degree.
+        3) The set of grid cells is summarized by a MinHash signature of 'n_hashes'
+           values. The fraction of equal values of two signatures estimates the
+           Jaccard similarity of the two cell sets.
+        The signature is split into 'n_bands' bands. Two tracks are candidates if at
+        least one band is equal, so a query only touches the buckets of its own bands.
+        A resampled polyline of 'n_points' points is stored per track for an exact
+        re-rank with the discrete Fréchet distance.
+
+        The parameters must not change for an existing index.
+
+    :Example:
+        ri = RouteIndex(store_path="/data/sta_etl_store")
+        ri.find_similar(track_hash="697b5d35", min_similarity=0.6, rerank=True)
+    """
+
+    def __init__(self, store_path, spacing=50., cell_size=0.002, n_hashes=64, n_bands=16,
+                 n_points=64, seed=42):
+        """
+        RouteIndex constructor. The index file is created if it does not exist.
+
+        :param store_path: str
+            The store directory.
+        :param spacing: float
+            Resampling distance in meter for the grid cells.
+        :param cell_size: float
+            Grid cell size in degree.
+        :param n_hashes: int
+            Length of the MinHash signature.
+        :param n_bands: int
+            Number of LSH bands. n_hashes must be a multiple of n_bands.
+        :param n_points: int
+            Number of points of the stored polyline for the re-rank.
+        :param seed: int
+            Seed of the MinHash functions.
+        """
+        if n_hashes % n_bands != 0:
+            raise ValueError("n_hashes must be a multiple of n_bands")
+
+        self.store_path = store_path
+        self.index_path = os.path.join(store_path, "route_index.sqlite")
+        self.spacing = spacing
+        self.cell_size = cell_size
+        self.n_hashes = n_hashes
+        self.n_bands = n_bands
+        self.n_points = n_points
+
+        # Multiply-shift hash functions on 64 bit integers:
+        rng = np.random.default_rng(seed)
+        self._hash_a = rng.integers(1, 2 ** 63 - 1, size=n_hashes, dtype=np.uint64) | np.uint64(1)
+        self._hash_b = rng.integers(0, 2 ** 63 - 1, size=n_hashes, dtype=np.uint64)
+
+        os.makedirs(store_path, exist_ok=True)
+        with self._connect() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS signatures (track_hash TEXT PRIMARY KEY, "
+                        "minhash BLOB, polyline BLOB)")
+            con.execute("CREATE TABLE IF NOT EXISTS buckets (band INTEGER, bucket INTEGER, "
+                        "track_hash TEXT, PRIMARY KEY (band, bucket, track_hash)) WITHOUT ROWID")
+            con.execute("CREATE INDEX IF NOT EXISTS buckets_track ON buckets (track_hash)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Open a new connection for every operation (threads and processes).
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        con = sqlite3.connect(self.index_path, timeout=60)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            # Commit (or roll back) the operation, then close the connection:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def get_signature(self, lat, lon):
+        """
+        Calculate the MinHash signature and the re-rank polyline of a track.
+
+        :param lat: np.array
+        :param lon: np.array
+        :return: tuple
+            (minhash as np.array of int64, polyline as np.array of shape (n_points, 2))
+        """
+        r_lat, r_lon = resample_by_distance(lat, lon, spacing=self.spacing)
+        rows = np.floor((r_lat + 90.) / self.cell_size).astype(np.uint64)
+        cols = np.floor((r_lon + 180.) / self.cell_size).astype(np.uint64)
+        cells = np.unique(rows * np.uint64(1 << 32) + cols)
+
+        with np.errstate(over="ignore"):
+            hashes = cells[:, None] * self._hash_a[None, :] + self._hash_b[None, :]
+        minhash = (hashes >> np.uint64(1)).min(axis=0).astype(np.int64)
+
+        p_lat, p_lon = resample_by_distance(lat, lon, n_points=self.n_points)
+        polyline = np.column_stack([p_lat, p_lon]).astype(np.float32)
+        return minhash, polyline
+
+    def _get_buckets(self, minhash):
+        """
+        Hash every band of a signature into a bucket.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        bands = np.asarray(minhash, dtype=np.int64).reshape(self.n_bands, -1)
+        return [(i_band, int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(),
+                                        "little", signed=True))
+                for i_band, band in enumerate(bands)]
+
+    def update_track(self, track_hash, minhash, polyline):
+        """
+        Replace the index entries of a track.
+
+        :param track_hash: str
+        :param minhash: np.array
+        :param polyline: np.array
+        :return: None
+        """
+        buckets = [(i_band, i_bucket, track_hash) for i_band, i_bucket in self._get_buckets(minhash)]
+        with self._connect() as con:
+            con.execute("DELETE FROM buckets WHERE track_hash = ?", (track_hash,))
+            con.executemany("INSERT INTO buckets VALUES (?, ?, ?)", buckets)
+            con.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)",
+                        (track_hash,
+                         np.asarray(minhash, dtype=np.int64).tobytes(),
+                         np.asarray(polyline, dtype=np.float32).tobytes()))
+
+    def remove_track(self, track_hash):
+        """
+        Remove a track from the index.
+
+        :param track_hash: str
+        :return: None
+        """
+        with self._connect() as con:
+            con.execute("DELETE FROM buckets WHERE track_hash = ?", (track_hash,))
+            con.execute("DELETE FROM signatures WHERE track_hash = ?", (track_hash,))
+
+    def get_track_signature(self, track_hash):
+        """
+        :param track_hash: str
+        :return: tuple or None
+            (minhash, polyline) of an indexed track
+        """
+        with self._connect() as con:
+            row = con.execute("SELECT minhash, polyline FROM signatures WHERE track_hash = ?",
+                              (track_hash,)).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.int64), np.frombuffer(row[1], dtype=np.float32).reshape(-1, 2)
+
+    def find_similar(self, track_hash=None, minhash=None, polyline=None, min_similarity=0.5,
+                     rerank=False):
+        """
+        Find tracks with a similar route. Either an indexed track hash or a signature
+        from get_signature(...) is the query.
+
+        :param track_hash: str or None
+        :param minhash: np.array or None
+        :param polyline: np.array or None
+            Required for the re-rank if the query is not an indexed track.
+        :param min_similarity: float
+            Minimum estimated Jaccard similarity of the grid cells.
+        :param rerank: bool
+            Sort the result by the discrete Fréchet distance (meter) of the polylines.
+        :return: pd.DataFrame
+            Columns track_hash, similarity (and frechet if rerank is True)
+        """
+        if track_hash is not None:
+            signature = self.get_track_signature(track_hash)
+            if signature is None:
+                raise KeyError(f"Track {track_hash} is not in the route index")
+            minhash, polyline = signature
+
+        buckets = self._get_buckets(minhash)
+        query = " OR ".join(["(band = ? AND bucket = ?)"] * len(buckets))
+        params = [i for i_bucket in buckets for i in i_bucket]
+        with self._connect() as con:
+            candidates = con.execute(f"SELECT DISTINCT s.track_hash, s.minhash, s.polyline FROM buckets b "
+                                     f"JOIN signatures s ON s.track_hash = b.track_hash WHERE {query}",
+                                     params).fetchall()
+
+        results = []
+        for i_track_hash, i_minhash, i_polyline in candidates:
+            if i_track_hash == track_hash:
+                continue
+            similarity = float(np.mean(np.frombuffer(i_minhash, dtype=np.int64) == minhash))
+            if similarity < min_similarity:
+                continue
+            results.append({"track_hash": i_track_hash, "similarity": similarity,
+                            "polyline": np.frombuffer(i_polyline, dtype=np.float32).reshape(-1, 2)})
+
+        if len(results) == 0:
+            columns = ["track_hash", "similarity"] + (["frechet"] if rerank else [])
+            return pd.DataFrame(columns=columns)
+
+        if rerank and polyline is not None:
+            lat0, lon0 = float(polyline[:, 0].mean()), float(polyline[:, 1].mean())
+            q_xy = np.column_stack(to_local_xy(polyline[:, 0], polyline[:, 1], lat0, lon0))
+            for i_result in results:
+                i_xy = np.column_stack(to_local_xy(i_result["polyline"][:, 0], i_result["polyline"][:, 1],
+                                                   lat0, lon0))
+                i_result["frechet"] = discrete_frechet(q_xy, i_xy)
+
+        df = pd.DataFrame(results).drop(columns=["polyline"])
+        if rerank and "frechet" in df.columns:
+            return df.sort_values("frechet").reset_index(drop=True)
+        return df.sort_values("similarity", ascending=False).reset_index(drop=True)
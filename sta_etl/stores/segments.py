@@ -0,0 +1,264 @@
+import os
+import sqlite3
+import contextlib
+import threading
+import numpy as np
+import pandas as pd
+
+from sta_etl.geo_tools import EARTH_RADIUS, step_distances
+from sta_etl.stores.route_index import resample_by_distance
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+def to_xyz(lat, lon):
+    """
+    Cartesian coordinates (meter) of points on the earth sphere. The euclidean distance
+    of two points is the chord, which equals the great-circle distance to far below
+    a millimetre for distances of a few hundred meters.
+
+    :param lat: np.array
+    :param lon: np.array
+    :return: np.array
+        Shape (n, 3)
+    """
+    lat_rad = np.radians(np.asarray(lat, dtype=float))
+    lon_rad = np.radians(np.asarray(lon, dtype=float))
+    return EARTH_RADIUS * np.column_stack([np.cos(lat_rad) * np.cos(lon_rad),
+                                           np.cos(lat_rad) * np.sin(lon_rad),
+                                           np.sin(lat_rad)])
+
+
+def _grid_keys(xyz, cell_size, offset=(0, 0, 0)):
+    """
+    Keys of the 3D grid cells of points.
+
+    .. note::
+        Only for private usage! Stick to the _
+    """
+    cells = np.floor(xyz / cell_size).astype(np.int64) + np.asarray(offset, dtype=np.int64)
+    cells += 1 << 20
+    return (cells[:, 0] << 42) | (cells[:, 1] << 21) | cells[:, 2]
+
+
+def find_pairs(xyz_a, xyz_b, radius, tree_b=None):
+    """
+    All pairs of points of a and b which are closer than radius. With scipy, a KD-tree
+    is used. Without scipy, both point sets are put into a 3D grid with a cell size of
+    radius and only the 27 neighbouring cells are compared (sorted keys and
+    np.searchsorted, no loop over points).
+
+    :param xyz_a: np.array
+        Shape (n, 3), see to_xyz(...)
+    :param xyz_b: np.array
+        Shape (m, 3)
+    :param radius: float
+    :param tree_b: cKDTree or None
+        A prebuilt KD-tree of xyz_b.
+    :return: tuple
+        (index in a, index in b, distance) as np.array
+    """
+    if len(xyz_a) == 0 or len(xyz_b) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    if cKDTree is not None:
+        tree_b = tree_b if tree_b is not None else cKDTree(xyz_b)
+        pairs = cKDTree(xyz_a).sparse_distance_matrix(tree_b, radius, output_type="ndarray")
+        return pairs["i"].astype(np.int64), pairs["j"].astype(np.int64), pairs["v"]
+
+    keys_b = _grid_keys(xyz_b, radius)
+    order_b = np.argsort(keys_b, kind="stable")
+    sorted_b = keys_b[order_b]
+
+    idx_a = []
+    idx_b = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for dz in (-1, 0, 1):
+                keys_a = _grid_keys(xyz_a, radius, offset=(dx, dy, dz))
+                left = np.searchsorted(sorted_b, keys_a, side="left")
+                n_hits = np.searchsorted(sorted_b, keys_a, side="right") - left
+                hit_a = np.repeat(np.arange(len(xyz_a)), n_hits)
+                # Position of every hit within its range of equal keys:
+                pos = np.arange(len(hit_a)) - np.repeat(np.cumsum(n_hits) - n_hits, n_hits)
+                idx_a.append(hit_a)
+                idx_b.append(order_b[np.repeat(left, n_hits) + pos])
+
+    idx_a = np.concatenate(idx_a)
+    idx_b = np.concatenate(idx_b)
+    dist = np.sqrt(((xyz_a[idx_a] - xyz_b[idx_b]) ** 2).sum(axis=1))
+    close = dist <= radius
+    return idx_a[close], idx_b[close], dist[close]
+
+
+class SegmentIndex():
+    """
+    This is SegmentIndex(...) - The search structure over a segment library: The
+    shapes of all segments resampled every 'spacing' meter and a KD-tree (or grid) of
+    all segment start and end points. It is built once and shared by all tracks of a
+    run (see SegmentLibrary.get_index(...)).
+    """
+
+    def __init__(self, segments, spacing=10.):
+        """
+        SegmentIndex constructor.
+
+        :param segments: pd.DataFrame
+            Columns segment_id, name, lat, lon (np.array per segment), length
+        :param spacing: float
+            Resampling distance of the segment shapes in meter.
+        """
+        self.segments = segments.reset_index(drop=True)
+        self.spacing = spacing
+        self.shapes = []
+        for i_seg in self.segments.itertuples():
+            r_lat, r_lon = resample_by_distance(i_seg.lat, i_seg.lon, spacing=spacing)
+            r_lat = np.append(r_lat, i_seg.lat[-1])
+            r_lon = np.append(r_lon, i_seg.lon[-1])
+            self.shapes.append(to_xyz(r_lat, r_lon))
+
+        # Start points are endpoints 0..n-1, end points n..2n-1:
+        n_seg = len(self.segments)
+        if n_seg > 0:
+            self.endpoints = np.concatenate([np.array([i[0] for i in self.shapes]).reshape(-1, 3),
+                                             np.array([i[-1] for i in self.shapes]).reshape(-1, 3)])
+        else:
+            self.endpoints = np.zeros((0, 3))
+        self._tree = cKDTree(self.endpoints) if cKDTree is not None and n_seg > 0 else None
+
+    def find_endpoint_hits(self, xyz, radius):
+        """
+        All track points which are close to a segment start or end point.
+
+        :param xyz: np.array
+            Track points, see to_xyz(...)
+        :param radius: float
+        :return: pd.DataFrame
+            Columns point, segment, is_end, distance
+        """
+        idx_track, idx_ep, dist = find_pairs(xyz, self.endpoints, radius, tree_b=self._tree)
+        n_seg = len(self.segments)
+        return pd.DataFrame({"point": idx_track, "segment": idx_ep % max(n_seg, 1),
+                             "is_end": idx_ep >= n_seg, "distance": dist})
+
+
+class SegmentLibrary():
+    """
+    This is SegmentLibrary(...) - User defined segments (e.g. a climb or a sprint)
+    in a SQLite file in the store directory. Plugin_SegmentEfforts matches every
+    track against all segments of the library.
+
+    :Example:
+        sl = SegmentLibrary(store_path="/data/sta_etl_store")
+        sl.add_segment("kesselberg", lat, lon, name="Kesselberg climb")
+    """
+
+    _index_cache = {}
+    _index_lock = threading.Lock()
+
+    def __init__(self, store_path):
+        """
+        SegmentLibrary constructor. The library file is created if it does not exist.
+
+        :param store_path: str
+            The store directory.
+        """
+        self.store_path = store_path
+        self.library_path = os.path.join(store_path, "segments.sqlite")
+        os.makedirs(store_path, exist_ok=True)
+        with self._connect() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS segments (segment_id TEXT PRIMARY KEY, name TEXT, "
+                        "polyline BLOB, length REAL)")
+            con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            con.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Open a new connection for every operation (threads and processes).
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        con = sqlite3.connect(self.library_path, timeout=60)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            # Commit (or roll back) the operation, then close the connection:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def get_version(self):
+        """
+        :return: int
+            A counter which changes with every change of the library.
+        """
+        with self._connect() as con:
+            return con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def add_segment(self, segment_id, lat, lon, name=None):
+        """
+        Add or replace a segment.
+
+        :param segment_id: str
+        :param lat: np.array
+        :param lon: np.array
+        :param name: str or None
+        :return: None
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        if len(lat) < 2:
+            raise ValueError("A segment needs at least two points")
+        length = float(step_distances(lat, lon).sum())
+        with self._connect() as con:
+            con.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?)",
+                        (segment_id, name, np.column_stack([lat, lon]).tobytes(), length))
+            con.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def remove_segment(self, segment_id):
+        """
+        :param segment_id: str
+        :return: None
+        """
+        with self._connect() as con:
+            con.execute("DELETE FROM segments WHERE segment_id = ?", (segment_id,))
+            con.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def get_segments(self):
+        """
+        :return: pd.DataFrame
+            Columns segment_id, name, lat, lon (np.array per segment), length
+        """
+        with self._connect() as con:
+            rows = con.execute("SELECT segment_id, name, polyline, length FROM segments "
+                               "ORDER BY segment_id").fetchall()
+        segments = []
+        for i_id, i_name, i_polyline, i_length in rows:
+            points = np.frombuffer(i_polyline, dtype=float).reshape(-1, 2)
+            segments.append([i_id, i_name, points[:, 0], points[:, 1], i_length])
+        return pd.DataFrame(segments, columns=["segment_id", "name", "lat", "lon", "length"])
+
+    def get_index(self, spacing=10.):
+        """
+        The SegmentIndex(...) of the library. It is built once per process and library
+        version, so all tracks of a run share it.
+
+        :param spacing: float
+            Resampling distance of the segment shapes in meter.
+        :return: SegmentIndex
+        """
+        key = (os.path.abspath(self.library_path), self.get_version(), spacing)
+        with self._index_lock:
+            index = self._index_cache.get(key)
+            if index is None:
+                index = SegmentIndex(self.get_segments(), spacing=spacing)
+                # Only the newest version of a library is kept:
+                for i_key in [i for i in self._index_cache if i[0] == key[0]]:
+                    del self._index_cache[i_key]
+                self._index_cache[key] = index
+        return index
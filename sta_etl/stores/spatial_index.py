@@ -0,0 +1,195 @@
+import os
+import sqlite3
+import contextlib
+import numpy as np
+import pandas as pd
+
+from sta_etl.geo_tools import haversine, EARTH_RADIUS
+
+
+class SpatialIndex():
+    """
+    This is SpatialIndex(...) - A persistent spatial index across all tracks. The
+    earth is divided into a regular latitude/longitude grid and the index stores
+    for every grid cell which tracks have points in it. The index lives in a SQLite
+    file in the store directory and is updated per track by Plugin_SpatialIndex.
+
+    .. note::
+        Queries return candidate tracks on grid cell resolution: A track is returned if
+        it has at least one point in a grid cell which overlaps the requested region.
+        With the default cell size of 0.01 degree, a cell is about 1.1 km x 0.75 km
+        in central Europe.
+
+    :Example:
+        si = SpatialIndex(store_path="/data/sta_etl_store")
+        si.query_bbox(min_lat=48.1, min_lon=11.5, max_lat=48.2, max_lon=11.6)
+        si.query_radius(lat=48.137, lon=11.575, radius=500)
+    """
+
+    def __init__(self, store_path, cell_size=0.01):
+        """
+        SpatialIndex constructor. The index file is created if it does not exist.
+
+        :param store_path: str
+            The store directory.
+        :param cell_size: float
+            Grid cell size in degree. It must not change for an existing index.
+        """
+        self.store_path = store_path
+        self.index_path = os.path.join(store_path, "spatial_index.sqlite")
+        os.makedirs(store_path, exist_ok=True)
+
+        with self._connect() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            con.execute("CREATE TABLE IF NOT EXISTS cells (row INTEGER, col INTEGER, track_hash TEXT, "
+                        "n_points INTEGER, PRIMARY KEY (row, col, track_hash)) WITHOUT ROWID")
+            con.execute("CREATE INDEX IF NOT EXISTS cells_track ON cells (track_hash)")
+            con.execute("CREATE TABLE IF NOT EXISTS tracks (track_hash TEXT PRIMARY KEY, "
+                        "min_lat REAL, min_lon REAL, max_lat REAL, max_lon REAL, n_points INTEGER)")
+            row = con.execute("SELECT value FROM meta WHERE key = 'cell_size'").fetchone()
+            if row is None:
+                con.execute("INSERT INTO meta VALUES ('cell_size', ?)", (repr(cell_size),))
+                self.cell_size = cell_size
+            else:
+                self.cell_size = float(row[0])
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Open a new connection. Every operation uses its own connection, so the index
+        can be used from several threads and processes.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        con = sqlite3.connect(self.index_path, timeout=60)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            # Commit (or roll back) the operation, then close the connection:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def get_cells(self, lat, lon):
+        """
+        Bin points into grid cells.
+
+        :param lat: np.array
+        :param lon: np.array
+        :return: pd.DataFrame
+            One row per grid cell with the columns row, col and n_points
+        """
+        rows = np.floor((np.asarray(lat, dtype=float) + 90.) / self.cell_size).astype(np.int64)
+        cols = np.floor((np.asarray(lon, dtype=float) + 180.) / self.cell_size).astype(np.int64)
+        n_cols = int(np.ceil(360. / self.cell_size)) + 1
+        cell_ids, n_points = np.unique(rows * n_cols + cols, return_counts=True)
+        return pd.DataFrame({"row": cell_ids // n_cols,
+                             "col": cell_ids % n_cols,
+                             "n_points": n_points})
+
+    def update_track(self, track_hash, cells, bbox):
+        """
+        Replace the index entries of a track.
+
+        :param track_hash: str
+        :param cells: pd.DataFrame
+            The grid cells of the track from get_cells(...)
+        :param bbox: tuple
+            (min_lat, min_lon, max_lat, max_lon, n_points) of the track
+        :return: None
+        """
+        records = list(zip(cells["row"].astype(int).tolist(),
+                           cells["col"].astype(int).tolist(),
+                           [track_hash] * len(cells),
+                           cells["n_points"].astype(int).tolist()))
+        with self._connect() as con:
+            con.execute("DELETE FROM cells WHERE track_hash = ?", (track_hash,))
+            con.executemany("INSERT INTO cells VALUES (?, ?, ?, ?)", records)
+            con.execute("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?)",
+                        (track_hash,) + tuple(float(i) for i in bbox[:4]) + (int(bbox[4]),))
+
+    def remove_track(self, track_hash):
+        """
+        Remove a track from the index.
+
+        :param track_hash: str
+        :return: None
+        """
+        with self._connect() as con:
+            con.execute("DELETE FROM cells WHERE track_hash = ?", (track_hash,))
+            con.execute("DELETE FROM tracks WHERE track_hash = ?", (track_hash,))
+
+    def _cell_range(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Grid rows and columns which overlap a bounding box.
+
+        .. note::
+            Only for private usage! Stick to the _
+        """
+        row0 = int(np.floor((min_lat + 90.) / self.cell_size))
+        row1 = int(np.floor((max_lat + 90.) / self.cell_size))
+        col0 = int(np.floor((min_lon + 180.) / self.cell_size))
+        col1 = int(np.floor((max_lon + 180.) / self.cell_size))
+        return row0, row1, col0, col1
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Find all tracks which pass through a bounding box.
+
+        :param min_lat: float
+        :param min_lon: float
+        :param max_lat: float
+        :param max_lon: float
+        :return: list
+            A list of track hashes (str)
+        """
+        row0, row1, col0, col1 = self._cell_range(min_lat, min_lon, max_lat, max_lon)
+        with self._connect() as con:
+            result = con.execute("SELECT DISTINCT track_hash FROM cells "
+                                 "WHERE row BETWEEN ? AND ? AND col BETWEEN ? AND ?",
+                                 (row0, row1, col0, col1)).fetchall()
+        return [i[0] for i in result]
+
+    def query_radius(self, lat, lon, radius):
+        """
+        Find all tracks which pass within a radius around a point.
+
+        :param lat: float
+        :param lon: float
+        :param radius: float
+            Radius in meter
+        :return: list
+            A list of track hashes (str)
+        """
+        dlat = np.degrees(radius / EARTH_RADIUS)
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        row0, row1, col0, col1 = self._cell_range(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        with self._connect() as con:
+            result = con.execute("SELECT row, col, track_hash FROM cells "
+                                 "WHERE row BETWEEN ? AND ? AND col BETWEEN ? AND ?",
+                                 (row0, row1, col0, col1)).fetchall()
+        if len(result) == 0:
+            return []
+
+        df = pd.DataFrame(result, columns=["row", "col", "track_hash"])
+        # Keep a cell if its closest point to the center is within the radius:
+        cell_lat0 = df["row"].to_numpy() * self.cell_size - 90.
+        cell_lon0 = df["col"].to_numpy() * self.cell_size - 180.
+        near_lat = np.clip(lat, cell_lat0, cell_lat0 + self.cell_size)
+        near_lon = np.clip(lon, cell_lon0, cell_lon0 + self.cell_size)
+        mask = haversine(lat, lon, near_lat, near_lon) <= radius
+        return list(pd.unique(df.loc[mask, "track_hash"]))
+
+    def get_track_bbox(self, track_hash):
+        """
+        :param track_hash: str
+        :return: dictionary or None
+            The bounding box and number of points of a track.
+        """
+        with self._connect() as con:
+            row = con.execute("SELECT min_lat, min_lon, max_lat, max_lon, n_points FROM tracks "
+                              "WHERE track_hash = ?", (track_hash,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["min_lat", "min_lon", "max_lat", "max_lon", "n_points"], row))
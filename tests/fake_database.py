@@ -0,0 +1,99 @@
+"""An in-memory database handler with the interface of the sta-core DataBaseHandler."""
+
+
+import copy
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+def make_gps(n_points=500, seed=0, start_time=0.):
+    """
+    A random walk as 'gps' leaf: timestamps in seconds, latitude, longitude, altitude.
+
+    :param n_points: int
+    :param seed: int
+    :param start_time: float
+    :return: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"timestamp": start_time + np.cumsum(rng.uniform(0.5, 2., n_points)),
+                         "latitude": 48. + np.cumsum(rng.normal(2e-5, 1e-5, n_points)),
+                         "longitude": 11. + np.cumsum(rng.normal(2e-5, 1e-5, n_points)),
+                         "altitude": 500. + np.cumsum(rng.normal(0., .5, n_points))})
+
+
+class FakeDataBaseHandler():
+    """
+    This is FakeDataBaseHandler(...) - It keeps the branches and the leaves of the
+    tracks in memory. Every leaf configuration gets a new leaf hash and replaces the
+    leaf with the same name, the data of old leaf hashes is kept.
+    """
+
+    def __init__(self):
+        self.branches = {}
+        self.data = {}
+
+    def add_track(self, track_hash, user_hash="user", gps=None, **branch_info):
+        """
+        Add a branch with a 'gps' leaf.
+
+        :param track_hash: str
+        :param user_hash: str
+        :param gps: pd.DataFrame or None
+            The 'gps' leaf (see make_gps(...) for the default)
+        :return: str
+            The leaf hash of the 'gps' leaf
+        """
+        leaf_hash = uuid.uuid4().hex
+        self.branches[track_hash] = dict(branch_info, track_hash=track_hash, user_hash=user_hash,
+                                         leaf={leaf_hash: {"name": "gps", "leaf_hash": leaf_hash,
+                                                           "status": "processed"}})
+        self.data[leaf_hash] = make_gps() if gps is None else gps
+        return leaf_hash
+
+    def set_gps(self, track_hash, gps):
+        """
+        Replace the data of the 'gps' leaf of a track (same leaf hash).
+
+        :param track_hash: str
+        :param gps: pd.DataFrame
+        :return: None
+        """
+        self.data[self.get_leaf(track_hash, "gps")["leaf_hash"]] = gps
+
+    def get_leaf(self, track_hash, leaf_name):
+        """
+        :param track_hash: str
+        :param leaf_name: str
+        :return: dictionary or None
+            The leaf description of a track
+        """
+        for i_leaf in self.branches[track_hash]["leaf"].values():
+            if i_leaf.get("name") == leaf_name:
+                return copy.deepcopy(i_leaf)
+        return None
+
+    def read_branch(self, key, attribute):
+        return [copy.deepcopy(i) for i in self.branches.values() if i.get(key) == attribute]
+
+    def get_all_leaves_for_track(self, track_hash):
+        if track_hash not in self.branches:
+            return None
+        return copy.deepcopy(self.branches[track_hash]["leaf"])
+
+    def read_leaf(self, directory, leaf_hash, leaf_type):
+        return self.data[leaf_hash].copy()
+
+    def create_leaf_config(self, leaf_name, track_hash, columns, status):
+        return {"name": leaf_name, "leaf_hash": uuid.uuid4().hex, "columns": columns, "status": status}
+
+    def write_leaf(self, track_hash, leaf_config, leaf, leaf_type):
+        leaves = self.branches[track_hash]["leaf"]
+        for i_leaf_hash in [k for k, v in leaves.items() if v.get("name") == leaf_config.get("name")]:
+            del leaves[i_leaf_hash]
+        leaves[leaf_config["leaf_hash"]] = copy.deepcopy(leaf_config)
+        if leaf is not None:
+            self.data[leaf_config["leaf_hash"]] = leaf.copy()
+        return True
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Tests for the AdmissionController of `sta_etl` package."""
+
+
+import threading
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sta_etl.plugin_handler.admission import AdmissionController
+
+
+class TestAdmissionController(unittest.TestCase):
+    """Tests for the memory budget of the AdmissionController."""
+
+    def setUp(self):
+        """Set up a controller which ignores the RSS of the test process."""
+        self.ac = AdmissionController(memory_budget=100, rss_limit=10 ** 15, poll_interval=0.05)
+
+    def test_000_acquire_release(self):
+        """The in-flight bytes and jobs follow acquire(...) and release(...)."""
+        self.ac.acquire(30)
+        self.ac.acquire(50)
+        status = self.ac.get_status()
+        self.assertEqual(status["in_flight_bytes"], 80)
+        self.assertEqual(status["in_flight_jobs"], 2)
+
+        self.ac.release(30)
+        self.ac.release(50)
+        status = self.ac.get_status()
+        self.assertEqual(status["in_flight_bytes"], 0)
+        self.assertEqual(status["in_flight_jobs"], 0)
+
+    def test_001_wait_for_budget(self):
+        """A job which does not fit waits until enough memory is released."""
+        self.ac.acquire(80)
+        admitted = threading.Event()
+
+        def job():
+            with self.ac.admit(40):
+                admitted.set()
+
+        thread = threading.Thread(target=job)
+        thread.start()
+        self.assertFalse(admitted.wait(timeout=0.3))
+
+        self.ac.release(80)
+        self.assertTrue(admitted.wait(timeout=5))
+        thread.join()
+        self.assertEqual(self.ac.get_status()["in_flight_jobs"], 0)
+
+    def test_002_large_job_alone(self):
+        """A job larger than the full budget runs as soon as nothing else is running."""
+        with self.ac.admit(1000):
+            self.assertEqual(self.ac.get_status()["in_flight_bytes"], 1000)
+        self.assertEqual(self.ac.get_status()["in_flight_bytes"], 0)
+
+    def test_003_estimate_job(self):
+        """Leaf sizes come from the database or from observed leaves."""
+        df = pd.DataFrame({"a": np.zeros(1000)})
+        self.ac.observe_leaf("gps", df)
+        size = int(df.memory_usage(deep=True).sum())
+
+        leaves = [{"name": "gps", "leaf_hash": "a"}, {"name": "other", "leaf_hash": "b", "size": 10}]
+        estimate = self.ac.estimate_job("Plugin_Dummy", {"memory_factor": 2.0}, leaves)
+        self.assertEqual(estimate, 2 * (size + 20))
+
+        self.ac.set_plugin_memory_factor("Plugin_Dummy", 1.0)
+        estimate = self.ac.estimate_job("Plugin_Dummy", {"memory_factor": 2.0}, leaves)
+        self.assertEqual(estimate, size + 20)
+
+    def test_004_disk_size_ratio(self):
+        """Sizes on disk from the database are scaled by the learned in-memory ratio."""
+        df = pd.DataFrame({"a": np.zeros(1000)})
+        size = int(df.memory_usage(deep=True).sum())
+        self.assertEqual(self.ac.estimate_leaf_size({"name": "gps", "size": 100}), 200)
+
+        self.ac.observe_leaf("gps", df, disk_size=size // 4)
+        self.assertEqual(self.ac.estimate_leaf_size({"name": "gps", "size": 100}), 400)
+        self.ac.observe_leaf("gps", df, disk_size=size // 2)
+        self.assertEqual(self.ac.estimate_leaf_size({"name": "gps", "size": 100}), 360)
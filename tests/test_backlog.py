@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""Tests for the Backlog of `sta_etl` package."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.plugin_handler.backlog import scan_backlog
+from sta_etl.plugin_handler.journal import RunJournal
+
+from tests.fake_database import FakeDataBaseHandler
+
+
+class TestBacklog(unittest.TestCase):
+    """Tests for the minimal work list of a backlog scan."""
+
+    def setUp(self):
+        """
+        Set up tracks in different states:
+        a: all done, b: nothing done, c: simple_distances done, d: no 'gps' leaf,
+        e: splits stale, f: another user.
+        """
+        self.dbh = FakeDataBaseHandler()
+        for i_track in ["a", "b", "c", "d", "e"]:
+            self.dbh.add_track(i_track)
+        self.dbh.add_track("f", user_hash="other")
+        self.dbh.branches["d"]["leaf"] = {}
+
+        self.pl = PluginLoader()
+        self.pl.set_database_handler(self.dbh)
+        self.pl.set_processor_plugins("SimpleDistance")
+        self.pl.process_branch("c")
+        self.pl.set_processor_plugins("Splits")
+        self.pl.process_branch("a")
+        self.pl.process_branch("e")
+        self.pl.invalidate("splits", ["e"])
+
+    def test_000_get_work(self):
+        """Only the leaves which are not done and needed for the requested leaves are work."""
+        bl = scan_backlog(self.pl, user_hashes=["user"])
+        self.assertEqual(bl.track_hashes, ["a", "b", "c", "d", "e"])
+        self.assertEqual(bl.get_status("e", "splits"), "stale")
+        self.assertEqual(bl.get_status("d", "gps"), "missing")
+
+        work = bl.get_work(self.pl).set_index("track_hash")
+        self.assertEqual(work.index.tolist(), ["b", "c", "d", "e"])
+        self.assertEqual(work["simple_distances"].to_dict(), {"b": True, "c": False, "d": True, "e": False})
+        self.assertTrue(work["splits"].all())
+        self.assertEqual(work["blocked"].to_dict(), {"b": False, "c": False, "d": True, "e": False})
+        self.assertEqual(bl.get_work_tracks(self.pl), ["b", "c", "e"])
+
+        summary = bl.get_summary()
+        self.assertEqual(summary.loc["splits", "processed"], 1)
+        self.assertEqual(summary.loc["splits", "missing"], 3)
+
+    def test_001_work_done(self):
+        """After processing the work tracks only the blocked track is left."""
+        for i_track in scan_backlog(self.pl, user_hashes=["user"]).get_work_tracks(self.pl):
+            self.pl.process_branch(i_track)
+
+        bl = scan_backlog(self.pl, user_hashes=["user", "other"])
+        self.assertEqual(bl.get_work_tracks(self.pl), ["f"])
+        self.assertEqual(bl.get_work(self.pl)["track_hash"].tolist(), ["d", "f"])
+
+    def test_002_stuck_processing(self):
+        """A 'processing' leaf is work unless the journal of the run in progress started it."""
+        for i_leaf in self.dbh.branches["a"]["leaf"].values():
+            if i_leaf["name"] == "splits":
+                i_leaf["status"] = "processing"
+        directory = tempfile.mkdtemp()
+        journal = RunJournal(os.path.join(directory, "journal.jsonl"))
+        try:
+            bl = scan_backlog(self.pl, user_hashes=["user"])
+            self.assertEqual(bl.get_stuck(), [{"track_hash": "a", "leaf_name": "splits"}])
+            self.assertEqual(bl.get_work_tracks(self.pl), ["a", "b", "c", "e"])
+
+            journal.start(track_hash="a", leaf_name="splits")
+            self.assertEqual(bl.get_stuck(journal=journal), [])
+            self.assertEqual(bl.get_work_tracks(self.pl, journal=journal), ["b", "c", "e"])
+
+            # Set back, the stuck leaf and the leaves after it are processed again:
+            for i_unit in bl.get_stuck():
+                self.pl.invalidate(i_unit["leaf_name"], [i_unit["track_hash"]])
+            self.pl.process_branch("a")
+            self.assertEqual(self.dbh.get_leaf("a", "splits")["status"], "processed")
+            self.assertNotIn("a", scan_backlog(self.pl, user_hashes=["user"]).get_work_tracks(self.pl))
+        finally:
+            journal.close()
+            shutil.rmtree(directory)
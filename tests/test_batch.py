@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""Tests for the batch processing of `sta_etl` package."""
+
+
+import unittest
+
+from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.plugin_handler.batch import BatchProgress, iter_track_hashes, process_stream
+
+from tests.fake_database import FakeDataBaseHandler
+
+
+class TestBatch(unittest.TestCase):
+    """Tests for streaming tracks through process_branch(...) and counting points."""
+
+    def setUp(self):
+        """Set up three tracks of two users with 500 'gps' rows each."""
+        self.dbh = FakeDataBaseHandler()
+        self.dbh.add_track("a")
+        self.dbh.add_track("b")
+        self.dbh.add_track("c", user_hash="other")
+        self.pl = PluginLoader()
+        self.pl.set_database_handler(self.dbh)
+        self.pl.set_processor_plugins("Splits")
+
+    def test_000_progress(self):
+        """Points are the 'gps' rows by default, None counts the rows of every input leaf."""
+        branch_rows = {"gps": 500, "simple_distances": 500}
+        progress = BatchProgress()
+        progress.track_done(branch_rows=branch_rows)
+        progress.track_done(error=RuntimeError("failed"))
+        status = progress.get_status()
+        self.assertEqual((status["n_tracks"], status["n_failed"], status["n_points"]), (2, 1, 500))
+
+        progress = BatchProgress(points_leaf=None)
+        progress.track_done(branch_rows=branch_rows)
+        self.assertEqual(progress.get_status()["n_points"], 1000)
+
+    def test_001_process_stream(self):
+        """Every streamed track is processed once, its 'gps' rows are counted once."""
+        track_hashes = list(iter_track_hashes(self.pl, ["user", "other"])) + ["unknown"]
+        self.assertEqual(track_hashes, ["a", "b", "c", "unknown"])
+
+        status = process_stream(self.pl, track_hashes, max_workers=2, window=2)
+        self.assertEqual((status["n_tracks"], status["n_failed"], status["n_points"]), (4, 1, 1500))
+        for i_track in ["a", "b", "c"]:
+            self.assertEqual(self.dbh.get_leaf(i_track, "splits")["status"], "processed")
+
+        # Nothing is read when all leaves are processed:
+        status = process_stream(self.pl, ["a", "b", "c"], max_workers=2)
+        self.assertEqual((status["n_tracks"], status["n_points"]), (3, 0))
+
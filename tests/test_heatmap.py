@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Tests for the HeatmapStore of `sta_etl` package."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from sta_etl.stores.heatmap import HeatmapStore
+
+from tests.fake_database import make_gps
+
+
+class TestHeatmapStore(unittest.TestCase):
+    """Tests for adding, re-adding and removing tracks."""
+
+    def setUp(self):
+        """Set up an empty heatmap and two tracks."""
+        self.directory = tempfile.mkdtemp()
+        self.hm = HeatmapStore(store_path=self.directory, zoom_levels=(8, 14))
+        self.gps_a = make_gps(n_points=2000, seed=0)
+        self.gps_b = make_gps(n_points=300, seed=1)
+
+    def tearDown(self):
+        """Remove the heatmap."""
+        shutil.rmtree(self.directory)
+
+    def _total(self, zoom):
+        tiles = self.hm.get_tiles(zoom)
+        return sum(int(self.hm.get_tile(zoom, x, y).sum()) for x, y in zip(tiles["tile_x"], tiles["tile_y"]))
+
+    def _add(self, track_hash, gps):
+        self.hm.update_track(track_hash, gps["latitude"].to_numpy(), gps["longitude"].to_numpy())
+
+    def test_000_re_add(self):
+        """A track which is added again is not counted twice."""
+        self._add("a", self.gps_a)
+        self._add("a", self.gps_a)
+        self._add("b", self.gps_b)
+        for i_zoom in [8, 14]:
+            self.assertEqual(self._total(i_zoom), 2300)
+
+        # A changed track replaces its old contribution:
+        self._add("a", self.gps_a.iloc[:500])
+        self.assertEqual(self._total(14), 800)
+
+        self.assertTrue(self.hm.remove_track("a"))
+        self.assertFalse(self.hm.remove_track("a"))
+        self.assertEqual(self._total(14), 300)
+
+        # Only complete tiles, no temporary files:
+        tile_files = os.listdir(os.path.join(self.directory, "heatmap", "14"))
+        self.assertTrue(all(i.endswith(".npy") for i in tile_files))
+
+    def test_001_no_wrap_around(self):
+        """Subtracting from tiles with lower counts stops at zero."""
+        self._add("a", self.gps_a)
+        tiles = self.hm.get_tiles(14)
+        for x, y in zip(tiles["tile_x"], tiles["tile_y"]):
+            np.save(os.path.join(self.directory, "heatmap", "14", f"{x}_{y}.npy"),
+                    np.zeros((256, 256), dtype=np.uint32))
+
+        self.hm.remove_track("a")
+        self.assertEqual(self._total(14), 0)
+        self.assertEqual(self._total(8), 0)
+
+    def _crash_update(self, track_hash, gps):
+        """Add a track, the process dies before the staged tiles are moved into place."""
+        with mock.patch.object(HeatmapStore, "_commit_intent", side_effect=RuntimeError("died")):
+            with self.assertRaises(RuntimeError):
+                self._add(track_hash, gps)
+
+    def test_002_replay_ready_intent(self):
+        """An update which died after staging is committed by the next HeatmapStore."""
+        self._add("a", self.gps_a)
+        self._crash_update("a", self.gps_a.iloc[:500])
+        self.assertEqual(self._total(14), 2000)
+
+        self.hm = HeatmapStore(store_path=self.directory, zoom_levels=(8, 14))
+        for i_zoom in [8, 14]:
+            self.assertEqual(self._total(i_zoom), 500)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "heatmap", "intent", "intent.npz")))
+        self.assertTrue(self.hm.remove_track("a"))
+        self.assertEqual(self._total(14), 0)
+
+    def test_003_replay_staging(self):
+        """An update which died while staging is applied again from its contributions."""
+        self._add("a", self.gps_a)
+        self._add("b", self.gps_b)
+        self._crash_update("a", self.gps_a.iloc[:500])
+        intent_path = os.path.join(self.directory, "heatmap", "intent")
+        os.remove(os.path.join(intent_path, "ready"))
+        staged = sorted(i for i in os.listdir(intent_path) if i.endswith(".npy"))
+        os.remove(os.path.join(intent_path, staged[0]))
+
+        self.hm = HeatmapStore(store_path=self.directory, zoom_levels=(8, 14))
+        for i_zoom in [8, 14]:
+            self.assertEqual(self._total(i_zoom), 800)
+        self.assertEqual(os.listdir(intent_path), [])
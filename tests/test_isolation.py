@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""Tests for the PluginWorkerPool of `sta_etl` package."""
+
+
+import os
+import unittest
+from unittest import mock
+
+from sta_etl.plugin_handler import isolation
+from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.plugin_handler.isolation import PluginWorkerPool
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.plugins.plugin_synthetic import (Plugin_Synthetic, register_synthetic_plugins,
+                                              unregister_synthetic_plugins)
+
+from tests.fake_database import FakeDataBaseHandler
+
+
+class _CrashingPlugin(Plugin_Synthetic):
+    """A synthetic plugin which kills its process."""
+
+    def _processer(self):
+        os._exit(1)
+
+
+class TestPluginWorkerPool(unittest.TestCase):
+    """Tests for plugins which run into the timeout or crash their worker."""
+
+    def setUp(self):
+        """Register synthetic plugins and start a worker pool."""
+        register_synthetic_plugins([
+            {"leaf_name": "slow", "cpu_seconds": 30.},
+            {"leaf_name": "after_slow", "plugin_dependencies": ["slow"]},
+            {"leaf_name": "after_crash", "plugin_dependencies": ["crash"]},
+            {"leaf_name": "ok"}])
+        Collector(type("Plugin_Synthetic_crash", (_CrashingPlugin,),
+                       {"_synthetic_config": {"leaf_name": "crash", "plugin_name": "Synthetic_crash"}}))
+
+        self.dbh = FakeDataBaseHandler()
+        self.dbh.add_track("track")
+        # Plugins registered at runtime are only known to forked workers:
+        self.pool = PluginWorkerPool(n_workers=1, timeout=1., start_method="fork")
+        self.pl = PluginLoader()
+        self.pl.set_database_handler(self.dbh)
+        self.pl.set_worker_pool(self.pool)
+
+    def tearDown(self):
+        """Stop the workers and remove the synthetic plugins."""
+        self.pool.close()
+        unregister_synthetic_plugins()
+
+    def test_000_timeout(self):
+        """A plugin beyond the timeout fails, its dependents are skipped."""
+        self.pl.set_processor_plugins("Synthetic_slow,Synthetic_after_slow,Synthetic_ok")
+        self.pl.process_branch("track")
+
+        self.assertEqual(self.dbh.get_leaf("track", "slow")["status"], "failed")
+        self.assertIsNone(self.dbh.get_leaf("track", "after_slow"))
+        # The worker is replaced and the next plugin runs:
+        self.assertEqual(self.dbh.get_leaf("track", "ok")["status"], "processed")
+
+    def test_001_crash(self):
+        """A plugin which kills its worker fails, its dependents are skipped."""
+        self.pl.set_processor_plugins("Synthetic_crash,Synthetic_after_crash,Synthetic_ok")
+        self.pl.process_branch("track")
+
+        self.assertEqual(self.dbh.get_leaf("track", "crash")["status"], "failed")
+        self.assertIsNone(self.dbh.get_leaf("track", "after_crash"))
+        self.assertEqual(self.dbh.get_leaf("track", "ok")["status"], "processed")
+
+    def test_002_shared_leaves_after_worker(self):
+        """The shared files of a job are created once it has its worker."""
+        idle_workers = []
+
+        def _shared_leaves(*args, **kwargs):
+            idle_workers.append(self.pool._idle.qsize())
+            return shared_leaves(*args, **kwargs)
+
+        shared_leaves = isolation.SharedLeaves
+        self.pool.shared_leaves = True
+        self.pl.set_processor_plugins("Synthetic_ok")
+        with mock.patch.object(isolation, "SharedLeaves", side_effect=_shared_leaves):
+            self.pl.process_branch("track")
+        self.assertEqual(idle_workers, [0])
+        self.assertEqual(self.dbh.get_leaf("track", "ok")["status"], "processed")
+
+    def test_003_max_attempts(self):
+        """A plugin which failed max_attempts times is not run again until it is invalidated."""
+        self.pl.set_max_attempts(2)
+        self.pl.set_processor_plugins("Synthetic_crash")
+        for i_attempts in [1, 2, 2]:
+            self.pl.process_branch("track")
+            self.assertEqual(self.dbh.get_leaf("track", "crash")["status"], "failed")
+            self.assertEqual(self.dbh.get_leaf("track", "crash")["leaf_attempts"], i_attempts)
+
+        self.pl.invalidate("crash", ["track"])
+        self.pl.process_branch("track")
+        self.assertEqual(self.dbh.get_leaf("track", "crash")["leaf_attempts"], 1)
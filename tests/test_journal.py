@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""Tests for the RunJournal of `sta_etl` package."""
+
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.plugin_handler.journal import RunJournal
+from sta_etl.plugins.plugin_synthetic import register_synthetic_plugins, unregister_synthetic_plugins
+
+from tests.fake_database import FakeDataBaseHandler
+
+
+class TestRunJournal(unittest.TestCase):
+    """Tests for replaying a journal and recovering a died run."""
+
+    def setUp(self):
+        """Set up a directory for the journal file."""
+        self.directory = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.directory, "run.jsonl")
+
+    def tearDown(self):
+        """Remove the journal file."""
+        shutil.rmtree(self.directory)
+
+    def test_000_replay(self):
+        """A new journal on the same file knows the state of every unit."""
+        journal = RunJournal(self.journal_path)
+        journal.plan("a", ["simple_distances", "splits"])
+        journal.plan("b", ["simple_distances"])
+        journal.start("a", "simple_distances", leaf_hash="h1")
+        journal.finish("a", "simple_distances", status="processed", leaf_hash="h1")
+        journal.start("a", "splits", leaf_hash="h2")
+        journal.close()
+        # The process died while writing the last line:
+        with open(self.journal_path, "a") as f:
+            f.write('{"event": "finished", "track_ha')
+
+        journal = RunJournal(self.journal_path)
+        self.assertTrue(journal.has_plan())
+        self.assertTrue(journal.is_completed("a", "simple_distances"))
+        self.assertFalse(journal.is_completed("a", "splits"))
+        self.assertEqual(journal.get_unfinished(),
+                         [{"track_hash": "a", "leaf_name": "splits", "leaf_hash": "h2"}])
+        self.assertEqual(journal.get_pending_tracks(), ["a", "b"])
+        journal.close()
+
+    def test_001_recover_journal(self):
+        """Units which started but never finished are set back to 'retry' and processed again."""
+        dbh = FakeDataBaseHandler()
+        dbh.add_track("a")
+        leaf_config = dbh.create_leaf_config("simple_distances", "a", ["None"], "processing")
+        dbh.write_leaf("a", leaf_config, None, "ConfigWrite")
+
+        journal = RunJournal(self.journal_path)
+        journal.plan("a", ["simple_distances"])
+        journal.start("a", "simple_distances", leaf_hash=leaf_config["leaf_hash"])
+        journal.close()
+
+        journal = RunJournal(self.journal_path)
+        pl = PluginLoader()
+        pl.set_database_handler(dbh)
+        pl.set_journal(journal)
+        pl.set_processor_plugins("SimpleDistance")
+
+        unfinished = pl.recover_journal()
+        self.assertEqual([i["leaf_name"] for i in unfinished], ["simple_distances"])
+        self.assertEqual(dbh.get_leaf("a", "simple_distances")["status"], "retry")
+        self.assertEqual(journal.get_unfinished(), [])
+        self.assertEqual(journal.get_pending_tracks(), ["a"])
+
+        pl.process_branch("a")
+        self.assertEqual(dbh.get_leaf("a", "simple_distances")["status"], "processed")
+        self.assertTrue(journal.is_completed("a", "simple_distances"))
+        self.assertEqual(journal.get_pending_tracks(), [])
+        journal.close()
+
+    def test_002_skipped_units(self):
+        """Skipped units and failed units are completed, so the plan has no pending track."""
+        register_synthetic_plugins([{"leaf_name": "broken", "failure_probability": 1., "failure_mode": "error"},
+                                    {"leaf_name": "after_broken", "plugin_dependencies": ["broken"]}])
+        try:
+            dbh = FakeDataBaseHandler()
+            dbh.add_track("a")
+            dbh.add_track("b")
+            journal = RunJournal(self.journal_path)
+            pl = PluginLoader()
+            pl.set_database_handler(dbh)
+            pl.set_journal(journal)
+            pl.set_processor_plugins("SimpleDistance")
+            pl.process_branch("b")
+
+            journal.new_plan(request={"plugins": "all"})
+            leaf_names = ["simple_distances", "broken", "after_broken"]
+            for i_track in ["a", "b"]:
+                journal.plan(i_track, leaf_names)
+            pl.set_processor_plugins("SimpleDistance,Synthetic_broken,Synthetic_after_broken")
+            for i_track in journal.get_pending_tracks():
+                pl.process_branch(i_track)
+            self.assertEqual(dbh.get_leaf("a", "broken")["status"], "failed")
+            self.assertIsNone(dbh.get_leaf("a", "after_broken"))
+            journal.close()
+
+            journal = RunJournal(self.journal_path)
+            self.assertEqual(journal.get_request(), {"plugins": "all"})
+            self.assertEqual(journal.get_pending_tracks(), [])
+            for i_track in ["a", "b"]:
+                for i_leaf in leaf_names:
+                    self.assertTrue(journal.is_completed(i_track, i_leaf))
+            journal.close()
+        finally:
+            unregister_synthetic_plugins()
+
+    def test_003_leaf_hash(self):
+        """A unit starts and finishes with the leaf hash which ends up in the database."""
+        dbh = FakeDataBaseHandler()
+        dbh.add_track("a")
+        journal = RunJournal(self.journal_path)
+        pl = PluginLoader()
+        pl.set_database_handler(dbh)
+        pl.set_journal(journal)
+        pl.set_processor_plugins("SimpleDistance")
+        pl.process_branch("a")
+        journal.close()
+
+        with open(self.journal_path) as f:
+            events = [json.loads(i) for i in f]
+        leaf_hashes = {i["event"]: i["leaf_hash"] for i in events}
+        self.assertEqual(leaf_hashes["started"], leaf_hashes["finished"])
+        self.assertEqual(leaf_hashes["finished"], dbh.get_leaf("a", "simple_distances")["leaf_hash"])
+
+    def test_004_new_plan(self):
+        """A new plan forgets the units of the plan before."""
+        journal = RunJournal(self.journal_path)
+        journal.new_plan(request={"track_hash": "a"})
+        journal.plan("a", ["simple_distances"])
+        journal.finish("a", "simple_distances", status="processed")
+        journal.new_plan(request={"track_hash": "b"})
+        journal.plan("b", ["simple_distances"])
+        journal.close()
+
+        journal = RunJournal(self.journal_path)
+        self.assertEqual(journal.get_request(), {"track_hash": "b"})
+        self.assertFalse(journal.is_completed("a", "simple_distances"))
+        self.assertEqual(journal.get_pending_tracks(), ["b"])
+        journal.close()
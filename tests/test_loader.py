@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""Tests for the PluginLoader of `sta_etl` package."""
+
+
+import io
+import threading
+import unittest
+import contextlib
+
+import pandas as pd
+
+from sta_etl.plugin_handler.loader import PluginLoader
+
+from tests.fake_database import FakeDataBaseHandler, make_gps
+
+
+class TestInvalidate(unittest.TestCase):
+    """Tests for the dependency index and PluginLoader.invalidate(...)."""
+
+    def setUp(self):
+        """Process a track with plugins on and beside simple_distances."""
+        self.dbh = FakeDataBaseHandler()
+        self.dbh.add_track("track")
+        self.pl = PluginLoader()
+        self.pl.set_database_handler(self.dbh)
+        self.pl.set_processor_plugins("Splits,BestEfforts,Dev1")
+        self.pl.process_branch("track")
+
+    def _status(self, leaf_name):
+        return self.dbh.get_leaf("track", leaf_name)["status"]
+
+    def test_000_dependency_index(self):
+        """Downstream leaves come after the leaves they depend on, upstream leaves include 'gps'."""
+        downstream = self.pl.get_downstream_leaves("simple_distances")
+        for i_leaf in ["splits", "best_efforts", "moving_time", "sketches", "climbs"]:
+            self.assertIn(i_leaf, downstream)
+        self.assertNotIn("devel1", downstream)
+        self.assertNotIn("simple_distances", downstream)
+
+        downstream = self.pl.get_downstream_leaves("gps")
+        self.assertLess(downstream.index("devel1"), downstream.index("devel2"))
+        self.assertLess(downstream.index("simple_distances"), downstream.index("splits"))
+
+        self.assertEqual(self.pl.get_upstream_leaves("splits"), ["gps", "simple_distances"])
+        self.assertEqual(self.pl.get_upstream_leaves("devel2"), ["devel1", "gps"])
+
+    def test_001_invalidate(self):
+        """Only the existing leaves downstream of the invalidated leaf become 'stale'."""
+        invalidated = self.pl.invalidate("simple_distances", ["track", "unknown"])
+        self.assertEqual(list(invalidated), ["track"])
+        self.assertEqual(sorted(invalidated["track"]), ["best_efforts", "simple_distances", "splits"])
+        for i_leaf in invalidated["track"]:
+            self.assertEqual(self._status(i_leaf), "stale")
+            self.assertIsNone(self.pl.read_leaf("track", i_leaf))
+        self.assertEqual(self._status("devel1"), "processed")
+
+        # A second call finds nothing new:
+        self.assertEqual(self.pl.invalidate("simple_distances", ["track"]), {"track": []})
+
+    def test_002_recompute(self):
+        """The next run recomputes exactly the stale leaves of the requested plugins."""
+        devel1_hash = self.dbh.get_leaf("track", "devel1")["leaf_hash"]
+        self.pl.invalidate("gps", ["track"])
+
+        self.pl.set_processor_plugins("Splits")
+        self.pl.process_branch("track")
+        self.assertEqual(self._status("simple_distances"), "processed")
+        self.assertEqual(self._status("splits"), "processed")
+        self.assertEqual(self._status("best_efforts"), "stale")
+        self.assertEqual(self._status("devel1"), "stale")
+        self.assertEqual(self.dbh.get_leaf("track", "devel1")["leaf_hash"], devel1_hash)
+
+
+class TestAppend(unittest.TestCase):
+    """Tests for incremental plugins in append mode."""
+
+    def setUp(self):
+        """Set up a track whose 'gps' leaf grows after the first run."""
+        self.gps = make_gps(n_points=600)
+        self.gps["timestamp"] = pd.to_datetime(self.gps["timestamp"], unit="s", utc=True)
+        self.dbh = FakeDataBaseHandler()
+        self.dbh.add_track("track", gps=self.gps.iloc[:400].copy())
+        self.pl = PluginLoader()
+        self.pl.set_database_handler(self.dbh)
+        self.pl.set_processor_plugins("SimpleDistance")
+        self.pl.process_branch("track")
+
+    def _recompute(self):
+        dbh = FakeDataBaseHandler()
+        dbh.add_track("track", gps=self.gps.copy())
+        pl = PluginLoader()
+        pl.set_database_handler(dbh)
+        pl.set_processor_plugins("SimpleDistance")
+        pl.process_branch("track")
+        return pl.read_leaf("track", "simple_distances")
+
+    def test_000_append(self):
+        """Appending the new rows gives the same leaf as a full recompute."""
+        self.dbh.set_gps("track", self.gps.copy())
+        self.pl.invalidate("gps", ["track"])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.pl.process_branch("track")
+        self.assertIn("Append 200 rows to leaf simple_distances", output.getvalue())
+
+        leaf = self.dbh.get_leaf("track", "simple_distances")
+        self.assertEqual(leaf["leaf_incremental"]["inputs"]["gps"]["rows"], 600)
+        pd.testing.assert_frame_equal(self.pl.read_leaf("track", "simple_distances"), self._recompute())
+
+    def test_001_changed_rows(self):
+        """A change of the last old rows is processed from the first row."""
+        self.gps.loc[390, "latitude"] += 1e-3
+        self.dbh.set_gps("track", self.gps.copy())
+        self.pl.invalidate("gps", ["track"])
+        self.pl.process_branch("track")
+        pd.testing.assert_frame_equal(self.pl.read_leaf("track", "simple_distances"), self._recompute())
+
+    def test_002_new_leaf_hash(self):
+        """A new 'gps' leaf is appended to without invalidate(...), also below other leaves."""
+        self.pl.set_processor_plugins("Splits")
+        self.pl.process_branch("track")
+        splits_hash = self.dbh.get_leaf("track", "splits")["leaf_hash"]
+        gps_config = self.dbh.create_leaf_config("gps", "track", ["None"], "processed")
+        self.dbh.write_leaf("track", gps_config, self.gps.copy(), "DataFrame")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.pl.process_branch("track")
+        self.assertIn("Append 200 rows to leaf simple_distances", output.getvalue())
+
+        leaf = self.dbh.get_leaf("track", "simple_distances")
+        self.assertEqual(leaf["leaf_incremental"]["inputs"]["gps"]["leaf_hash"], gps_config["leaf_hash"])
+        self.assertEqual(self.dbh.get_leaf("track", "splits")["status"], "processed")
+        self.assertNotEqual(self.dbh.get_leaf("track", "splits")["leaf_hash"], splits_hash)
+        pd.testing.assert_frame_equal(self.pl.read_leaf("track", "simple_distances"), self._recompute())
+
+    def test_003_old_leaf_missing(self):
+        """An old leaf which can not be read is processed from the first row."""
+        self.dbh.set_gps("track", self.gps.copy())
+        self.pl.invalidate("gps", ["track"])
+        del self.dbh.data[self.dbh.get_leaf("track", "simple_distances")["leaf_hash"]]
+        self.pl.process_branch("track")
+        pd.testing.assert_frame_equal(self.pl.read_leaf("track", "simple_distances"), self._recompute())
+
+
+class TestEphemeral(unittest.TestCase):
+    """Tests for ephemeral leaves."""
+
+    def test_000_ephemeral_dependency(self):
+        """An ephemeral dependency is handed over in memory and never written."""
+        dbh = FakeDataBaseHandler()
+        dbh.add_track("track")
+        pl = PluginLoader()
+        pl.set_database_handler(dbh)
+        pl.set_ephemeral_leaves("simple_distances")
+        pl.set_processor_plugins("SimpleProjection")
+        pl.process_branch("track")
+
+        self.assertEqual(dbh.get_leaf("track", "simple_projection")["status"], "processed")
+        self.assertIsNone(dbh.get_leaf("track", "simple_distances"))
+        self.assertGreater(pl.read_leaf("track", "simple_projection")["tot_dist_geodasic"].iloc[0], 0.)
+
+
+class TestReadLeaves(unittest.TestCase):
+    """Tests for reading the leaf of many tracks."""
+
+    def setUp(self):
+        """Process simple_distances for 7 of 10 tracks."""
+        self.dbh = FakeDataBaseHandler()
+        self.pl = PluginLoader()
+        self.pl.set_database_handler(self.dbh)
+        self.pl.set_processor_plugins("SimpleDistance")
+        self.track_hashes = [f"track_{i}" for i in range(10)]
+        for i_num, i_track_hash in enumerate(self.track_hashes):
+            self.dbh.add_track(i_track_hash, gps=make_gps(n_points=100 + 10 * i_num, seed=i_num))
+            if i_num % 3 != 1:
+                self.pl.process_branch(i_track_hash)
+
+    def test_000_read_leaves(self):
+        """read_leaves(...) equals read_leaf(...) per track, the leaf descriptions are looked up once."""
+        track_hashes = self.track_hashes + ["unknown"]
+        expected = pd.concat([self.pl.read_leaf(i, "simple_distances").assign(track_hash=i)
+                              for i in track_hashes if self.pl.read_leaf(i, "simple_distances") is not None],
+                             ignore_index=True)
+
+        lookups = []
+        get_all_leaves_for_track = self.dbh.get_all_leaves_for_track
+
+        def _get_all_leaves_for_track(track_hash):
+            lookups.append((track_hash, threading.current_thread() is threading.main_thread()))
+            return get_all_leaves_for_track(track_hash=track_hash)
+
+        self.dbh.get_all_leaves_for_track = _get_all_leaves_for_track
+        df = self.pl.read_leaves(track_hashes, "simple_distances", max_workers=4)
+        pd.testing.assert_frame_equal(df, expected)
+        self.assertEqual(lookups, [(i, True) for i in track_hashes])
+
+        columns = ["dist_geodasic", "track_hash"]
+        batches = list(self.pl.iter_leaves(track_hashes, "simple_distances", columns=["dist_geodasic"], batch_size=3))
+        self.assertEqual(len(batches), 4)
+        pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True)[columns], expected[columns])
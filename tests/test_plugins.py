@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+
+"""Tests for the processor plugins of `sta_etl` package."""
+
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sta_etl.geo_tools import to_local_xy
+from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.stores.segments import SegmentLibrary
+
+from tests.fake_database import FakeDataBaseHandler, make_gps
+
+
+def _process(plugins, n_points=3000, seed=0, gps=None, store_path=None):
+    """
+    Process a random walk track (or the given 'gps' leaf) with the given plugins.
+    Plugins which need the store directory get store_path.
+
+    :return: PluginLoader
+    """
+    dbh = FakeDataBaseHandler()
+    dbh.add_track("track", gps=make_gps(n_points=n_points, seed=seed) if gps is None else gps)
+    pl = PluginLoader()
+    pl.set_database_handler(dbh)
+    if store_path is not None:
+        pl.set_store_path(store_path)
+    pl.set_processor_plugins(plugins)
+    pl.process_branch("track")
+    return pl
+
+
+class TestPlugin_Splits(unittest.TestCase):
+    """Tests for Plugin_Splits."""
+
+    def setUp(self):
+        """Process a track of several kilometres."""
+        self.pl = _process("Splits")
+        self.distances = self.pl.read_leaf("track", "simple_distances")
+        self.splits = self.pl.read_leaf("track", "splits")
+
+    def test_000_splits_sum_to_the_track(self):
+        """The splits of every unit add up to the distance and duration of the track."""
+        total_distance = self.distances["dist_geodasic_sum"].iloc[-1]
+        total_duration = self.distances["duration_sum"].iloc[-1]
+        self.assertGreater(total_distance, 3000.)
+
+        for unit, unit_length in [("km", 1000.), ("mi", 1609.344)]:
+            i_splits = self.splits[self.splits["unit"] == unit]
+            self.assertAlmostEqual(i_splits["split_distance"].sum(), total_distance, places=6)
+            self.assertAlmostEqual(i_splits["split_duration"].sum(), total_duration, places=6)
+            self.assertAlmostEqual(i_splits["elapsed_duration"].iloc[-1], total_duration, places=6)
+            # Only the last split is shorter:
+            self.assertTrue(np.allclose(i_splits["split_distance"].iloc[:-1], unit_length))
+            self.assertEqual(i_splits["split"].tolist(), list(range(1, len(i_splits) + 1)))
+
+
+class TestPlugin_BestEfforts(unittest.TestCase):
+    """Tests for Plugin_BestEfforts."""
+
+    def setUp(self):
+        """Process a track of about 2 km and 1000 s."""
+        self.pl = _process("BestEfforts", n_points=800)
+        distances = self.pl.read_leaf("track", "simple_distances")
+        self.dist = distances["dist_geodasic_sum"].to_numpy()
+        self.duration = distances["duration_sum"].to_numpy()
+        self.best_efforts = self.pl.read_leaf("track", "best_efforts").set_index(["kind", "target"])
+
+    def test_000_distance_targets(self):
+        """The fastest effort is within one GPS step of the brute force over all pairs of points."""
+        self.assertEqual(self.best_efforts.loc["distance"].index.tolist(), [1000.])
+
+        d_dist = self.dist[None, :] - self.dist[:, None]
+        d_duration = self.duration[None, :] - self.duration[:, None]
+        brute = d_duration[d_dist >= 1000.].min()
+        best = self.best_efforts.loc[("distance", 1000.), "best_duration"]
+        self.assertLessEqual(best, brute + 1e-9)
+        self.assertGreaterEqual(best, brute - np.diff(self.duration).max() - 1e-9)
+
+    def test_001_duration_targets(self):
+        """The longest distance is within one GPS step of the brute force over all pairs of points."""
+        self.assertEqual(self.best_efforts.loc["duration"].index.tolist(), [300.])
+
+        d_dist = self.dist[None, :] - self.dist[:, None]
+        d_duration = self.duration[None, :] - self.duration[:, None]
+        brute = d_dist[(d_duration >= 0) & (d_duration <= 300.)].max()
+        best = self.best_efforts.loc[("duration", 300.), "best_distance"]
+        self.assertGreaterEqual(best, brute - 1e-9)
+        self.assertLessEqual(best, brute + np.diff(self.dist).max() + 1e-9)
+
+
+class TestPlugin_ResampledTrack(unittest.TestCase):
+    """Tests for Plugin_ResampledTrack."""
+
+    def setUp(self):
+        """Set up a track with a pause of 100 s after 300 points."""
+        self.gps = make_gps(n_points=600)
+        self.gps.loc[300:, "timestamp"] += 100.
+
+    def test_000_segments(self):
+        """The grid is uniform within a segment and starts again at the first point after a pause."""
+        resampled = _process("ResampledTrack", gps=self.gps).read_leaf("track", "gps_resampled")
+        t = self.gps["timestamp"].to_numpy()
+        self.assertEqual(sorted(resampled["segment"].unique()), [0, 1])
+
+        for i_segment, i_gps in [(0, self.gps.iloc[:300]), (1, self.gps.iloc[300:])]:
+            i_resampled = resampled[resampled["segment"] == i_segment]
+            i_t = i_resampled["timestamp"].to_numpy()
+            self.assertEqual(i_t[0], i_gps["timestamp"].iloc[0])
+            self.assertTrue(np.allclose(np.diff(i_t), 1.))
+            self.assertLessEqual(i_t[-1], i_gps["timestamp"].iloc[-1])
+            for i_column in ["latitude", "longitude", "altitude"]:
+                expected = np.interp(i_t, i_gps["timestamp"], i_gps[i_column])
+                self.assertTrue(np.allclose(i_resampled[i_column], expected))
+
+        # No grid point inside the pause:
+        in_pause = (resampled["timestamp"] > t[299]) & (resampled["timestamp"] < t[300])
+        self.assertFalse(in_pause.any())
+
+    def test_001_timezone(self):
+        """Timezone aware timestamps keep their timezone."""
+        gps = self.gps.copy()
+        gps["timestamp"] = pd.to_datetime(gps["timestamp"], unit="s", utc=True).dt.tz_convert("Europe/Berlin")
+        resampled = _process("ResampledTrack", gps=gps).read_leaf("track", "gps_resampled")
+        self.assertEqual(str(resampled["timestamp"].dt.tz), "Europe/Berlin")
+        self.assertEqual(resampled["timestamp"].iloc[0], gps["timestamp"].iloc[0])
+        self.assertEqual(resampled["segment"].iloc[-1], 1)
+
+
+class TestPlugin_SimplifiedTrack(unittest.TestCase):
+    """Tests for Plugin_SimplifiedTrack."""
+
+    def setUp(self):
+        """Set up a straight track with 1 m jitter and a 30 m detour."""
+        rng = np.random.default_rng(0)
+        self.gps = make_gps(n_points=1000)
+        self.gps["latitude"] = 48. + 1e-5 * np.arange(1000)
+        self.gps["longitude"] = 11. + rng.uniform(-1.3e-5, 1.3e-5, 1000)
+        self.gps.loc[400:420, "longitude"] += 4e-4
+        self.simplified = _process("SimplifiedTrack", gps=self.gps).read_leaf("track", "gps_simplified")
+
+    def test_000_tolerance(self):
+        """The endpoints and the detour are kept, every removed point is within the tolerance."""
+        kept = self.simplified["point_index"].to_numpy()
+        self.assertEqual(kept[0], 0)
+        self.assertEqual(kept[-1], 999)
+        self.assertGreaterEqual(((kept >= 400) & (kept <= 420)).sum(), 2)
+        self.assertLess(len(kept), 20)
+        self.assertEqual(self.simplified.attrs["n_points_out"], len(kept))
+        pd.testing.assert_frame_equal(self.simplified.drop(columns="point_index"),
+                                      self.gps.iloc[kept].reset_index(drop=True))
+
+        # Distance of every point to the line between the kept points before and after it:
+        x, y = to_local_xy(self.gps["latitude"], self.gps["longitude"])
+        i_before = kept[np.searchsorted(kept, np.arange(1000), side="right") - 1]
+        i_after = kept[np.minimum(np.searchsorted(kept, np.arange(1000)), len(kept) - 1)]
+        sx, sy = x[i_after] - x[i_before], y[i_after] - y[i_before]
+        px, py = x - x[i_before], y - y[i_before]
+        t = np.clip((px * sx + py * sy) / np.maximum(sx * sx + sy * sy, 1e-12), 0., 1.)
+        self.assertLessEqual(np.hypot(px - t * sx, py - t * sy).max(), 5.)
+
+        # Without the jitter, the straight track is only its endpoints and the detour:
+        self.gps["longitude"] = 11.
+        self.gps.loc[400:420, "longitude"] += 4e-4
+        simplified = _process("SimplifiedTrack", gps=self.gps).read_leaf("track", "gps_simplified")
+        self.assertEqual(simplified["point_index"].tolist(), [0, 399, 400, 420, 421, 999])
+
+
+class TestPlugin_GpsClean(unittest.TestCase):
+    """Tests for Plugin_GpsClean."""
+
+    def test_000_speed_spike(self):
+        """A point 1 km off the track is removed, all other points are kept."""
+        gps = make_gps(n_points=1000)
+        gps.loc[500, "latitude"] += 0.01
+        clean = _process("GpsClean", gps=gps).read_leaf("track", "gps_clean")
+
+        self.assertEqual(clean["gps_index"].tolist(), [i for i in range(1000) if i != 500])
+        self.assertEqual(clean.attrs["n_dropped_speed"], 1)
+        self.assertEqual(clean.attrs["n_points_out"], 999)
+        # The spike does not leak into the rolling median of its neighbours:
+        self.assertLess((clean["latitude"] - gps["latitude"].drop(500).to_numpy()).abs().max(), 1e-4)
+        pd.testing.assert_series_equal(clean["timestamp"], gps["timestamp"].drop(500).reset_index(drop=True))
+
+
+class TestPlugin_MovingTime(unittest.TestCase):
+    """Tests for Plugin_MovingTime."""
+
+    def test_000_pause(self):
+        """A stop of about 75 s is a pause, a stop of 4 points is not."""
+        gps = make_gps(n_points=1000)
+        for i_first, i_last in [(200, 203), (500, 560)]:
+            for i_column in ["latitude", "longitude"]:
+                gps.loc[i_first:i_last, i_column] = gps.loc[i_first - 1, i_column]
+        moving_time = _process("MovingTime", gps=gps).read_leaf("track", "moving_time")
+
+        t = gps["timestamp"].to_numpy()
+        self.assertEqual(moving_time[["start_index", "end_index"]].values.tolist(), [[500, 560]])
+        self.assertAlmostEqual(moving_time["duration"].iloc[0], t[560] - t[499], places=6)
+        self.assertAlmostEqual(moving_time["start_duration"].iloc[0], t[499] - t[0], places=6)
+        self.assertEqual(moving_time.attrs["n_pauses"], 1)
+        self.assertAlmostEqual(moving_time.attrs["total_duration"], t[-1] - t[0], places=6)
+        self.assertAlmostEqual(moving_time.attrs["moving_duration"],
+                               t[-1] - t[0] - (t[560] - t[499]), places=6)
+
+
+class TestPlugin_Climbs(unittest.TestCase):
+    """Tests for Plugin_Climbs."""
+
+    def test_000_sawtooth(self):
+        """Teeth of 4 m are below the threshold, three teeth of 40 m are counted and are climbs."""
+        # 10 m per point: 5 teeth of 4 m and 400 m, then 3 teeth of 40 m and 2000 m (4 % gradient):
+        d = 10. * np.arange(801)
+        small = 4. * (1. - np.abs((d % 400.) / 200. - 1.))
+        big = 40. * (1. - np.abs((d % 2000.) / 1000. - 1.))
+        gps = pd.DataFrame({"timestamp": np.arange(801, dtype=float),
+                            "latitude": 48. + d / 111195.,
+                            "longitude": np.full(801, 11.),
+                            "altitude": 500. + np.where(d < 2000., small, big)})
+        climbs = _process("Climbs", gps=gps).read_leaf("track", "climbs")
+
+        self.assertAlmostEqual(climbs.attrs["raw_gain"], 140., places=6)
+        # The moving average over 100 m takes about 1 m from every peak and valley:
+        for i_total in ["elevation_gain", "elevation_loss"]:
+            self.assertGreater(climbs.attrs[i_total], 110.)
+            self.assertLessEqual(climbs.attrs[i_total], 120.)
+
+        self.assertEqual(climbs.attrs["n_climbs"], 3)
+        self.assertTrue(np.allclose(climbs["start_distance"], [2000., 4000., 6000.], atol=50.))
+        self.assertTrue(np.allclose(climbs["end_distance"], [3000., 5000., 7000.], atol=100.))
+        self.assertTrue(np.allclose(climbs["avg_gradient"], 4., atol=0.2))
+
+
+class TestPlugin_SegmentEfforts(unittest.TestCase):
+    """Tests for Plugin_SegmentEfforts."""
+
+    def setUp(self):
+        """Set up a track and a segment library with a part of the track in both directions."""
+        self.directory = tempfile.mkdtemp()
+        self.gps = make_gps(n_points=3000)
+        lat = self.gps["latitude"].to_numpy()
+        lon = self.gps["longitude"].to_numpy()
+        sl = SegmentLibrary(store_path=self.directory)
+        sl.add_segment("forward", lat[1000:1501], lon[1000:1501], name="Forward")
+        sl.add_segment("reversed", lat[1000:1501][::-1], lon[1000:1501][::-1], name="Reversed")
+
+    def tearDown(self):
+        """Remove the store directory."""
+        shutil.rmtree(self.directory)
+
+    def test_000_efforts(self):
+        """The segment is found once, the segment in the other direction is not."""
+        pl = _process("SegmentEfforts", gps=self.gps, store_path=self.directory)
+        efforts = pl.read_leaf("track", "segment_efforts")
+        self.assertEqual(efforts["segment_id"].tolist(), ["forward"])
+
+        t = self.gps["timestamp"].to_numpy()
+        effort = efforts.iloc[0]
+        self.assertLessEqual(abs(effort["start_index"] - 1000), 10)
+        self.assertLessEqual(abs(effort["end_index"] - 1500), 10)
+        self.assertAlmostEqual(effort["elapsed_time"], t[effort["end_index"]] - t[effort["start_index"]], places=6)
+        self.assertGreaterEqual(effort["coverage"], 0.95)
+        self.assertLess(abs(effort["distance"] - effort["segment_length"]), 0.05 * effort["segment_length"])
+
+        # The track driven backwards only matches the reversed segment:
+        gps = self.gps.copy()
+        for i_column in ["latitude", "longitude"]:
+            gps[i_column] = self.gps[i_column].to_numpy()[::-1]
+        pl = _process("SegmentEfforts", gps=gps, store_path=self.directory)
+        self.assertEqual(pl.read_leaf("track", "segment_efforts")["segment_id"].tolist(), ["reversed"])
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""Tests for the RouteIndex of `sta_etl` package."""
+
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sta_etl.stores.route_index import RouteIndex, discrete_frechet
+
+from tests.fake_database import make_gps
+
+
+def _frechet_brute_force(xy_a, xy_b):
+    """The discrete Fréchet distance with the recursion over every pair of points."""
+    d = np.sqrt(((xy_a[:, None, :] - xy_b[None, :, :]) ** 2).sum(axis=2))
+    ca = np.empty(d.shape)
+    for i in range(d.shape[0]):
+        for j in range(d.shape[1]):
+            before = [ca[i - 1, j]] if i > 0 else []
+            before += [ca[i, j - 1]] if j > 0 else []
+            before += [ca[i - 1, j - 1]] if i > 0 and j > 0 else []
+            ca[i, j] = max(d[i, j], min(before)) if len(before) > 0 else d[i, j]
+    return ca[-1, -1]
+
+
+class TestRouteIndex(unittest.TestCase):
+    """Tests for finding repeated routes."""
+
+    def setUp(self):
+        """Index a route, a shifted copy of it and an unrelated route next to it."""
+        self.directory = tempfile.mkdtemp()
+        self.ri = RouteIndex(store_path=self.directory)
+        route = make_gps(n_points=1500, seed=0)
+        other = make_gps(n_points=1500, seed=5)
+        self._add("route", route["latitude"], route["longitude"])
+        # About 17 m north and 7 m west:
+        self._add("shifted", route["latitude"] + 1.5e-4, route["longitude"] - 1e-4)
+        # Same area, but the other way (south-east instead of north-east):
+        self._add("other", 96.01 - other["latitude"], other["longitude"])
+
+    def tearDown(self):
+        """Remove the index."""
+        shutil.rmtree(self.directory)
+
+    def _add(self, track_hash, lat, lon):
+        self.ri.update_track(track_hash, *self.ri.get_signature(lat.to_numpy(), lon.to_numpy()))
+
+    def test_000_discrete_frechet(self):
+        """The vectorized Fréchet distance equals the recursion over every pair of points."""
+        rng = np.random.default_rng(0)
+        for n, m in [(1, 1), (1, 6), (6, 1), (7, 3), (40, 25)]:
+            xy_a = rng.normal(size=(n, 2)).cumsum(axis=0)
+            xy_b = rng.normal(size=(m, 2)).cumsum(axis=0)
+            self.assertAlmostEqual(discrete_frechet(xy_a, xy_b), _frechet_brute_force(xy_a, xy_b), places=12)
+
+        # A shifted copy has the shift as distance:
+        xy = rng.normal(size=(20, 2)).cumsum(axis=0)
+        self.assertAlmostEqual(discrete_frechet(xy, xy + [3., 4.]), 5., places=12)
+
+    def test_001_find_similar(self):
+        """The shifted copy is found, the unrelated route is not."""
+        similar = self.ri.find_similar(track_hash="route", min_similarity=0.5, rerank=True)
+        self.assertEqual(similar["track_hash"].tolist(), ["shifted"])
+        self.assertLess(similar["frechet"].iloc[0], 25.)
+
+        self.assertEqual(self.ri.find_similar(track_hash="other", min_similarity=0.1)["track_hash"].tolist(), [])
+
+        self.ri.remove_track("shifted")
+        self.assertEqual(len(self.ri.find_similar(track_hash="route", min_similarity=0.5)), 0)
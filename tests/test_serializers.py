@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""Tests for the leaf formats of `sta_etl` package."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sta_etl.plugin_handler import serializers
+
+
+class TestLeafFormats(unittest.TestCase):
+    """Tests for writing and reading leaves in every format and codec."""
+
+    def setUp(self):
+        """Set up a leaf with all column types which have to survive a round trip."""
+        self.directory = tempfile.mkdtemp()
+        timestamps = pd.to_datetime([0., 1.5, None, 3.], unit="s", utc=True).as_unit("us")
+        self.df = pd.DataFrame({"timestamp": timestamps.tz_convert("Europe/Berlin"),
+                                "naive": timestamps.tz_localize(None),
+                                "latitude": [48., np.nan, 48.1, 48.2],
+                                "count": [1, 2, 3, 4],
+                                "moving": [True, False, True, True],
+                                "name": ["a", None, "c", "d"]})
+
+    def tearDown(self):
+        """Remove the leaf files."""
+        shutil.rmtree(self.directory)
+
+    def test_000_round_trip(self):
+        """Every format and codec reads back the leaf it wrote."""
+        for i_format, (_, _, _, i_codecs) in serializers.LEAF_FORMATS.items():
+            for i_codec in i_codecs:
+                with self.subTest(leaf_format=i_format, codec=i_codec):
+                    path = os.path.join(self.directory, f"leaf_{i_format}_{i_codec}")
+                    try:
+                        serializers.write_leaf(self.df, path, i_format, i_codec)
+                    except ImportError as e:
+                        self.skipTest(str(e))
+                    df = serializers.read_leaf(path, i_format, codec=i_codec)
+                    pd.testing.assert_frame_equal(df, self.df)
+
+                    df = serializers.read_leaf(path, i_format, columns=["name", "timestamp"], codec=i_codec)
+                    pd.testing.assert_frame_equal(df, self.df[["name", "timestamp"]])
+
+    def test_001_npz_lossy_columns(self):
+        """Columns which npz can not read back the same are not written."""
+        path = os.path.join(self.directory, "leaf.npz")
+        for i_column in [pd.Series([True, None], dtype=object),
+                         pd.Series([1, None], dtype="Int64"),
+                         pd.Series(["a", "b"], dtype="category")]:
+            with self.subTest(dtype=str(i_column.dtype)):
+                with self.assertRaises(TypeError):
+                    serializers.write_leaf(pd.DataFrame({"column": i_column}), path, "npz")
+                self.assertFalse(os.path.exists(path))
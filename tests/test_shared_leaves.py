@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+"""Tests for the SharedLeaves of `sta_etl` package."""
+
+
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from sta_etl.plugin_handler import isolation
+from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.plugin_handler.isolation import PluginWorkerPool
+from sta_etl.plugin_handler.shared_leaves import SharedLeaves, attach_leaves
+from sta_etl.plugin_handler.etl_collector import Collector
+from sta_etl.plugins.plugin_synthetic import (Plugin_Synthetic, register_synthetic_plugins,
+                                              unregister_synthetic_plugins)
+
+from tests.fake_database import FakeDataBaseHandler, make_gps
+
+
+class _CrashingPlugin(Plugin_Synthetic):
+    """A synthetic plugin which kills its process after it attached the shared leaves."""
+
+    def _processer(self):
+        os._exit(1)
+
+
+class TestSharedLeaves(unittest.TestCase):
+    """Tests for handing over leaves as memory-mapped files."""
+
+    def setUp(self):
+        """Set up a 'gps' like leaf with numeric, datetime and string columns."""
+        gps = make_gps(n_points=1000)
+        gps["time"] = pd.to_datetime(gps["timestamp"], unit="s", utc=True)
+        gps["name"] = [f"p{i % 7}" for i in range(len(gps))]
+        gps.attrs["unit"] = "m"
+        self.gps = gps
+
+    def test_000_round_trip(self):
+        """The attached leaves are equal to the exported leaves."""
+        other = self.gps.iloc[::3]
+        data_dict = {"gps": self.gps, "other": other, "track": {"track_hash": "track"}}
+        with SharedLeaves(data_dict, min_bytes=0) as shared:
+            files = os.listdir(shared.directory)
+            self.assertEqual(len(files), 2 * len(self.gps.select_dtypes("number").columns))
+
+            attached = attach_leaves(shared.descriptors)
+            pd.testing.assert_frame_equal(attached["gps"], self.gps)
+            pd.testing.assert_frame_equal(attached["other"], other)
+            self.assertEqual(attached["gps"].attrs, {"unit": "m"})
+            self.assertEqual(attached["track"], {"track_hash": "track"})
+            # Numeric columns are mapped, not copied:
+            values = attached["gps"]["latitude"].to_numpy()
+            while not isinstance(values, np.memmap) and values.base is not None:
+                values = values.base
+            self.assertIsInstance(values, np.memmap)
+
+        self.assertFalse(os.path.exists(shared.directory))
+
+    def test_001_min_bytes(self):
+        """DataFrames smaller than min_bytes are handed over as they are."""
+        size = int(self.gps.memory_usage(index=False).sum())
+        with SharedLeaves({"gps": self.gps}, min_bytes=size + 1) as shared:
+            self.assertEqual(shared.descriptors["gps"]["type"], "object")
+            self.assertIs(shared.descriptors["gps"]["data"], self.gps)
+            self.assertEqual(os.listdir(shared.directory), [])
+
+        with SharedLeaves({"gps": self.gps}, min_bytes=size) as shared:
+            self.assertEqual(shared.descriptors["gps"]["type"], "DataFrame")
+
+    def test_002_export_error(self):
+        """The files are removed if a leaf can not be exported."""
+        created = []
+
+        def _export(obj, leaf_name, leaf):
+            created.append(obj.directory)
+            raise RuntimeError("export")
+
+        with mock.patch.object(SharedLeaves, "_export", _export):
+            with self.assertRaises(RuntimeError):
+                SharedLeaves({"gps": self.gps}, min_bytes=0)
+        self.assertEqual(len(created), 1)
+        self.assertFalse(os.path.exists(created[0]))
+
+
+class TestSharedLeavesWorkerPool(unittest.TestCase):
+    """Tests for the shared files of plugins which run in a worker subprocess."""
+
+    def setUp(self):
+        """Register synthetic plugins and start a worker pool with shared leaves."""
+        register_synthetic_plugins([{"leaf_name": "ok"}])
+        Collector(type("Plugin_Synthetic_crash", (_CrashingPlugin,),
+                       {"_synthetic_config": {"leaf_name": "crash", "plugin_name": "Synthetic_crash"}}))
+
+        self.dbh = FakeDataBaseHandler()
+        self.dbh.add_track("track")
+        self.pool = PluginWorkerPool(n_workers=1, timeout=10., start_method="fork",
+                                     shared_leaves=True, shared_min_bytes=0)
+        self.pl = PluginLoader()
+        self.pl.set_database_handler(self.dbh)
+        self.pl.set_worker_pool(self.pool)
+
+    def tearDown(self):
+        """Stop the workers and remove the synthetic plugins."""
+        self.pool.close()
+        unregister_synthetic_plugins()
+
+    def _process(self, plugins):
+        """Process the track and return the directories of all SharedLeaves which were created."""
+        directories = []
+
+        def _shared_leaves(*args, **kwargs):
+            shared = shared_leaves(*args, **kwargs)
+            directories.append(shared.directory)
+            return shared
+
+        shared_leaves = isolation.SharedLeaves
+        self.pl.set_processor_plugins(plugins)
+        with mock.patch.object(isolation, "SharedLeaves", side_effect=_shared_leaves):
+            self.pl.process_branch("track")
+        return directories
+
+    def test_000_removed_after_run(self):
+        """The shared files are removed after a plugin run."""
+        directories = self._process("Synthetic_ok")
+        self.assertEqual(self.dbh.get_leaf("track", "ok")["status"], "processed")
+        self.assertEqual(len(directories), 1)
+        self.assertFalse(os.path.exists(directories[0]))
+
+    def test_001_removed_after_crash(self):
+        """The shared files are removed if the plugin kills its worker."""
+        directories = self._process("Synthetic_crash")
+        self.assertEqual(self.dbh.get_leaf("track", "crash")["status"], "failed")
+        self.assertEqual(len(directories), 1)
+        self.assertFalse(os.path.exists(directories[0]))
+
+        # The replaced worker runs the next plugin:
+        directories = self._process("Synthetic_ok")
+        self.assertEqual(self.dbh.get_leaf("track", "ok")["status"], "processed")
+        self.assertFalse(os.path.exists(directories[0]))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""Tests for the sketches of `sta_etl` package."""
+
+
+import unittest
+
+import numpy as np
+
+from sta_etl.sketches import DDSketch, FixedHistogram, sketches_to_frame, merge_sketch_frames
+
+
+class TestDDSketch(unittest.TestCase):
+    """Tests for the relative accuracy of merged DDSketches."""
+
+    def setUp(self):
+        """Set up the values of three tracks (positive, negative and zero values)."""
+        rng = np.random.default_rng(0)
+        self.parts = [rng.lognormal(1., 1., 5000),
+                      -rng.lognormal(0., .5, 2000),
+                      np.concatenate([np.zeros(100), rng.uniform(0.01, 100., 3000)])]
+        self.values = np.sort(np.concatenate(self.parts))
+        self.qs = np.linspace(0., 1., 101)
+
+    def _assert_accuracy(self, sketch, alpha):
+        expected = np.quantile(self.values, self.qs, method="lower")
+        result = sketch.quantile(self.qs)
+        self.assertTrue(np.all(np.abs(result - expected) <= alpha * np.abs(expected) + 1e-12))
+
+    def test_000_merge(self):
+        """The quantiles of merged sketches have a relative error of at most alpha."""
+        for alpha in [0.01, 0.05]:
+            merged = DDSketch(alpha=alpha)
+            for i_part in self.parts:
+                i_sketch = DDSketch(alpha=alpha)
+                i_sketch.add(i_part)
+                merged.merge(i_sketch)
+            self.assertEqual(merged.count, len(self.values))
+            self._assert_accuracy(merged, alpha)
+
+    def test_001_merge_frames(self):
+        """Sketches survive the round trip through the 'sketches' leaf."""
+        frames = []
+        for i_part in self.parts:
+            i_sketch = DDSketch(alpha=0.01)
+            i_sketch.add(i_part)
+            i_hist = FixedHistogram([-1., 0., 1., 10.])
+            i_hist.add(i_part)
+            frames.append(sketches_to_frame({"velocity": i_sketch}, {"velocity": i_hist}))
+
+        sketches, histograms = merge_sketch_frames(frames)
+        self._assert_accuracy(sketches["velocity"], 0.01)
+
+        # Every bin holds the values from its lower edge up to (excluding) its upper edge:
+        edges = [-np.inf, -1., 0., 1., 10., np.inf]
+        expected = [np.sum((self.values >= lo) & (self.values < hi)) for lo, hi in zip(edges[:-1], edges[1:])]
+        self.assertEqual(histograms["velocity"].counts.tolist(), expected)
+
+    def test_002_different_alpha(self):
+        """Sketches with a different alpha are not merged."""
+        with self.assertRaises(ValueError):
+            DDSketch(alpha=0.01).merge(DDSketch(alpha=0.02))
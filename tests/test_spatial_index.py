@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""Tests for the SpatialIndex of `sta_etl` package."""
+
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sta_etl.geo_tools import haversine
+from sta_etl.stores.spatial_index import SpatialIndex
+
+from tests.fake_database import make_gps
+
+
+class TestSpatialIndex(unittest.TestCase):
+    """Tests for the bounding box and radius queries against a brute force over all points."""
+
+    def setUp(self):
+        """Index 20 tracks spread over about 0.2 x 0.2 degree."""
+        self.directory = tempfile.mkdtemp()
+        self.si = SpatialIndex(store_path=self.directory)
+        rng = np.random.default_rng(0)
+        self.tracks = {}
+        for i in range(20):
+            gps = make_gps(n_points=300, seed=i)
+            gps["latitude"] += rng.uniform(0., .2)
+            gps["longitude"] += rng.uniform(0., .2)
+            self._add(f"track_{i}", gps)
+
+    def tearDown(self):
+        """Remove the index."""
+        shutil.rmtree(self.directory)
+
+    def _add(self, track_hash, gps):
+        lat, lon = gps["latitude"].to_numpy(), gps["longitude"].to_numpy()
+        bbox = (lat.min(), lon.min(), lat.max(), lon.max(), len(lat))
+        self.si.update_track(track_hash, self.si.get_cells(lat, lon), bbox)
+        self.tracks[track_hash] = (lat, lon)
+
+    def test_000_query_bbox(self):
+        """A bounding box finds every track with a point inside, and only tracks in its cells."""
+        cell_size = self.si.cell_size
+        for i_track, size in [("track_3", .003), ("track_7", .03), ("track_11", .1)]:
+            # A box around a point of a track:
+            lat, lon = self.tracks[i_track]
+            min_lat, min_lon = lat[150] - size / 2., lon[150] - size / 2.
+            max_lat, max_lon = min_lat + size, min_lon + size
+            found = set(self.si.query_bbox(min_lat, min_lon, max_lat, max_lon))
+
+            inside = {k for k, (lat, lon) in self.tracks.items()
+                      if ((lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)).any()}
+            in_cells = {k for k, (lat, lon) in self.tracks.items()
+                        if ((lat >= min_lat - cell_size) & (lat <= max_lat + cell_size)
+                            & (lon >= min_lon - cell_size) & (lon <= max_lon + cell_size)).any()}
+            self.assertGreater(len(inside), 0)
+            self.assertTrue(inside <= found <= in_cells)
+
+    def test_001_query_radius(self):
+        """A radius finds every track with a point within, and only tracks within a cell diagonal more."""
+        diagonal = haversine(48., 11., 48. + self.si.cell_size, 11. + self.si.cell_size)
+        for i_track, radius in [("track_2", 300.), ("track_9", 2000.), ("track_15", 5000.)]:
+            lat0, lon0 = self.tracks[i_track][0][100] + 1e-3, self.tracks[i_track][1][100]
+            found = set(self.si.query_radius(lat0, lon0, radius))
+
+            distances = {k: haversine(lat0, lon0, lat, lon).min() for k, (lat, lon) in self.tracks.items()}
+            within = {k for k, i in distances.items() if i <= radius}
+            near = {k for k, i in distances.items() if i <= radius + diagonal}
+            self.assertGreater(len(within), 0)
+            self.assertTrue(within <= found <= near)
+
+    def test_002_update_remove(self):
+        """A track which is updated replaces its cells, a removed track is not found anymore."""
+        lat, lon = self.tracks["track_0"]
+        query = (lat.min(), lon.min(), lat.max(), lon.max())
+        self.assertIn("track_0", self.si.query_bbox(*query))
+
+        gps = make_gps(n_points=300, seed=0)
+        gps["latitude"] += 1.
+        self._add("track_0", gps)
+        self.assertNotIn("track_0", self.si.query_bbox(*query))
+        self.assertIn("track_0", self.si.query_bbox(49., 11., 49.2, 11.2))
+        self.assertEqual(self.si.get_track_bbox("track_0")["min_lat"], gps["latitude"].min())
+
+        self.si.remove_track("track_0")
+        self.assertNotIn("track_0", self.si.query_bbox(49., 11., 49.2, 11.2))
+        self.assertIsNone(self.si.get_track_bbox("track_0"))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""Tests for the synthetic workload plugins of `sta_etl` package."""
+
+
+import unittest
+
+from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.plugin_handler.isolation import PluginWorkerPool
+from sta_etl.plugins.plugin_synthetic import (make_synthetic_dag, register_synthetic_plugins,
+                                              unregister_synthetic_plugins)
+
+from tests.fake_database import FakeDataBaseHandler
+
+
+class TestSyntheticDag(unittest.TestCase):
+    """Tests for building a DAG of synthetic plugins and processing it."""
+
+    def tearDown(self):
+        """Remove the synthetic plugins."""
+        unregister_synthetic_plugins()
+
+    def _process(self, specs, track_hashes, pool=None):
+        dbh = FakeDataBaseHandler()
+        for i_track in track_hashes:
+            dbh.add_track(i_track)
+        pl = PluginLoader()
+        plugin_names = register_synthetic_plugins(specs, plugin_loader=pl)
+        pl.set_database_handler(dbh)
+        if pool is not None:
+            pl.set_worker_pool(pool)
+        pl.set_processor_plugins(",".join(plugin_names))
+        errors = pl.process_branches(track_hashes, max_workers=2)
+        self.assertEqual(list(errors.values()), [None] * len(track_hashes))
+        return dbh, pl
+
+    def test_000_shape(self):
+        """Every plugin has fan_in dependencies, or fan_out dependents with fan_out."""
+        specs = make_synthetic_dag(n_layers=3, width=4, fan_in=3, seed=1)
+        self.assertEqual([i["plugin_dependencies"] for i in specs[:4]], [["gps"]] * 4)
+        for i_spec in specs[4:]:
+            self.assertEqual(len(i_spec["plugin_dependencies"]), 3)
+
+        specs = make_synthetic_dag(n_layers=3, width=4, seed=1, fan_out=2)
+        for i_spec in specs[:8]:
+            dependents = [j for j in specs if i_spec["leaf_name"] in j["plugin_dependencies"]]
+            self.assertEqual(len(dependents), 2)
+        for i_spec in specs[4:]:
+            dependencies = i_spec["plugin_dependencies"]
+            self.assertTrue(dependencies == ["gps"] or all(i.startswith("synthetic_") for i in dependencies))
+
+    def test_001_process_branches(self):
+        """All leaves of the DAG are processed, with the same output in every run."""
+        specs = make_synthetic_dag(n_layers=3, width=3, seed=2, fan_out=2, rows=10)
+        dbh, pl = self._process(specs, ["a", "b", "c"])
+        for i_track in ["a", "b", "c"]:
+            for i_spec in specs:
+                self.assertEqual(dbh.get_leaf(i_track, i_spec["leaf_name"])["status"], "processed")
+        # A plugin reads all rows of its dependencies (10 rows each, 500 'gps' rows):
+        for i_spec in specs:
+            input_rows = sum(500 if i == "gps" else 10 for i in i_spec["plugin_dependencies"])
+            self.assertEqual(pl.read_leaf("a", i_spec["leaf_name"])["input_rows"].iloc[0], input_rows)
+
+        first = pl.read_leaf("b", specs[-1]["leaf_name"])
+        unregister_synthetic_plugins()
+        _, pl = self._process(specs, ["b"])
+        self.assertTrue(first.equals(pl.read_leaf("b", specs[-1]["leaf_name"])))
+
+    def test_002_spawn_workers(self):
+        """Workers with the start method 'spawn' do not know runtime registered plugins."""
+        specs = make_synthetic_dag(n_layers=1, width=1)
+        with PluginWorkerPool(n_workers=1, start_method="spawn") as pool:
+            dbh, _ = self._process(specs, ["a"], pool=pool)
+        self.assertEqual(dbh.get_leaf("a", "synthetic_0_0")["status"], "failed")
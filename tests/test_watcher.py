@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""Tests for the TrackWatcher of `sta_etl` package."""
+
+
+import unittest
+
+from sta_etl.plugin_handler.loader import PluginLoader
+from sta_etl.plugin_handler.watcher import TrackWatcher
+
+from tests.fake_database import FakeDataBaseHandler, make_gps
+
+
+class _FlakyPluginLoader(PluginLoader):
+    """A PluginLoader which fails once on the given tracks."""
+
+    def __init__(self, failing_tracks):
+        super().__init__()
+        self.failing_tracks = set(failing_tracks)
+
+    def process_branch(self, track_hash):
+        if track_hash in self.failing_tracks:
+            self.failing_tracks.discard(track_hash)
+            raise RuntimeError(f"{track_hash} failed")
+        return super().process_branch(track_hash)
+
+
+class TestTrackWatcher(unittest.TestCase):
+    """Tests for finding new or changed branches."""
+
+    def setUp(self):
+        """Set up a database with two tracks of the same insertion time."""
+        self.dbh = FakeDataBaseHandler()
+        self.dbh.add_track("a", created=10)
+        self.dbh.add_track("b", created=10)
+
+    def _make_watcher(self, failing_tracks=(), watermark_key="created"):
+        pl = _FlakyPluginLoader(failing_tracks)
+        pl.set_database_handler(self.dbh)
+        pl.set_processor_plugins("SimpleDistance")
+        return TrackWatcher(plugin_loader=pl, user_hashes=["user"], watermark_key=watermark_key)
+
+    def _poll_and_process(self, tw):
+        """Queue the new branches and wait until the workers processed them."""
+        tw.start()
+        try:
+            n_new = tw.poll_once()
+            tw.work_queue.join()
+        finally:
+            tw.stop()
+        return n_new
+
+    def test_000_watermark(self):
+        """Branches at the watermark are found once, later ones too."""
+        tw = self._make_watcher()
+        self.assertEqual(self._poll_and_process(tw), 2)
+        self.assertEqual(tw.n_processed, 2)
+        self.assertEqual(tw.find_new_branches(), [])
+
+        # A branch at the watermark which arrived after the poll:
+        self.dbh.add_track("c", created=10)
+        self.dbh.add_track("d", created=11)
+        self.assertEqual(sorted(tw.find_new_branches()), ["c", "d"])
+
+    def test_001_failed_branch(self):
+        """A branch which failed is found again by the next poll."""
+        tw = self._make_watcher(failing_tracks=["a"])
+        self.assertEqual(self._poll_and_process(tw), 2)
+        self.assertEqual((tw.n_processed, tw.n_failed), (1, 1))
+
+        self.assertEqual(tw.find_new_branches(), ["a"])
+        # A branch in the work queue is not found twice:
+        self.assertEqual(tw.find_new_branches(), [])
+
+    def test_002_fingerprint(self):
+        """Without watermark key, a branch is found again when its 'gps' leaf changed."""
+        tw = self._make_watcher(watermark_key=None)
+        self.assertEqual(self._poll_and_process(tw), 2)
+        self.assertEqual(tw.find_new_branches(), [])
+
+        self.dbh.add_track("b", created=10)
+        self.assertEqual(tw.find_new_branches(), ["b"])
+
+    def test_003_changed_input(self):
+        """A branch with a changed 'gps' leaf is recomputed."""
+        tw = self._make_watcher(watermark_key=None)
+        self._poll_and_process(tw)
+        self.assertEqual(len(tw.pl.read_leaf("b", "simple_distances")), 500)
+
+        gps_config = self.dbh.create_leaf_config("gps", "b", ["None"], "processed")
+        self.dbh.write_leaf("b", gps_config, make_gps(n_points=700), "DataFrame")
+        self.assertEqual(self._poll_and_process(tw), 1)
+        self.assertEqual(len(tw.pl.read_leaf("b", "simple_distances")), 700)
+        self.assertEqual(len(tw.pl.read_leaf("a", "simple_distances")), 500)